@@ -0,0 +1,184 @@
+"""
+Asyncio client for Pushwoosh. Requires aiohttp (pip install pypushwoosh[async]).
+"""
+import asyncio
+import logging
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from .base import PushwooshBaseClient
+from .retry import RetryPolicy
+from .utils import monotonic
+from . import serializer
+from .exceptions import PushwooshRateLimitException
+
+
+log = logging.getLogger('pypushwoosh.aio.log')
+
+DEFAULT_LIMIT = 100
+DEFAULT_CONCURRENCY = 10
+
+
+async def _aiter(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class AsyncPushwooshClient(PushwooshBaseClient):
+    """
+    Asyncio implementation of the Pushwoosh API Client. Accepts the same commands as PushwooshClient.
+
+    The client owns a pooled aiohttp session which is created on first use inside the running event loop.
+    Close it with ``await client.close()`` or use the client as an async context manager.
+
+    Attributes:
+        timeout (float): Optional. Total timeout in seconds for every call.
+
+        limit (int): Optional. Maximum number of simultaneous connections.
+
+        limit_per_host (int): Optional. Maximum number of simultaneous connections to the same host. 0 is no limit.
+
+        keep_alive (bool): Optional. Reuse connections between calls. Default True.
+
+        retry_policy (RetryPolicy): Optional. Retry policy for failed calls. Default RetryPolicy().
+
+        rate_limiter (RateLimiter): Optional. Paces requests (including retries) without blocking the event loop.
+
+        circuit_breaker (CircuitBreaker): Optional. Records every HTTP call and fails fast with
+        PushwooshCircuitOpenException while open.
+
+        stream (bool): Optional. Send request bodies with chunked transfer encoding, rendering commands
+        incrementally (see BaseCommand.iter_render). Default False.
+    """
+
+    def __init__(self, timeout=None, limit=DEFAULT_LIMIT, limit_per_host=0, keep_alive=True, retry_policy=None,
+                 rate_limiter=None, circuit_breaker=None, stream=False):
+        if aiohttp is None:
+            raise ImportError('AsyncPushwooshClient requires aiohttp')
+
+        PushwooshBaseClient.__init__(self)
+        self.timeout = timeout
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keep_alive = keep_alive
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self.stream = stream
+        self.retry_exceptions = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+        self._session = None
+
+    def create_session(self):
+        connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                         force_close=not self.keep_alive)
+        return aiohttp.ClientSession(connector=connector, headers=self.headers,
+                                     timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            self._session = self.create_session()
+        return self._session
+
+    async def close(self):
+        session, self._session = self._session, None
+        if session is not None:
+            await session.close()
+
+    def __enter__(self):
+        raise TypeError('Use "async with" with %s' % self.__class__.__name__)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def invoke(self, command):
+        PushwooshBaseClient.invoke(self, command)
+        url = self.path(command)
+        payload = None if self.stream else command.render_bytes()
+
+        if self.debug:
+            log.debug('Client: %s' % self.__class__.__name__)
+            log.debug('Command: %s' % payload)
+            log.debug('Request URL: %s' % url)
+            log.debug('Request method: %s' % self.method)
+            log.debug('Request headers: %s' % self.headers)
+
+        r, result = await self._post(command, url, payload)
+
+        if self.debug:
+            log.debug('Response version: %s' % (r.version,))
+            log.debug('Response code: %s' % r.status)
+            log.debug('Response phrase: %s' % r.reason)
+            log.debug('Response headers: %s' % r.headers)
+            log.debug('Response payload: %s' % result)
+
+        return result
+
+    async def _post(self, command, url, payload):
+        attempt = 0
+        while True:
+            attempt += 1
+            # rendered before the call is admitted: a command that can not be rendered again fails here
+            data = _aiter(command.iter_render()) if self.stream else payload
+            await self._acquire(command)
+            probe = self.circuit_breaker.allow() if self.circuit_breaker is not None else None
+
+            started = monotonic()
+            try:
+                r = await self.session.post(url, data=data)
+            except Exception as e:
+                self._record_call(started, False, probe)
+                if not isinstance(e, self.retry_exceptions) or not self.retry_policy.should_retry(command, attempt):
+                    raise
+                delay = self.retry_policy.delay(attempt)
+                log.warning('%s failed (%r), retrying in %.2fs' % (command.command_name, e, delay))
+            else:
+                async with r:
+                    self._record_call(started, r.status < 500, probe)
+                    if not self.retry_policy.should_retry(command, attempt, r.status):
+                        return r, serializer.loads(await r.read())
+                    delay = self.retry_policy.delay(attempt, r.headers.get('Retry-After'))
+                    log.warning('%s failed with HTTP %s, retrying in %.2fs' % (command.command_name, r.status,
+                                                                               delay))
+            finally:
+                # a probe ending without a recorded outcome (e.g. the call was cancelled) is given back
+                if probe is not None:
+                    self.circuit_breaker.release(probe)
+            await asyncio.sleep(delay)
+
+    def _record_call(self, started, success, probe=None):
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record(success, monotonic() - started, probe)
+
+    async def _acquire(self, command):
+        limiter = self.rate_limiter
+        if limiter is None:
+            return
+
+        deadline = None if limiter.timeout is None else monotonic() + limiter.timeout
+        while True:
+            wait = limiter.delay(command)
+            if not wait:
+                return
+            if not limiter.blocking or (deadline is not None and monotonic() + wait > deadline):
+                raise PushwooshRateLimitException('Rate limit exceeded for %s' % command.command_name)
+            await asyncio.sleep(wait)
+
+    async def invoke_many(self, commands, concurrency=DEFAULT_CONCURRENCY, return_exceptions=False):
+        """
+        Invokes commands with at most ``concurrency`` requests in flight. Returns results in the order of commands.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def invoke(command):
+            async with semaphore:
+                return await self.invoke(command)
+
+        return await asyncio.gather(*[invoke(command) for command in commands], return_exceptions=return_exceptions)
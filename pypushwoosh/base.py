@@ -7,8 +7,24 @@ class PushwooshBaseClient(object):
     endpoint = 'json'
     version = '1.3'
     method = 'POST'
+    headers = {'User-Agent': 'PyPushwooshClient',
+               'Content-Type': 'application/json',
+               'Accept': 'application/json'}
 
     debug = False
 
+    def path(self, command):
+        return '{}://{}/'.format(self.scheme, self.hostname) + '/'.join((self.endpoint, self.version,
+                                                                         command.command_name))
+
     def invoke(self, command):
         assert isinstance(command, BaseCommand), 'Command must be instance of BaseCommand'
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,177 @@
+import threading
+from collections import deque
+
+from .utils import monotonic
+from .exceptions import PushwooshCircuitOpenException
+
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker around the Pushwoosh endpoint. Thread-safe.
+
+    The breaker tracks calls over a rolling time window. When at least minimum_calls were made and the share of
+    failed calls (transport errors and 5xx responses) or of slow calls reaches its threshold, the breaker opens
+    and clients fail fast with PushwooshCircuitOpenException. After reset_timeout the breaker lets
+    half_open_calls probe calls through: it closes if all of them succeed and opens again on the first failure.
+
+    Attributes:
+        failure_rate_threshold (float): Optional. Share of failed calls in the window that opens the breaker.
+
+        slow_call_duration (float): Optional. Calls taking longer than this many seconds are slow. None disables
+        slow call tracking.
+
+        slow_call_rate_threshold (float): Optional. Share of slow calls in the window that opens the breaker.
+
+        window (float): Optional. Rolling window length in seconds.
+
+        minimum_calls (int): Optional. Minimum number of calls in the window before the breaker may open.
+
+        reset_timeout (float): Optional. Seconds the breaker stays open before allowing probe calls.
+
+        half_open_calls (int): Optional. Number of probe calls in half-open state.
+    """
+
+    def __init__(self, failure_rate_threshold=0.5, slow_call_duration=None, slow_call_rate_threshold=1.0,
+                 window=60.0, minimum_calls=10, reset_timeout=30.0, half_open_calls=1):
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_duration = slow_call_duration
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.window = window
+        self.minimum_calls = minimum_calls
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+
+        self._lock = threading.Lock()
+        self._calls = deque()
+        self._failures = 0
+        self._slow_calls = 0
+        self._state = STATE_CLOSED
+        self._opened_at = None
+        self._probes = 0
+        self._probe_successes = 0
+        self._pending_probes = set()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state(monotonic())
+
+    def _current_state(self, now):
+        if self._state == STATE_OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = STATE_HALF_OPEN
+            self._probes = 0
+            self._probe_successes = 0
+            self._pending_probes.clear()
+        return self._state
+
+    def allow(self):
+        """
+        Reserves a call. Raises PushwooshCircuitOpenException if the breaker does not let the call through.
+
+        Returns a probe token in half-open state, None otherwise. Pass the token to record(), or to release() if
+        the call ends without an outcome (e.g. it was cancelled), so the probe slot is given back.
+        """
+        with self._lock:
+            now = monotonic()
+            state = self._current_state(now)
+            if state == STATE_CLOSED:
+                return None
+            if state == STATE_HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                probe = object()
+                self._pending_probes.add(probe)
+                return probe
+            retry_in = max(0.0, self.reset_timeout - (now - self._opened_at))
+            raise PushwooshCircuitOpenException('Circuit breaker is %s, retry in %.1fs' % (state, retry_in))
+
+    def release(self, probe):
+        """
+        Gives back a probe reserved with allow() whose outcome was not recorded. Does nothing for None, recorded
+        probes and probes of an earlier half-open period.
+        """
+        if probe is None:
+            return
+        with self._lock:
+            if probe in self._pending_probes:
+                self._pending_probes.discard(probe)
+                self._probes -= 1
+
+    def record(self, success, duration, probe=None):
+        """
+        Records the outcome of a call reserved with allow(); probe is the token allow() returned. In half-open state
+        only outcomes of pending probes count: calls admitted before the breaker opened are ignored.
+        """
+        with self._lock:
+            pending = probe in self._pending_probes
+            self._pending_probes.discard(probe)
+            now = monotonic()
+            state = self._current_state(now)
+            slow = self.slow_call_duration is not None and duration > self.slow_call_duration
+
+            if state == STATE_HALF_OPEN:
+                if not pending:
+                    return
+                if not success or slow:
+                    self._open(now)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self._close()
+                return
+
+            self._calls.append((now, success, slow))
+            self._failures += not success
+            self._slow_calls += slow
+            self._prune(now)
+
+            if state == STATE_CLOSED and len(self._calls) >= self.minimum_calls:
+                calls = float(len(self._calls))
+                failing = self._failures / calls >= self.failure_rate_threshold
+                slow = self._slow_calls / calls >= self.slow_call_rate_threshold
+                if failing or slow:
+                    self._open(now)
+
+    def _prune(self, now):
+        while self._calls and now - self._calls[0][0] > self.window:
+            _, success, slow = self._calls.popleft()
+            self._failures -= not success
+            self._slow_calls -= slow
+
+    def _open(self, now):
+        self._state = STATE_OPEN
+        self._opened_at = now
+
+    def _close(self):
+        self._state = STATE_CLOSED
+        self._opened_at = None
+        self._calls.clear()
+        self._failures = 0
+        self._slow_calls = 0
+
+    def reset(self):
+        with self._lock:
+            self._close()
+
+    def snapshot(self):
+        """
+        Returns breaker state and window statistics as a dict, e.g. for health checks.
+        """
+        with self._lock:
+            now = monotonic()
+            state = self._current_state(now)
+            self._prune(now)
+            calls = len(self._calls)
+            return {
+                'state': state,
+                'calls': calls,
+                'failures': self._failures,
+                'slow_calls': self._slow_calls,
+                'failure_rate': self._failures / float(calls) if calls else 0.0,
+                'slow_call_rate': self._slow_calls / float(calls) if calls else 0.0,
+                'open_for': now - self._opened_at if self._opened_at is not None else None,
+            }
@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+
+from concurrent.futures import Future, CancelledError
+
+from .command import CompileFilterCommand
+from .filter import BaseFilter
+from .utils import monotonic
+from .exceptions import PushwooshCommandException
+
+
+HTTP_200_OK = 200
+
+
+class CompileFilterCache(object):
+    """
+    TTL/LRU cache of CompileFilterCommand (dry-run) results. Thread-safe.
+
+    Results are keyed by auth and the canonical form of devices_filter (see BaseFilter.canonical()), so equal
+    filters built differently share an entry. Only successful responses (status_code 200) are cached. Concurrent
+    invocations with the same key while the request is in flight wait for that request instead of sending their
+    own, and all of them get its result or exception. Cached result dicts are shared, do not modify them.
+
+    Attributes:
+        client (PushwooshClient): Required. Client used to invoke commands.
+
+        ttl (float): Optional. Seconds a result stays in the cache. Default 60.
+
+        max_size (int): Optional. Maximum number of cached results; the least recently used result is dropped
+        first. Default 1024.
+    """
+
+    def __init__(self, client, ttl=60.0, max_size=1024):
+        self.client = client
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._in_flight = {}
+
+    @staticmethod
+    def key(command):
+        devices_filter = command.devices_filter
+        if devices_filter is None:
+            raise PushwooshCommandException('devices_filter is required')
+        if isinstance(devices_filter, BaseFilter):
+            devices_filter = devices_filter.canonical()
+        return command.auth, devices_filter
+
+    def invoke(self, command):
+        """
+        Returns the cached result of command or invokes it with the client.
+        """
+        if not isinstance(command, CompileFilterCommand):
+            raise PushwooshCommandException('only CompileFilterCommand results are cached')
+
+        key = self.key(command)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] > monotonic():
+                self._entries[key] = entry
+                return entry[1]
+
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+
+        if not owner:
+            try:
+                return future.result()
+            except CancelledError:
+                # the owner was interrupted without a result
+                return self.invoke(command)
+
+        try:
+            result = self.client.invoke(command)
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            if isinstance(e, Exception):
+                future.set_exception(e)
+            else:
+                # e.g. KeyboardInterrupt: waiting threads invoke the command themselves
+                future.cancel()
+            raise
+
+        with self._lock:
+            del self._in_flight[key]
+            if isinstance(result, dict) and result.get('status_code') == HTTP_200_OK:
+                self._entries[key] = (monotonic() + self.ttl, result)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        future.set_result(result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -1,33 +1,157 @@
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from .base import PushwooshBaseClient
+from .retry import RetryPolicy
+from .utils import monotonic
+from . import serializer
+from .exceptions import PushwooshRateLimitException
 
 
 log = logging.getLogger('pypushwoosh.client.log')
 
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+
 
 class PushwooshClient(PushwooshBaseClient):
     """
     Implementation of the Pushwoosh API Client.
+
+    The client owns a pooled keep-alive HTTP session which is created on first use and shared by all threads
+    invoking commands through this client. Call close() (or use the client as a context manager) to release
+    pooled connections.
+
+    Attributes:
+        timeout (float | tuple): Optional. Timeout passed to requests for every call.
+
+        pool_connections (int): Optional. Number of per-host connection pools to cache.
+
+        pool_maxsize (int): Optional. Maximum number of connections kept alive per host. Should be not less than
+        the number of threads invoking commands concurrently.
+
+        pool_block (bool): Optional. Block when no free connection is available in the pool instead of opening
+        a new non-pooled one. Turns pool_maxsize into a hard per-host connection limit.
+
+        keep_alive (bool): Optional. Reuse connections between calls. Default True.
+
+        max_workers (int): Optional. Size of the thread pool used by submit() and invoke_many(). Defaults to
+        pool_maxsize so that every worker can hold a pooled connection.
+
+        retry_policy (RetryPolicy): Optional. Retry policy for failed calls. Default RetryPolicy(); pass
+        RetryPolicy(max_attempts=1) to disable retries.
+
+        rate_limiter (RateLimiter): Optional. Paces requests (including retries). Raises
+        PushwooshRateLimitException when a token can not be acquired.
+
+        circuit_breaker (CircuitBreaker): Optional. Records every HTTP call and fails fast with
+        PushwooshCircuitOpenException while open.
+
+        stream (bool): Optional. Send request bodies with chunked transfer encoding, rendering commands
+        incrementally (see BaseCommand.iter_render). Default False.
     """
-    headers = {'User-Agent': 'PyPushwooshClient',
-               'Content-Type': 'application/json',
-               'Accept': 'application/json'}
+    retry_exceptions = (requests.ConnectionError, requests.Timeout)
 
-    def __init__(self, timeout=None):
+    def __init__(self, timeout=None, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 pool_block=False, keep_alive=True, max_workers=None,
+                 retry_policy=None, rate_limiter=None, circuit_breaker=None,
+                 stream=False):
         PushwooshBaseClient.__init__(self)
         self.timeout = timeout
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.max_workers = max_workers
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self.stream = stream
+
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._executor = None
+        self._executor_lock = threading.Lock()
 
-    def path(self, command):
-        return '{}://{}/'.format(self.scheme, self.hostname) + '/'.join((self.endpoint, self.version,
-                                                                         command.command_name))
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self.create_session()
+        return self._session
+
+    def create_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize,
+                              pool_block=self.pool_block)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update(self.headers)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers or self.pool_maxsize)
+        return self._executor
+
+    def close(self):
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+        with self._session_lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+    def submit(self, command):
+        """
+        Schedules the command on the client thread pool. Returns concurrent.futures.Future with invoke() result.
+        """
+        return self.executor.submit(self.invoke, command)
+
+    def invoke_many(self, commands, max_workers=None, ordered=True):
+        """
+        Invokes commands on a thread pool sharing the pooled session.
+
+        Args:
+            commands (iterable of BaseCommand): commands to invoke.
+
+            max_workers (int): Optional. Run this batch on a dedicated pool of max_workers threads instead of
+            the client pool.
+
+            ordered (bool): Optional. Return a list of futures in the order of commands if True (default),
+            otherwise an iterator yielding futures as they complete.
+        """
+        if max_workers is None:
+            futures = [self.submit(command) for command in commands]
+        else:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+            try:
+                futures = [executor.submit(self.invoke, command) for command in commands]
+            finally:
+                executor.shutdown(wait=False)
+
+        if ordered:
+            return futures
+        return as_completed(futures)
 
     def invoke(self, command):
         PushwooshBaseClient.invoke(self, command)
         url = self.path(command)
-        payload = command.render()
+        payload = None if self.stream else command.render_bytes()
 
         if self.debug:
             log.debug('Client: %s' % self.__class__.__name__)
@@ -36,13 +160,50 @@ class PushwooshClient(PushwooshBaseClient):
             log.debug('Request method: %s' % self.method)
             log.debug('Request headers: %s' % self.headers)
 
-        r = requests.post(url, data=payload, headers=self.headers, timeout=self.timeout)
+        r = self._post(command, url, payload)
+        result = serializer.loads(r.content)
 
         if self.debug:
             log.debug('Response version: %s' % r.raw.version)
             log.debug('Response code: %s' % r.status_code)
             log.debug('Response phrase: %s' % r.reason)
             log.debug('Response headers: %s' % r.headers)
-            log.debug('Response payload: %s' % r.json())
+            log.debug('Response payload: %s' % result)
+
+        return result
+
+    def _post(self, command, url, payload):
+        attempt = 0
+        while True:
+            attempt += 1
+            # rendered before the call is admitted: a command that can not be rendered again fails here
+            data = command.iter_render() if self.stream else payload
+            if self.rate_limiter is not None and not self.rate_limiter.acquire(command):
+                raise PushwooshRateLimitException('Rate limit exceeded for %s' % command.command_name)
+            probe = self.circuit_breaker.allow() if self.circuit_breaker is not None else None
+
+            started = monotonic()
+            try:
+                r = self.session.post(url, data=data, timeout=self.timeout)
+            except Exception as e:
+                self._record_call(started, False, probe)
+                if not isinstance(e, self.retry_exceptions) or not self.retry_policy.should_retry(command, attempt):
+                    raise
+                delay = self.retry_policy.delay(attempt)
+                log.warning('%s failed (%s), retrying in %.2fs' % (command.command_name, e, delay))
+            else:
+                self._record_call(started, r.status_code < 500, probe)
+                if not self.retry_policy.should_retry(command, attempt, r.status_code):
+                    return r
+                delay = self.retry_policy.delay(attempt, r.headers.get('Retry-After'))
+                log.warning('%s failed with HTTP %s, retrying in %.2fs' % (command.command_name, r.status_code,
+                                                                           delay))
+            finally:
+                # a probe ending without a recorded outcome (e.g. KeyboardInterrupt) is given back
+                if probe is not None:
+                    self.circuit_breaker.release(probe)
+            time.sleep(delay)
 
-        return r.json()
+    def _record_call(self, started, success, probe=None):
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record(success, monotonic() - started, probe)
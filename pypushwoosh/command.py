@@ -1,30 +1,194 @@
 import json
+import threading
 
-from six import add_metaclass
+from six import add_metaclass, integer_types, text_type, binary_type
 
 from .notification import Notification, DevicesFilterNotificationMixin, BaseNotification, \
     BaseNotificationMeta, IOSNotificationMixin, AndroidNotificationMixin, WindowsPhoneNotificationMixin, \
     OSXNotificationMixin, Windows8NotificationMixin, SafariNotificationMixin, AmazonNotificationMixin, \
     BlackBerryNotificationMixin, CommonNotificationMixin, ChromeNotificationMixin
 from .utils import render_attrs
+from .stream import iterencode, encode_into, DEFAULT_CHUNK_SIZE
+from . import serializer
 from .exceptions import PushwooshCommandException
 
 
+_TEXT_TYPES = frozenset((text_type, binary_type))
+_SCALAR_TYPES = frozenset((float, bool, type(None)) + integer_types) | _TEXT_TYPES
+
+
+class _ListSnapshot(list):
+    # strings never equal other scalars, so lists of strings only are compared with a single ==
+    __slots__ = ('text_only',)
+
+
+def _snapshot(value, iterators, sizes):
+    # copy of the containers built by compile(), so later in-place changes of attribute values are noticed.
+    # One-shot iterators (e.g. generators) are kept as is and appended to iterators. Objects rendered with
+    # to_json() are kept as is too, their lengths are appended to sizes (TokenStore only grows)
+    if isinstance(value, dict):
+        return dict((key, _snapshot(item, iterators, sizes)) for key, item in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        types = set(map(type, value))
+        if _SCALAR_TYPES.issuperset(types):
+            result = _ListSnapshot(value)
+        else:
+            result = _ListSnapshot(_snapshot(item, iterators, sizes) for item in value)
+        result.text_only = _TEXT_TYPES.issuperset(types)
+        return result
+    if hasattr(value, 'to_json'):
+        if hasattr(value, '__len__'):
+            sizes.append((value, len(value)))
+    elif hasattr(value, '__iter__') and iter(value) is value:
+        iterators.append(value)
+    return value
+
+
+def _same(value, snapshot):
+    # value renders like snapshot: equal scalars of the same type, same other objects, containers holding such values
+    if isinstance(value, dict):
+        if type(snapshot) is not dict or len(value) != len(snapshot):
+            return False
+        for key, item in value.items():
+            if key not in snapshot or not _same(item, snapshot[key]):
+                return False
+        return True
+    if isinstance(value, (list, tuple, set, frozenset)):
+        if type(snapshot) is not _ListSnapshot or len(value) != len(snapshot):
+            return False
+        if type(value) is not list:
+            value = list(value)
+        if snapshot.text_only:
+            return value == snapshot
+        if list(map(type, value)) != list(map(type, snapshot)):
+            return False
+        return all(_same(item, other) for item, other in zip(value, snapshot))
+    if type(value) in _SCALAR_TYPES:
+        return type(snapshot) is type(value) and value == snapshot
+    return value is snapshot
+
+
 class BaseCommand(object):
+    """
+    Base command.
+
+    Rendered output is cached. Rendering compiles the command again, which is cheap, and serializes it only if
+    the compiled request differs from a snapshot of the cached one, so repeated render() calls and retries do not
+    serialize large payloads again. Lists and dicts are compared by content, so changes made in place, e.g.
+    appending to a devices list, are noticed; TokenStore objects are compared by identity and length, other objects
+    by identity. Rendering is thread safe, one command may be sent by several clients at once.
+
+    One-shot iterables such as generators of device tokens are streamed without being kept, so a command holding
+    them renders to a new body only once: later render() and render_bytes() calls return the body already
+    rendered by the same method, anything else (e.g. iter_render() on a retry) raises PushwooshCommandException.
+    Use lists, pypushwoosh.tokens.TokenFile or TokenStore for commands rendered several times, or
+    pypushwoosh.sender.ChunkedSender.
+
+    Attributes:
+        idempotent (bool): Class attribute. True if invoking the command twice has the same effect as invoking it
+        once, so clients may retry it safely.
+    """
+    # declared attributes live in slots; __dict__ is only created when other attributes are set
+    __slots__ = ('_command', '_command_compiled', '_rendered', '_rendered_from', '_iterators', '_consumed', '_sizes',
+                 '_lock', '__dict__')
     command_name = None
+    idempotent = False
 
     def __init__(self):
         self._command = {}
         self._command_compiled = False
+        self._rendered = {}
+        self._rendered_from = None
+        self._iterators = []
+        self._consumed = {}
+        self._sizes = []
+        self._lock = threading.Lock()
 
     def compile(self):
         self._command = {'request': self._command}
         self._command_compiled = True
 
-    def render(self):
-        if not self._command_compiled:
+    def invalidate(self):
+        """
+        Drops the cached rendered output.
+        """
+        self._rendered = {}
+        self._rendered_from = None
+
+    def _compile_cached(self):
+        # returns the snapshot of the compiled request, the dict of its renderings and its one-shot iterators;
+        # compile() builds the request in self._command, so concurrent renders are serialized
+        with self._lock:
+            self._command = {}
+            self._command_compiled = False
             self.compile()
-        return json.dumps(self._command, default=str)
+            snapshot = self._rendered_from
+            if snapshot is None or not _same(self._command, snapshot) or \
+                    not all(len(value) == size for value, size in self._sizes):
+                iterators, sizes = [], []
+                snapshot = _snapshot(self._command, iterators, sizes)
+                self._rendered = {}
+                self._rendered_from = snapshot
+                self._iterators = iterators
+                self._consumed = dict((id(value), value) for value in iterators if id(value) in self._consumed)
+                self._sizes = sizes
+            return snapshot, self._rendered, self._iterators
+
+    def _consume(self, iterators, read=True):
+        # the caller reads (or checks it still can read, if not read) one-shot iterators of the compiled request,
+        # which is possible only once
+        with self._lock:
+            for value in iterators:
+                if id(value) in self._consumed:
+                    raise PushwooshCommandException(
+                        '%s holds a one-shot iterable (e.g. a generator) that was already rendered; use a list, '
+                        'TokenFile or TokenStore to render it again, or ChunkedSender' % type(self).__name__)
+            if read:
+                self._consumed.update((id(value), value) for value in iterators)
+
+    def render(self):
+        command, rendered_cache, iterators = self._compile_cached()
+        rendered = rendered_cache.get(None)
+        if rendered is None:
+            self._consume(iterators)
+            rendered = rendered_cache[None] = json.dumps(command, default=serializer.default)
+        return rendered
+
+    def render_bytes(self):
+        """
+        Renders the command to JSON bytes with the fastest available serializer (see pypushwoosh.serializer).
+        """
+        command, rendered_cache, iterators = self._compile_cached()
+        current = serializer.current_serializer()
+        rendered = rendered_cache.get(current)
+        if rendered is None:
+            self._consume(iterators)
+            rendered = rendered_cache[current] = current.dumps(command)
+        return rendered
+
+    def iter_render(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Renders the command incrementally. Returns a generator of bytes chunks usable as a chunked request body.
+        Device tokens are written item by item, never as one large string, and generators of tokens are read
+        lazily.
+        """
+        command, _, iterators = self._compile_cached()
+        self._consume(iterators, read=False)
+        return self._iter_render(command, iterators, chunk_size)
+
+    def _iter_render(self, command, iterators, chunk_size):
+        # iterators are read when the first chunk is requested, so a body never sent can be rendered again
+        self._consume(iterators)
+        for chunk in iterencode(command, chunk_size):
+            yield chunk
+
+    def render_into(self, buf):
+        """
+        Renders the command into bytearray buf (replacing its content) and returns buf.
+        """
+        command, _, iterators = self._compile_cached()
+        self._consume(iterators)
+        return encode_into(command, buf)
 
 
 class BaseAuthCommand(BaseCommand):
@@ -35,6 +199,8 @@ class BaseAuthCommand(BaseCommand):
         auth (str): Required. API access token from the Pushwoosh control panel (create this token
         at https://cp.pushwoosh.com/api_access)
     """
+    __slots__ = ('auth',)
+
     def __init__(self):
         BaseCommand.__init__(self)
         self.auth = None
@@ -120,6 +286,7 @@ class DeleteMessageCommand(BaseAuthCommand):
         message (str): Required. Message code obtained in createMessage
     """
     command_name = 'deleteMessage'
+    idempotent = True
 
     def __init__(self, message=None):
         BaseAuthCommand.__init__(self)
@@ -161,12 +328,20 @@ class CreateTargetedMessageCommand(BaseAuthCommand,
         BaseAuthCommand.compile(self)
 
 
+class CompactCreateTargetedMessageCommand(CreateTargetedMessageCommand):
+    """
+    CreateTargetedMessageCommand keeping its attributes in __slots__ instead of a per-instance __dict__.
+    """
+    _compact = True
+
+
 @add_metaclass(BaseNotificationMeta)
 class CompileFilterCommand(BaseAuthCommand, BaseNotification, DevicesFilterNotificationMixin):
     """
     Compiling filters and dry-run command (from Advanced Tags Guide)
     """
     command_name = 'compileFilter'
+    idempotent = True
 
     def __init__(self):
         BaseAuthCommand.__init__(self)
@@ -187,6 +362,9 @@ class BaseDeviceCommand(BaseCommand):
         hwid (str): Required. Unique string to identify the device (Please note that accessing UDID on iOS is
         deprecated and not allowed, one of the alternative ways now is to use MAC address or IdentifierForVendors)
     """
+    __slots__ = ('application', 'hwid')
+    idempotent = True
+
     def __init__(self, application, hwid):
         BaseCommand.__init__(self)
         self.application = application
@@ -210,6 +388,7 @@ class RegisterDeviceCommand(BaseDeviceCommand):
 
         timezone (str): Optional. Timezone offset in seconds for the device
     """
+    __slots__ = ('device_type', 'push_token', 'language', 'timezone')
     command_name = 'registerDevice'
 
     def __init__(self, application, hwid, device_type, push_token, language=None, timezone=None):
@@ -228,6 +407,7 @@ class UnregisterDeviceCommand(BaseDeviceCommand):
     """
     Remove device from the application
     """
+    __slots__ = ()
     command_name = 'unregisterDevice'
 
 
@@ -235,7 +415,9 @@ class GetTagsCommand(BaseAuthCommand):
     """
     Get tags to selected device
     """
+    __slots__ = ('application', 'hwid')
     command_name = 'getTags'
+    idempotent = True
 
     def __init__(self, application, hwid, auth=None):
         BaseAuthCommand.__init__(self)
@@ -254,6 +436,7 @@ class SetTagsCommand(BaseDeviceCommand):
     Attributes:
         tags (dict of tags): Required. tags to set
     """
+    __slots__ = ('tags',)
     command_name = 'setTags'
 
     def __init__(self, application, hwid, tags):
@@ -272,6 +455,7 @@ class SetBadgeCommand(BaseDeviceCommand):
     Attributes:
         badges (int): Required. Current badge on the application to use with auto-incrementing badges
     """
+    __slots__ = ('badges',)
     command_name = 'setBadge'
 
     def __init__(self, application, hwid, badges):
@@ -290,6 +474,7 @@ class PushStatCommand(BaseDeviceCommand):
     Attributes:
         hash (str): Required. Hash tag received in push notification
     """
+    __slots__ = ('hash',)
     command_name = 'pushStat'
 
     def __init__(self, application, hwid, hash):
@@ -310,6 +495,7 @@ class GetNearestZoneCommand(BaseDeviceCommand):
 
         lng (float): Required. Longitude of the device
     """
+    __slots__ = ('lat', 'lng')
     command_name = 'getNearestZone'
 
     def __init__(self, application, hwid, lat, lng):
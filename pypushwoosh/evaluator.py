@@ -0,0 +1,218 @@
+"""
+Local evaluation of filters over a columnar snapshot of devices. Requires numpy (pip install pypushwoosh[evaluator]).
+
+Every filter is evaluated to a boolean mask over the snapshot rows with vectorized numpy operations, so audiences
+of tens of millions of devices can be sized offline, without CompileFilterCommand requests.
+"""
+from array import array
+from datetime import date
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+from .filter import BaseFilter, BaseOperatorFilter, UnionFilter, IntersectFilter, SubtractFilter, \
+    ApplicationFilter, ApplicationGroupFilter, BaseTagFilter, ApplicationBaseTagFilter, ListTagFilter, \
+    ListTagFilterByApplication, DateTagFilter, DateTagFilterByApplication, DaysTagFilter, \
+    DaysTagFilterByApplication, BooleanTagFilter, BooleanTagFilterByApplication
+from .constants import TAG_FILTER_OPERATOR_LTE, TAG_FILTER_OPERATOR_GTE, TAG_FILTER_OPERATOR_EQ, \
+    TAG_FILTER_OPERATOR_IN, TAG_FILTER_OPERATOR_BETWEEN, TAG_FILTER_OPERATOR_NOTEQ, TAG_FILTER_OPERATOR_NOTIN
+from .utils import parse_date
+from .exceptions import PushwooshFilterException
+
+
+def _present(column):
+    # rows having a value: masked, None and NaN values are missing
+    if isinstance(column, numpy.ma.MaskedArray):
+        return ~numpy.ma.getmaskarray(column)
+    if column.dtype.kind == 'O':
+        return numpy.not_equal(column, None)
+    if column.dtype.kind in 'fc':
+        return ~numpy.isnan(column)
+    if column.dtype.kind == 'M':
+        return ~numpy.isnat(column)
+    return numpy.ones(len(column), dtype=bool)
+
+
+def _compare(values, operator, operand):
+    if operator == TAG_FILTER_OPERATOR_EQ:
+        return values == operand
+    if operator == TAG_FILTER_OPERATOR_NOTEQ:
+        return values != operand
+    if operator == TAG_FILTER_OPERATOR_GTE:
+        return values >= operand
+    if operator == TAG_FILTER_OPERATOR_LTE:
+        return values <= operand
+    if operator == TAG_FILTER_OPERATOR_BETWEEN:
+        return (values >= min(operand)) & (values <= max(operand))
+    if operator == TAG_FILTER_OPERATOR_IN:
+        return numpy.isin(values, _values(operand))
+    if operator == TAG_FILTER_OPERATOR_NOTIN:
+        return ~numpy.isin(values, _values(operand))
+    raise PushwooshFilterException('Unknown operator %s' % operator)
+
+
+def _values(operand):
+    # 8 bytes integer array operands are viewed without copying
+    return numpy.frombuffer(operand, dtype='int64') if isinstance(operand, array) else list(operand)
+
+
+def _to_day(value):
+    return numpy.datetime64(parse_date(value)[:10], 'D')
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int):
+        return value == 1
+    return value.lower() == 'true'
+
+
+class DeviceSnapshot(object):
+    """
+    Columnar snapshot of devices: one row per device registered in an application, one numpy array per column.
+
+    Tag columns hold one value per row. Missing values are None in object arrays, NaN in float arrays, NaT in
+    datetime64 arrays, or masked in numpy masked arrays; rows missing a tag match no condition on it, including
+    NOTEQ and NOTIN. List tag columns are object arrays of lists (or sets) of values, date and days tag columns
+    are datetime64 arrays (or arrays of date strings), boolean tag columns hold bool or 0/1 values.
+
+    Attributes:
+        hwids (array): Required. Device hwids.
+
+        applications (array): Required. Application codes.
+
+        platforms (array of int): Required. Device platforms, see PLATFORM_* constants.
+
+        tags (dict): Optional. Tag name to column of tag values (T filters).
+
+        application_tags (dict): Optional. Tag name to column of application specific tag values of the
+        application of the row (AT filters).
+
+        groups (dict): Optional. Application group code to list of its application codes (G filters).
+
+        today (date): Optional. Date days tags are counted from. Default today.
+    """
+
+    def __init__(self, hwids, applications, platforms, tags=None, application_tags=None, groups=None, today=None):
+        if numpy is None:
+            raise ImportError('DeviceSnapshot requires numpy')
+
+        self.hwids = numpy.asarray(hwids)
+        self.applications = numpy.asarray(applications)
+        self.platforms = numpy.asarray(platforms)
+        self.tags = dict((name, self._column(column)) for name, column in (tags or {}).items())
+        self.application_tags = dict((name, self._column(column))
+                                     for name, column in (application_tags or {}).items())
+        self.groups = groups or {}
+        self.today = numpy.datetime64(today or date.today(), 'D')
+
+        for column in [self.applications, self.platforms] + list(self.tags.values()) + \
+                list(self.application_tags.values()):
+            if len(column) != len(self.hwids):
+                raise ValueError('All columns must have the same length')
+
+    @staticmethod
+    def _column(column):
+        if isinstance(column, numpy.ndarray):
+            return column
+        return numpy.asarray(column)
+
+    def __len__(self):
+        return len(self.hwids)
+
+    def mask(self, devices_filter):
+        """
+        Returns a boolean array, True for rows matching devices_filter.
+        """
+        results = {}
+        stack = [(devices_filter, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if id(node) in results:
+                continue
+            if not isinstance(node, BaseOperatorFilter):
+                results[id(node)] = self._leaf_mask(node)
+                continue
+            if not children_done:
+                stack.append((node, True))
+                stack.append((node.second_filter, False))
+                stack.append((node.first_filter, False))
+                continue
+
+            first, second = results[id(node.first_filter)], results[id(node.second_filter)]
+            if isinstance(node, UnionFilter):
+                results[id(node)] = first | second
+            elif isinstance(node, IntersectFilter):
+                results[id(node)] = first & second
+            elif isinstance(node, SubtractFilter):
+                results[id(node)] = first & ~second
+            else:
+                raise PushwooshFilterException('Unknown filter %s' % type(node).__name__)
+        return results[id(devices_filter)]
+
+    def count(self, devices_filter):
+        """
+        Returns the number of rows matching devices_filter.
+        """
+        return int(numpy.count_nonzero(self.mask(devices_filter)))
+
+    def select(self, devices_filter):
+        """
+        Returns hwids of rows matching devices_filter.
+        """
+        return self.hwids[self.mask(devices_filter)]
+
+    def _leaf_mask(self, node):
+        if isinstance(node, ApplicationGroupFilter):
+            mask = numpy.isin(self.applications, list(self.groups.get(node.code, ())))
+        elif isinstance(node, ApplicationFilter):
+            mask = self.applications == node.code
+        elif isinstance(node, BaseTagFilter):
+            return self._tag_mask(node)
+        elif isinstance(node, BaseFilter):
+            raise PushwooshFilterException('Can not evaluate %s' % type(node).__name__)
+        else:
+            raise PushwooshFilterException('Filter must be BaseFilter')
+
+        if node.platforms is not None:
+            mask &= numpy.isin(self.platforms, node.platforms)
+        return mask
+
+    def _tag_mask(self, node):
+        if isinstance(node, ApplicationBaseTagFilter):
+            columns = self.application_tags
+            scope = self.applications == node.code
+        else:
+            columns = self.tags
+            scope = None
+
+        column = columns.get(node.tag_name)
+        if column is None:
+            return numpy.zeros(len(self), dtype=bool)
+
+        present = _present(column)
+        values = numpy.ma.getdata(column) if isinstance(column, numpy.ma.MaskedArray) else column
+        operator, operand = node.operator, node.operand
+
+        if isinstance(node, (ListTagFilter, ListTagFilterByApplication)):
+            wanted = set(operand) if isinstance(operand, (list, array)) else set([operand])
+            contains = numpy.frompyfunc(lambda row: bool(row) and not wanted.isdisjoint(row), 1, 1)
+            mask = contains(numpy.where(present, values, None)).astype(bool)
+        elif isinstance(node, (DaysTagFilter, DaysTagFilterByApplication)):
+            days = (self.today - values.astype('datetime64[D]')).astype('int64')
+            mask = _compare(days, operator, operand)
+        elif isinstance(node, (DateTagFilter, DateTagFilterByApplication)):
+            operand = [_to_day(v) for v in operand] if isinstance(operand, list) else _to_day(operand)
+            mask = _compare(values.astype('datetime64[D]'), operator, operand)
+        elif isinstance(node, (BooleanTagFilter, BooleanTagFilterByApplication)):
+            mask = _compare(values.astype(bool), operator, _to_bool(operand))
+        else:
+            mask = _compare(values, operator, operand)
+
+        mask = numpy.asarray(mask, dtype=bool) & present
+        if scope is not None:
+            mask &= scope
+        return mask
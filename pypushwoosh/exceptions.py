@@ -6,6 +6,14 @@ class PushwooshCommandException(PushwooshException):
     pass
 
 
+class PushwooshRateLimitException(PushwooshException):
+    pass
+
+
+class PushwooshCircuitOpenException(PushwooshException):
+    pass
+
+
 class PushwooshNotificationException(PushwooshException):
     pass
 
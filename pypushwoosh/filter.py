@@ -1,15 +1,124 @@
+from array import array
 from datetime import datetime, date
 
-from six import string_types
+from six import string_types, integer_types, add_metaclass, get_unbound_function
+from six.moves import range
 
-from .utils import valid_platform, platform_names, valid_operand_for_operator, valid_operand_list, \
-    valid_operand, valid_operator, valid_days, valid_bool, parse_date
+from .utils import valid_platform, platform_names, valid_days, valid_bool, parse_date, OPERATOR_OPERAND_TYPES, \
+    INT64_TYPECODE
 from .constants import TAG_FILTER_OPERATOR_LTE, TAG_FILTER_OPERATOR_GTE, TAG_FILTER_OPERATOR_EQ, \
     TAG_FILTER_OPERATOR_IN, TAG_FILTER_OPERATOR_BETWEEN, TAG_FILTER_OPERATOR_NOTEQ, TAG_FILTER_OPERATOR_NOTIN
 from .exceptions import PushwooshFilterInvalidOperandException, PushwooshFilterInvalidOperatorException
 
 
+_INT_TYPE = frozenset([int])
+_INTEGER_TYPECODES = 'bBhHiIlLqQ'
+
+
+def _copy_operand(operand):
+    # copies list operands, so later changes of the caller's list do not affect the cached rendered filter.
+    # Integer array.array and numpy arrays and ranges are stored as 8 bytes integer arrays (INT64_TYPECODE), or as
+    # lists on platforms without them.
+    if isinstance(operand, list):
+        return list(operand)
+    if isinstance(operand, array):
+        if operand.typecode not in _INTEGER_TYPECODES or INT64_TYPECODE is None:
+            return operand.tolist()
+        try:
+            return array(INT64_TYPECODE, operand)
+        except OverflowError:
+            return operand.tolist()
+    if isinstance(operand, range):
+        if INT64_TYPECODE is None:
+            return list(operand)
+        try:
+            return array(INT64_TYPECODE, operand)
+        except OverflowError:
+            return list(operand)
+    if hasattr(operand, 'dtype') and hasattr(operand, 'tolist'):  # numpy array or scalar
+        dtype = operand.dtype
+        if INT64_TYPECODE is not None and operand.ndim == 1 and dtype.kind in 'iu' and \
+                not (dtype.kind == 'u' and dtype.itemsize == 8 and operand.size and operand.max() >= 2 ** 63):
+            return array(INT64_TYPECODE, operand.astype('int64').tobytes())
+        return operand.tolist()
+    return operand
+
+
+def _flatten_types(types):
+    result = []
+    for t in types:
+        result.extend(_flatten_types(t) if isinstance(t, tuple) else [t])
+    return tuple(result)
+
+
+class BaseFilterMeta(type):
+    """
+    Compiles the validation tables of tag filter classes and freezes filters once they are constructed.
+    """
+    def __init__(cls, name, bases, attrs):
+        super(BaseFilterMeta, cls).__init__(name, bases, attrs)
+        # operator -> allowed operand types, for the operators of the class
+        cls._operand_types = dict((operator, _flatten_types(OPERATOR_OPERAND_TYPES[operator]))
+                                  for operator in getattr(cls, 'operators', ()))
+        cls._value_types = _flatten_types(getattr(cls, 'value_types', ()))
+
+    def __call__(cls, *args, **kwargs):
+        instance = type.__call__(cls, *args, **kwargs)
+        object.__setattr__(instance, '_frozen', True)
+        return instance
+
+
+@add_metaclass(BaseFilterMeta)
 class BaseFilter(object):
+    """
+    Base filter. Filters are immutable, so the rendered filter string is computed once and cached.
+
+    Filters are equal (and have equal hashes) if their canonical forms are equal, see canonical().
+    """
+    _frozen = False
+
+    def __setattr__(self, name, value):
+        if self._frozen:
+            raise AttributeError('%s is immutable' % self.__class__.__name__)
+        object.__setattr__(self, name, value)
+
+    def __str__(self):
+        rendered = self.__dict__.get('_rendered')
+        if rendered is None:
+            rendered = self._render()
+            object.__setattr__(self, '_rendered', rendered)
+        return rendered
+
+    def _render(self):
+        raise NotImplementedError()
+
+    def canonical(self):
+        """
+        Returns the canonical form of the filter: the rendered filter with operands of unions and intersections
+        flattened, sorted and deduplicated, and IN/NOTIN values and platforms sorted. Filters selecting the same
+        devices by the same rules have the same canonical form.
+        """
+        canonical = self.__dict__.get('_canonical')
+        if canonical is None:
+            canonical = _canonical(self)
+            object.__setattr__(self, '_canonical', canonical)
+        return canonical
+
+    def _canonical_leaf(self):
+        return str(self)
+
+    def __eq__(self, other):
+        if not isinstance(other, BaseFilter):
+            return NotImplemented
+        return self is other or self.canonical() == other.canonical()
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash(self.canonical())
+
     def union(self, other):
         return UnionFilter(self, other)
 
@@ -19,6 +128,16 @@ class BaseFilter(object):
     def subtract(self, other):
         return SubtractFilter(self, other)
 
+    def optimize(self):
+        """
+        Returns an equivalent, usually smaller filter. See optimize().
+        """
+        return optimize(self)
+
+
+# unbound methods are new objects on every access on Python 2
+_base_str = get_unbound_function(BaseFilter.__str__)
+
 
 class BaseOperatorFilter(BaseFilter):
     operation_sign = None
@@ -27,8 +146,21 @@ class BaseOperatorFilter(BaseFilter):
         self.first_filter = first_filter
         self.second_filter = second_filter
 
-    def __str__(self):
-        return '(%s %s %s)' % (self.first_filter, self.operation_sign, self.second_filter)
+    def _render(self):
+        # Renders without recursion, so trees of any depth (e.g. unions built in a loop) can be rendered.
+        # Operands already rendered are reused; only the string of the filter being rendered is cached.
+        parts = []
+        stack = [self]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, string_types):
+                parts.append(item)
+            elif isinstance(item, BaseOperatorFilter) and '_rendered' not in item.__dict__ and \
+                    get_unbound_function(type(item).__str__) is _base_str:
+                stack.extend((')', item.second_filter, ' %s ' % item.operation_sign, item.first_filter, '('))
+            else:
+                parts.append(str(item))
+        return ''.join(parts)
 
 
 class UnionFilter(BaseOperatorFilter):
@@ -56,16 +188,23 @@ class ApplicationFilter(BaseFilter):
             for platform in platforms:
                 if not valid_platform(platform):
                     raise TypeError
+            platforms = list(platforms)
 
         self.platforms = platforms
 
-    def __str__(self):
+    def _render(self, platforms=None):
+        platforms = self.platforms if platforms is None else platforms
         platforms_str = ''
-        if self.platforms is not None:
-            platforms_str = '", "'.join(platform_names(self.platforms))
+        if platforms is not None:
+            platforms_str = '", "'.join(platform_names(platforms))
             platforms_str = ', ["%s"]' % platforms_str
         return '%s("%s"%s)' % (self.prefix, self.code, platforms_str)
 
+    def _canonical_leaf(self):
+        if self.platforms is None:
+            return str(self)
+        return self._render(sorted(set(self.platforms)))
+
 
 class ApplicationGroupFilter(ApplicationFilter):
     prefix = 'G'
@@ -76,27 +215,48 @@ class BaseTagFilter(BaseFilter):
     operators = tuple()
     value_types = tuple()
 
-    def __init__(self, tag_name, operator, operand):
+    def __init__(self, tag_name, operator, operand, unique=False):
+        operand = _copy_operand(operand)
         self.semantic_validation(operator, operand)
 
         self.tag_name = tag_name
         self.operator = operator
+        if unique and operator in (TAG_FILTER_OPERATOR_IN, TAG_FILTER_OPERATOR_NOTIN):
+            operand = _unique(operand, self._list_value_key)
         self.operand = operand
 
-    def __str__(self):
-        return '%s("%s", %s, %s)' % (self.prefix, self.tag_name, self.operator, self._render_operand())
+    def _render(self):
+        return self._format(self._render_operand())
+
+    def _format(self, rendered_operand):
+        return '%s("%s", %s, %s)' % (self.prefix, self.tag_name, self.operator, rendered_operand)
+
+    def _canonical_leaf(self):
+        if self.operator in (TAG_FILTER_OPERATOR_IN, TAG_FILTER_OPERATOR_NOTIN) and \
+                isinstance(self.operand, (list, array)):
+            return self._format(self._render_list_operand(_unique(self.operand, self._list_value_key)))
+        return str(self)
 
     def semantic_validation(self, operator, operand):
-        if not valid_operator(operator, self.operators):
+        operand_types = self._operand_types.get(operator) if isinstance(operator, string_types) else None
+        if operand_types is None:
             raise PushwooshFilterInvalidOperatorException('Invalid operator %s for %s' % (operator, self.__class__.__name__))
 
-        if not valid_operand_for_operator(operand, operator):
+        if not isinstance(operand, operand_types):
             raise PushwooshFilterInvalidOperandException('Invalid operand type %s for operator %s' % (type(operand).__name__, operator))
 
-        if isinstance(operand, list) and not valid_operand_list(operand, self.value_types):
-            raise PushwooshFilterInvalidOperandException('Invalid operand list value for %s' % self.__class__.__name__)
+        if isinstance(operand, list):
+            # checks every distinct type once instead of every value
+            value_types = self._value_types
+            if not all(issubclass(t, value_types) for t in set(map(type, operand))):
+                raise PushwooshFilterInvalidOperandException('Invalid operand list value for %s' % self.__class__.__name__)
 
-        if not isinstance(operand, list) and not valid_operand(operand, self.value_types):
+        elif isinstance(operand, array):
+            # integer values only, see _copy_operand()
+            if not issubclass(int, self._value_types):
+                raise PushwooshFilterInvalidOperandException('Invalid operand list value for %s' % self.__class__.__name__)
+
+        elif not isinstance(operand, self._value_types):
             raise PushwooshFilterInvalidOperandException('Invalid operand type %s for %s' % (type(operand).__name__, self.__class__.__name__))
 
         if operator == TAG_FILTER_OPERATOR_BETWEEN and len(operand) != 2:
@@ -106,7 +266,7 @@ class BaseTagFilter(BaseFilter):
             raise PushwooshFilterInvalidOperandException('Invalid operand len for operator %s' % operator)
 
     def _render_operand(self):
-        if isinstance(self.operand, list):
+        if isinstance(self.operand, (list, array)):
             return self._render_list_operand(self.operand)
         elif isinstance(self.operand, int):
             return self._render_int_operand(self.operand)
@@ -116,14 +276,33 @@ class BaseTagFilter(BaseFilter):
         raise NotImplementedError()
 
     def _render_list_operand(self, operand):
+        if isinstance(operand, array):
+            operand = operand.tolist()
+        if set(map(type, operand)) <= _INT_TYPE:
+            # ints only: the repr of the list is the rendered list
+            return repr(list(operand))
         result = []
         for op in operand:
-            if isinstance(op, int):
-                result.append(self._render_int_operand(op))
-            elif isinstance(op, string_types):
-                result.append(self._render_str_operand(op))
+            rendered = self._render_list_value(op)
+            if rendered is not None:
+                result.append(rendered)
         return '[%s]' % ', '.join(result)
 
+    def _render_list_value(self, value):
+        # None for values left out of rendered lists
+        if isinstance(value, int):
+            return self._render_int_operand(value)
+        elif isinstance(value, string_types):
+            return self._render_str_operand(value)
+        return None
+
+    def _list_value_key(self, value):
+        # integers first, then other values by rendering, so values of any types can be sorted
+        if isinstance(value, integer_types):
+            return 0, value
+        rendered = self._render_list_value(value)
+        return 1, rendered if rendered is not None else ''
+
     def _render_str_operand(self, operand):
         return '"%s"' % operand
 
@@ -134,13 +313,12 @@ class BaseTagFilter(BaseFilter):
 class ApplicationBaseTagFilter(BaseTagFilter):
     prefix = 'AT'
 
-    def __init__(self, tag_name, operator, operand, code):
-        super(ApplicationBaseTagFilter, self).__init__(tag_name, operator, operand)
+    def __init__(self, tag_name, operator, operand, code, unique=False):
+        super(ApplicationBaseTagFilter, self).__init__(tag_name, operator, operand, unique)
         self.code = code
 
-    def __str__(self):
-        return '%s("%s", "%s", %s, %s)' % (self.prefix, self.code, self.tag_name, self.operator,
-                                           self._render_operand())
+    def _format(self, rendered_operand):
+        return '%s("%s", "%s", %s, %s)' % (self.prefix, self.code, self.tag_name, self.operator, rendered_operand)
 
 
 class IntegerTagFilter(BaseTagFilter):
@@ -240,3 +418,256 @@ class BooleanTagFilterByApplication(ApplicationBaseTagFilter):
         super(BooleanTagFilterByApplication, self).semantic_validation(operator, operand)
         if not valid_bool(operand):
             raise PushwooshFilterInvalidOperandException('%s value must be 0, 1, "true" or "false"' % self.__class__.__name__)
+
+
+def _unique(values, key):
+    # distinct values sorted by key(value); values having the same key are the same value
+    if isinstance(values, array):
+        return array(values.typecode, sorted(set(values)))
+    if isinstance(values, list):
+        if set(map(type, values)) <= _INT_TYPE:
+            return sorted(set(values))
+        result = {}
+        for value in values:
+            result.setdefault(key(value), value)
+        return [result[value_key] for value_key in sorted(result)]
+    return values
+
+
+def _canonical(filter):
+    # canonical form of filter, computed without recursion; see BaseFilter.canonical()
+    results = {}
+    operands = {}
+    stack = [(filter, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if id(node) in results:
+            continue
+        if node is not filter and '_canonical' in node.__dict__:
+            results[id(node)] = node.__dict__['_canonical']
+            continue
+        if not isinstance(node, BaseOperatorFilter):
+            results[id(node)] = node._canonical_leaf()
+            continue
+        if not children_done:
+            if isinstance(node, SubtractFilter):
+                children = [node.first_filter, node.second_filter]
+            else:
+                children = operands[id(node)] = _flatten(node)
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(children))
+            continue
+
+        if isinstance(node, SubtractFilter):
+            results[id(node)] = '(%s %s %s)' % (results[id(node.first_filter)], node.operation_sign,
+                                                results[id(node.second_filter)])
+            continue
+
+        items = sorted(set(results[id(operand)] for operand in operands.pop(id(node))))
+        if len(items) == 1:
+            results[id(node)] = items[0]
+        else:
+            results[id(node)] = '(%s)' % (' %s ' % node.operation_sign).join(items)
+    return results[id(filter)]
+
+
+_IN_MERGEABLE = (IntegerTagFilter, StringTagFilter, ListTagFilter,
+                 IntegerTagFilterByApplication, StringTagFilterByApplication, ListTagFilterByApplication)
+_NOTIN_MERGEABLE = (IntegerTagFilter, StringTagFilter, IntegerTagFilterByApplication, StringTagFilterByApplication)
+_RANGE_MERGEABLE = (IntegerTagFilter, DaysTagFilter, IntegerTagFilterByApplication, DaysTagFilterByApplication)
+
+
+class _Empty(object):
+    # filter matching no devices; example is a filter expressing it, used if the whole filter is empty
+    def __init__(self, example):
+        self.example = example
+
+
+def _tag_key(tag_filter):
+    return type(tag_filter), tag_filter.tag_name, getattr(tag_filter, 'code', None)
+
+
+def _make_tag_filter(key, operator, operand):
+    cls, tag_name, code = key
+    if issubclass(cls, ApplicationBaseTagFilter):
+        return cls(tag_name, operator, operand, code)
+    return cls(tag_name, operator, operand)
+
+
+def _values_mergeable(item, classes, operator, list_operator):
+    # list operands of operator (e.g. EQ on a list tag) do not mean list_operator and are never merged
+    if type(item) not in classes:
+        return False
+    if item.operator == operator:
+        return not isinstance(item.operand, (list, array))
+    return item.operator == list_operator
+
+
+def _merge_values(items, classes, operator, list_operator):
+    # merges tag filters of the same tag with scalar operator or list_operator operands into one list_operator filter
+    groups = {}
+    for item in items:
+        if _values_mergeable(item, classes, operator, list_operator):
+            groups.setdefault(_tag_key(item), []).append(item)
+
+    result = []
+    for item in items:
+        if not _values_mergeable(item, classes, operator, list_operator):
+            result.append(item)
+            continue
+        key = _tag_key(item)
+        group = groups.pop(key, None)
+        if group is None:
+            continue
+        if len(group) == 1:
+            result.append(item)
+            continue
+        values = []
+        seen = set()
+        for tag_filter in group:
+            operand = tag_filter.operand if tag_filter.operator == list_operator else [tag_filter.operand]
+            for value in operand:
+                if value not in seen:
+                    seen.add(value)
+                    values.append(value)
+        result.append(_make_tag_filter(key, list_operator, values))
+    return result
+
+
+def _merge_ranges(items):
+    # merges overlapping and adjacent BETWEEN ranges of the same integer tag
+    groups = {}
+    for item in items:
+        if type(item) in _RANGE_MERGEABLE and item.operator == TAG_FILTER_OPERATOR_BETWEEN:
+            groups.setdefault(_tag_key(item), []).append(item)
+
+    result = []
+    for item in items:
+        if not (type(item) in _RANGE_MERGEABLE and item.operator == TAG_FILTER_OPERATOR_BETWEEN):
+            result.append(item)
+            continue
+        key = _tag_key(item)
+        group = groups.pop(key, None)
+        if group is None:
+            continue
+        if len(group) == 1:
+            result.append(item)
+            continue
+        ranges = sorted((min(f.operand), max(f.operand)) for f in group)
+        merged = [list(ranges[0])]
+        for low, high in ranges[1:]:
+            if low <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], high)
+            else:
+                merged.append([low, high])
+        result.extend(_make_tag_filter(key, TAG_FILTER_OPERATOR_BETWEEN, bounds) for bounds in merged)
+    return result
+
+
+def _dedupe(items):
+    seen = set()
+    result = []
+    for item in items:
+        key = str(item)
+        if key not in seen:
+            seen.add(key)
+            result.append(item)
+    return result
+
+
+def optimize(filter):
+    """
+    Returns a filter selecting the same devices as filter, usually with a shorter rendered string:
+
+        nested unions and intersections are flattened and identical operands are removed;
+
+        EQ and IN filters of the same tag joined by union are merged into one IN filter, NOTEQ and NOTIN filters
+        joined by intersection into one NOTIN filter;
+
+        overlapping and adjacent BETWEEN ranges of the same integer tag joined by union are merged;
+
+        subtractions of a filter from itself, which select nothing, are removed from unions (an intersection
+        with them or subtracting from them selects nothing too).
+
+    Operands keep their original order. Trees of any depth are processed without recursion.
+    """
+    results = {}
+    chains = {}
+    operands = {}
+    stack = [(filter, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if id(node) in results:
+            continue
+        if not isinstance(node, BaseOperatorFilter):
+            results[id(node)] = node
+            continue
+        if not children_done:
+            if isinstance(node, SubtractFilter):
+                children = [node.first_filter, node.second_filter]
+            else:
+                children = operands[id(node)] = _flatten(node)
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(children))
+            continue
+
+        if isinstance(node, SubtractFilter):
+            results[id(node)] = _optimize_subtraction(results[id(node.first_filter)], results[id(node.second_filter)])
+            continue
+
+        cls = type(node)
+        items = []
+        empty = None
+        for operand in operands.pop(id(node)):
+            operand = results[id(operand)]
+            if isinstance(operand, _Empty):
+                empty = empty or operand
+            elif id(operand) in chains and type(operand) is cls:
+                items.extend(chains[id(operand)])
+            else:
+                items.append(operand)
+
+        if isinstance(node, IntersectFilter):
+            if empty is not None:
+                results[id(node)] = empty
+                continue
+            items = _merge_values(_dedupe(items), _NOTIN_MERGEABLE, TAG_FILTER_OPERATOR_NOTEQ,
+                                  TAG_FILTER_OPERATOR_NOTIN)
+        else:
+            if not items:
+                results[id(node)] = empty
+                continue
+            items = _dedupe(_merge_ranges(_merge_values(_dedupe(items), _IN_MERGEABLE, TAG_FILTER_OPERATOR_EQ,
+                                                        TAG_FILTER_OPERATOR_IN)))
+
+        result = items[0]
+        for item in items[1:]:
+            result = cls(result, item)
+        if len(items) > 1:
+            chains[id(result)] = items
+        results[id(node)] = result
+
+    result = results[id(filter)]
+    return result.example if isinstance(result, _Empty) else result
+
+
+def _flatten(node):
+    # operands of a chain of unions (or intersections) in their order
+    result = []
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if type(item) is type(node):
+            stack.append(item.second_filter)
+            stack.append(item.first_filter)
+        else:
+            result.append(item)
+    return result
+
+
+def _optimize_subtraction(first, second):
+    if isinstance(first, _Empty) or isinstance(second, _Empty):
+        return first
+    if str(first) == str(second):
+        return _Empty(SubtractFilter(first, second))
+    return SubtractFilter(first, second)
@@ -3,12 +3,110 @@ from six import string_types, add_metaclass
 
 from . import constants
 from .filter import BaseFilter
-from .utils import render_attrs
 from .exceptions import PushwooshNotificationException
 
 
+def compile_render(mixins):
+    """
+    Generates a render function filling one dict with the fields of all mixins in a single pass.
+
+    Each mixin declares its rendered attributes:
+
+        _required_fields: rendered always.
+
+        _optional_fields: rendered if not None.
+
+        _dependent_fields: dict of optional field name to fields rendered always when that field is rendered.
+
+        _extra_fields: instance attributes that are not rendered directly.
+
+        _check: optional method validating the notification before rendering.
+
+    Mixins defining their own render() method are rendered by calling it. Attributes are looked up through the
+    MRO, so subclasses of mixins render the fields they inherit.
+    """
+    namespace = {}
+    lines = ['def render(self):']
+
+    for i, mixin in enumerate(mixins):
+        check = getattr(mixin, '_check', None)
+        if check is not None:
+            namespace['_check_%d' % i] = check
+            lines.append('    _check_%d(self)' % i)
+
+    lines.append('    result = {}')
+    for i, mixin in enumerate(mixins):
+        render = getattr(mixin, 'render', None)
+        if render is not None and not getattr(render, 'render_plan', False):
+            namespace['_render_%d' % i] = render
+            lines.append('    result.update(_render_%d(self))' % i)
+            continue
+
+        dependent_fields = getattr(mixin, '_dependent_fields', {})
+        for field in getattr(mixin, '_required_fields', ()):
+            lines.append('    result[%r] = self.%s' % (field, field))
+        for field in getattr(mixin, '_optional_fields', ()):
+            lines.append('    value = self.%s' % field)
+            lines.append('    if value is not None:')
+            lines.append('        result[%r] = value' % field)
+            for dependent_field in dependent_fields.get(field, ()):
+                lines.append('        result[%r] = self.%s' % (dependent_field, dependent_field))
+    lines.append('    return result')
+
+    exec(compile('\n'.join(lines) + '\n', '<render plan>', 'exec'), namespace)
+    render = namespace['render']
+    render.render_plan = True
+    return render
+
+
+def rendered_fields(mixins):
+    """
+    Returns names of the attributes rendered by mixins, in declaration order.
+    """
+    result = []
+    for mixin in mixins:
+        fields = list(getattr(mixin, '_required_fields', ()))
+        fields.extend(getattr(mixin, '_optional_fields', ()))
+        for dependent_fields in getattr(mixin, '_dependent_fields', {}).values():
+            fields.extend(dependent_fields)
+        result.extend(field for field in fields if field not in result)
+    return result
+
+
+def instance_fields(mixins):
+    """
+    Returns names of the instance attributes declared by mixins, in declaration order.
+    """
+    result = rendered_fields(mixins)
+    for mixin in mixins:
+        result.extend(field for field in getattr(mixin, '_extra_fields', ()) if field not in result)
+    return result
+
+
+def _class_attributes(bases):
+    # slots of the bases and properties such as devices_filter are class attributes too
+    result = set()
+    for base in bases:
+        for klass in base.__mro__:
+            result.update(klass.__dict__)
+    return result
+
+
+class BaseNotificationMixinMeta(type):
+    def __new__(mcs, name, bases, dct):
+        cls = type.__new__(mcs, name, bases, dct)
+        declares_fields = any(attr in dct for attr in ('_required_fields', '_optional_fields'))
+        if declares_fields and 'render' not in dct:
+            cls.render = compile_render([cls])
+        return cls
+
+
+@add_metaclass(BaseNotificationMixinMeta)
 class BaseNotificationMixin(object):
-    pass
+    _required_fields = tuple()
+    _optional_fields = tuple()
+    _dependent_fields = {}
+    _extra_fields = tuple()
 
 
 class BaseNotification(object):
@@ -19,22 +117,38 @@ class BaseNotification(object):
             klass.__init__(self)
 
     def render(self):
-        result = {}
-        for klass in self._mixed:
-            ret = klass.render(self)
-            result.update(ret)
-        return result
+        return self._render_plan()
 
+    def _render_plan(self):
+        return {}
 
-class BaseNotificationMeta(type):
+
+class BaseNotificationMeta(BaseNotificationMixinMeta):
+    """
+    Collects notification mixins of the class in declaration order into _mixed and compiles _render_plan,
+    the function rendering all of them at once.
+
+    Classes setting _compact = True (and their subclasses) get __slots__ for all instance_fields() of the mixins,
+    so their instances keep field values without a per-instance __dict__. Attributes not declared by the mixins
+    still can be set, they are stored in __dict__ created on demand.
+    """
     def __new__(mcs, name, bases, dct):
-        _mixed = set(dct.get('_mixed', tuple()))
+        _mixed = list(dct.get('_mixed', tuple()))
         for klass in bases:
             if issubclass(klass, BaseNotificationMixin) and not issubclass(klass, BaseNotification):
-                _mixed.add(klass)
+                candidates = [klass]
             elif issubclass(klass, BaseNotification):
-                _mixed.update(getattr(klass, '_mixed', tuple()))
+                candidates = getattr(klass, '_mixed', tuple())
+            else:
+                continue
+            _mixed.extend(candidate for candidate in candidates if candidate not in _mixed)
         dct['_mixed'] = tuple(_mixed)
+        dct['_render_plan'] = compile_render(_mixed)
+
+        compact = dct.get('_compact', any(getattr(klass, '_compact', False) for klass in bases))
+        if compact and '__slots__' not in dct:
+            defined = _class_attributes(bases)
+            dct['__slots__'] = tuple(field for field in instance_fields(_mixed) if field not in defined)
         return type.__new__(mcs, name, bases, dct)
 
 
@@ -58,6 +172,10 @@ class CommonNotificationMixin(BaseNotificationMixin):
         data (dict): Optional. Custom data will be passed to device with notification.
     """
 
+    _required_fields = ('send_date', 'content')
+    _optional_fields = ('ignore_user_timezone', 'page_id', 'link', 'data', 'users')
+    _dependent_fields = {'link': ('minimize_link',)}
+
     def __init__(self):
         self.send_date = constants.SEND_DATE_NOW
         self.ignore_user_timezone = None
@@ -68,18 +186,6 @@ class CommonNotificationMixin(BaseNotificationMixin):
         self.data = None
         self.users = None
 
-    def render(self):
-        result = {
-            'send_date': self.send_date,
-            'content': self.content,
-        }
-        render_attrs(self, result, ('ignore_user_timezone', 'page_id', 'link', 'data', 'users'))
-
-        if 'link' in result:
-            result['minimize_link'] = self.minimize_link
-
-        return result
-
 
 class FilteredNotificationMixin(BaseNotificationMixin):
     """
@@ -98,20 +204,18 @@ class FilteredNotificationMixin(BaseNotificationMixin):
 
 #   TODO: better describe this
 
+    _optional_fields = ('platforms', 'devices', 'filter', 'conditions')
+
     def __init__(self):
         self.platforms = None
         self.devices = None
         self.filter = None
         self.conditions = None
 
-    def render(self):
+    def _check(self):
         if self.filter is not None and self.conditions is not None:
             raise PushwooshNotificationException('filter and conditions is mutually exclusive options')
 
-        result = {}
-        render_attrs(self, result, ('platforms', 'devices', 'filter', 'conditions'))
-        return result
-
 
 class DevicesFilterNotificationMixin(BaseNotificationMixin):
     """
@@ -123,6 +227,9 @@ class DevicesFilterNotificationMixin(BaseNotificationMixin):
 
 #   TODO: better describe this
 
+    _required_fields = ('devices_filter',)
+    _extra_fields = ('_devices_filter',)
+
     def __init__(self):
         self._devices_filter = None
 
@@ -136,10 +243,9 @@ class DevicesFilterNotificationMixin(BaseNotificationMixin):
             raise PushwooshNotificationException('Must be BaseFilter or string.')
         self._devices_filter = filter
 
-    def render(self):
+    def _check(self):
         if self.devices_filter is None:
             raise PushwooshNotificationException('devices_filter is required')
-        return {'devices_filter': self.devices_filter}
 
 
 class IOSNotificationMixin(BaseNotificationMixin):
@@ -160,6 +266,9 @@ class IOSNotificationMixin(BaseNotificationMixin):
         apns_trim_content (bool): Optional. Trims the exceeding content strings with ellipsis
     """
 
+    _optional_fields = ('ios_badges', 'ios_sound', 'ios_ttl', 'ios_root_params', 'apns_trim_content')
+    _extra_fields = ('ios_category_id',)
+
     def __init__(self):
         self.ios_badges = None
         self.ios_sound = None
@@ -168,11 +277,6 @@ class IOSNotificationMixin(BaseNotificationMixin):
         self.ios_root_params = None
         self.apns_trim_content = None
 
-    def render(self):
-        result = {}
-        render_attrs(self, result, ('ios_badges', 'ios_sound', 'ios_ttl', 'ios_root_params', 'apns_trim_content'))
-        return result
-
 
 class AndroidNotificationMixin(BaseNotificationMixin):
     """
@@ -194,6 +298,9 @@ class AndroidNotificationMixin(BaseNotificationMixin):
         android_gcm_ttl (int): Optional. Time to live parameter - the maximum lifespan of a message in seconds
     """
 
+    _optional_fields = ('android_root_params', 'android_sound', 'android_header', 'android_icon',
+                        'android_custom_icon', 'android_banner', 'android_gcm_ttl')
+
     def __init__(self):
         self.android_root_params = None
         self.android_sound = None
@@ -203,12 +310,6 @@ class AndroidNotificationMixin(BaseNotificationMixin):
         self.android_banner = None
         self.android_gcm_ttl = None
 
-    def render(self):
-        result = {}
-        render_attrs(self, result, ('android_root_params', 'android_sound', 'android_header', 'android_icon',
-                                    'android_custom_icon', 'android_banner', 'android_gcm_ttl'))
-        return result
-
 
 class WindowsPhoneNotificationMixin(BaseNotificationMixin):
     """
@@ -228,6 +329,9 @@ class WindowsPhoneNotificationMixin(BaseNotificationMixin):
         wp_count (int): Optional. Badge for Windows Phone notification
     """
 
+    _optional_fields = ('wp_type', 'wp_background', 'wp_backbackground', 'wp_backtitle', 'wp_count',
+                        'wp_backcontent')
+
     def __init__(self):
         self.wp_type = None
         self.wp_background = None
@@ -236,11 +340,6 @@ class WindowsPhoneNotificationMixin(BaseNotificationMixin):
         self.wp_backcontent = None
         self.wp_count = None
 
-    def render(self):
-        result = {}
-        render_attrs(self, result, ('wp_type', 'wp_background', 'wp_backbackground', 'wp_backtitle', 'wp_count', 'wp_backcontent'))
-        return result
-
 
 class OSXNotificationMixin(BaseNotificationMixin):
     """
@@ -256,17 +355,14 @@ class OSXNotificationMixin(BaseNotificationMixin):
         mac_ttl (int): Optional. Time to live parameter - the maximum lifespan of a message in seconds
     """
 
+    _optional_fields = ('mac_badges', 'mac_sound', 'mac_root_params', 'mac_ttl')
+
     def __init__(self):
         self.mac_badges = None
         self.mac_sound = None
         self.mac_root_params = None
         self.mac_ttl = None
 
-    def render(self):
-        result = {}
-        render_attrs(self, result, ('mac_badges', 'mac_sound', 'mac_root_params', 'mac_ttl'))
-        return result
-
 
 class Windows8NotificationMixin(BaseNotificationMixin):
     """
@@ -282,16 +378,13 @@ class Windows8NotificationMixin(BaseNotificationMixin):
         16 characters.
     """
 
+    _optional_fields = ('wns_content', 'wns_type', 'wns_tag')
+
     def __init__(self):
         self.wns_content = None
         self.wns_type = None
         self.wns_tag = None
 
-    def render(self):
-        result = {}
-        render_attrs(self, result, ('wns_content', 'wns_type', 'wns_tag'))
-        return result
-
 
 class SafariNotificationMixin(BaseNotificationMixin):
     """
@@ -309,17 +402,14 @@ class SafariNotificationMixin(BaseNotificationMixin):
 
 #   TODO: better describe this
 
+    _optional_fields = ('safari_title', 'safari_action', 'safari_url_args', 'safari_ttl')
+
     def __init__(self):
         self.safari_title = None
         self.safari_action = None
         self.safari_url_args = None
         self.safari_ttl = None
 
-    def render(self):
-        result = {}
-        render_attrs(self, result, ('safari_title', 'safari_action', 'safari_url_args', 'safari_ttl'))
-        return result
-
 
 class AmazonNotificationMixin(BaseNotificationMixin):
     """
@@ -343,6 +433,9 @@ class AmazonNotificationMixin(BaseNotificationMixin):
 
 #   TODO: better describe this
 
+    _optional_fields = ('adm_root_params', 'adm_sound', 'adm_header', 'adm_icon', 'adm_custom_icon', 'adm_banner',
+                        'adm_ttl')
+
     def __init__(self):
         self.adm_root_params = None
         self.adm_sound = None
@@ -352,12 +445,6 @@ class AmazonNotificationMixin(BaseNotificationMixin):
         self.adm_banner = None
         self.adm_ttl = None
 
-    def render(self):
-        result = {}
-        render_attrs(self, result, ('adm_root_params', 'adm_sound', 'adm_header', 'adm_icon', 'adm_custom_icon',
-                                    'adm_banner', 'adm_ttl'))
-        return result
-
 
 class BlackBerryNotificationMixin(BaseNotificationMixin):
     """
@@ -369,14 +456,11 @@ class BlackBerryNotificationMixin(BaseNotificationMixin):
 
 #   TODO: better describe this
 
+    _optional_fields = ('blackberry_header',)
+
     def __init__(self):
         self.blackberry_header = None
 
-    def render(self):
-        result = {}
-        render_attrs(self, result, ('blackberry_header',))
-        return result
-
 
 class ChromeNotificationMixin(BaseNotificationMixin):
     """
@@ -396,6 +480,9 @@ class ChromeNotificationMixin(BaseNotificationMixin):
 
 #   TODO: better describe this
 
+    _optional_fields = ('chrome_title', 'chrome_icon', 'chrome_gcm_ttl', 'chrome_duration', 'chrome_image',
+                        'chrome_button_text1', 'chrome_button_url1', 'chrome_button_text2', 'chrome_button_url2')
+
     def __init__(self):
         self.chrome_title = None
         self.chrome_icon = None
@@ -407,13 +494,6 @@ class ChromeNotificationMixin(BaseNotificationMixin):
         self.chrome_button_text2 = None
         self.chrome_button_url2 = None
 
-    def render(self):
-        result = {}
-        render_attrs(self, result, ('chrome_title', 'chrome_icon', 'chrome_gcm_ttl', 'chrome_duration',
-                                    'chrome_image', 'chrome_button_text1', 'chrome_button_url1',
-                                    'chrome_button_text2', 'chrome_button_url2'))
-        return result
-
 
 @add_metaclass(BaseNotificationMeta)
 class Notification(BaseNotification,
@@ -431,3 +511,11 @@ class Notification(BaseNotification,
     """
     Pushwoosh notification. Includes all supported platforms mixins. Renders notification to dict.
     """
+
+
+class CompactNotification(Notification):
+    """
+    Notification keeping its attributes in __slots__ instead of a per-instance __dict__. Uses about a third of
+    the memory of Notification, handy when holding many queued notifications.
+    """
+    _compact = True
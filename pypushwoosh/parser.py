@@ -0,0 +1,165 @@
+"""
+Parser of filter strings (as rendered by str(filter)) back into filter trees.
+
+Parsing takes linear time and uses no recursion, so filters of any size and depth can be parsed.
+"""
+import re
+
+from six import iteritems
+
+from .filter import UnionFilter, IntersectFilter, SubtractFilter, ApplicationFilter, ApplicationGroupFilter, \
+    IntegerTagFilter, StringTagFilter, ListTagFilter, DateTagFilter, DaysTagFilter, BooleanTagFilter, \
+    IntegerTagFilterByApplication, StringTagFilterByApplication, ListTagFilterByApplication, \
+    DateTagFilterByApplication, DaysTagFilterByApplication, BooleanTagFilterByApplication
+from .constants import PLATFORM_NAMES, TAG_FILTER_OPERATOR_LTE, TAG_FILTER_OPERATOR_GTE, TAG_FILTER_OPERATOR_EQ, \
+    TAG_FILTER_OPERATOR_IN, TAG_FILTER_OPERATOR_BETWEEN, TAG_FILTER_OPERATOR_NOTEQ, TAG_FILTER_OPERATOR_NOTIN
+from .exceptions import PushwooshFilterException
+
+
+OPERATOR_FILTERS = {
+    UnionFilter.operation_sign: UnionFilter,
+    IntersectFilter.operation_sign: IntersectFilter,
+    SubtractFilter.operation_sign: SubtractFilter,
+}
+
+BY_APPLICATION = {
+    IntegerTagFilter: IntegerTagFilterByApplication,
+    StringTagFilter: StringTagFilterByApplication,
+    ListTagFilter: ListTagFilterByApplication,
+    DateTagFilter: DateTagFilterByApplication,
+    DaysTagFilter: DaysTagFilterByApplication,
+    BooleanTagFilter: BooleanTagFilterByApplication,
+}
+
+TAG_FILTER_OPERATORS = (TAG_FILTER_OPERATOR_LTE, TAG_FILTER_OPERATOR_GTE, TAG_FILTER_OPERATOR_EQ,
+                        TAG_FILTER_OPERATOR_IN, TAG_FILTER_OPERATOR_BETWEEN, TAG_FILTER_OPERATOR_NOTEQ,
+                        TAG_FILTER_OPERATOR_NOTIN)
+
+_PLATFORMS = dict((name, platform) for platform, name in iteritems(PLATFORM_NAMES))
+
+_VALUE = r'"[^"]*"|-?\d+'
+_LIST = r'\[((?:"[^"]*"|[^"\]])*)\]'
+
+# whitespace, then a parenthesis, an operation sign or a whole A, G, T or AT filter
+_TOKEN = re.compile(r'''\s*(?:
+    ([()])
+  | ([+*\\])
+  | ([AG])\s*\(\s*"([^"]*)"\s*(?:,\s*%(list)s\s*)?\)
+  | (?:AT\s*\(\s*"([^"]*)"\s*,|T\s*\()\s*"([^"]*)"\s*,\s*([A-Z]+)\s*,\s*(?:(%(value)s)|%(list)s)\s*\)
+)''' % {'list': _LIST, 'value': _VALUE}, re.X)
+
+_LIST_VALUES = re.compile(r'\s*(?:(?:%(value)s)\s*(?:,\s*(?:%(value)s)\s*)*)?$' % {'value': _VALUE})
+_LIST_VALUE = re.compile(r'"([^"]*)"|(-?\d+)')
+
+
+def _error(message, position):
+    raise PushwooshFilterException('Invalid filter: %s at %d' % (message, position))
+
+
+def _values(rendered, position):
+    if not _LIST_VALUES.match(rendered):
+        _error('invalid list', position)
+    return [int(number) if number else string for string, number in _LIST_VALUE.findall(rendered)]
+
+
+def _value(rendered):
+    return rendered[1:-1] if rendered[0] == '"' else int(rendered)
+
+
+def _default_tag_class(operator, operand):
+    values = operand if isinstance(operand, list) else [operand]
+    if values and all(isinstance(value, int) for value in values):
+        return IntegerTagFilter
+    if operator in (TAG_FILTER_OPERATOR_LTE, TAG_FILTER_OPERATOR_GTE, TAG_FILTER_OPERATOR_BETWEEN):
+        return DateTagFilter
+    return StringTagFilter
+
+
+def _build(cls, attributes):
+    # the values were validated when the filter was rendered, so constructors are bypassed
+    instance = cls.__new__(cls)
+    instance.__dict__.update(attributes)
+    instance.__dict__['_frozen'] = True
+    return instance
+
+
+def _leaf(m, tag_types):
+    position = m.start()
+    if m.group(3):
+        cls = ApplicationFilter if m.group(3) == ApplicationFilter.prefix else ApplicationGroupFilter
+        platforms = None
+        if m.group(5) is not None:
+            platforms = []
+            for name in _values(m.group(5), position):
+                if name not in _PLATFORMS:
+                    _error('unknown platform %s' % name, position)
+                platforms.append(_PLATFORMS[name])
+        return _build(cls, {'code': m.group(4), 'platforms': platforms})
+
+    code, tag_name, operator = m.group(6, 7, 8)
+    if operator not in TAG_FILTER_OPERATORS:
+        _error('unknown operator %s' % operator, position)
+    operand = _value(m.group(9)) if m.group(9) is not None else _values(m.group(10), position)
+
+    cls = tag_types.get(tag_name) or _default_tag_class(operator, operand)
+    if code is None:
+        return _build(cls, {'tag_name': tag_name, 'operator': operator, 'operand': operand})
+    return _build(BY_APPLICATION.get(cls, cls),
+                  {'tag_name': tag_name, 'operator': operator, 'operand': operand, 'code': code})
+
+
+def parse(filter_string, tag_types=None):
+    """
+    Returns the filter rendered to filter_string, i.e. parse(str(devices_filter)) == devices_filter.
+
+    Filter strings do not tell tag types apart, so tag filters are built as IntegerTagFilter for integer
+    operands, DateTagFilter for string operands of LTE, GTE and BETWEEN, and StringTagFilter otherwise (or their
+    ByApplication variants for AT filters). tag_types maps tag names to tag filter classes (e.g.
+    {'interests': ListTagFilter}) to override this; ByApplication variants are used for AT filters.
+
+    Operands are not validated again. Strings must not contain double quotes, which filters do not escape.
+    Raises PushwooshFilterException if filter_string is not a valid filter.
+    """
+    tag_types = tag_types or {}
+    match = _TOKEN.match
+    size = len(filter_string)
+    position = 0
+
+    # frames of the operator filters being parsed: [first filter or None, operator filter class or None]
+    frames = []
+    result = None
+    while True:
+        m = match(filter_string, position)
+        if m is None:
+            if filter_string[position:].strip():
+                _error('unexpected %r' % filter_string[position:].lstrip()[:20], position)
+            _error('unexpected end', size)
+        position = m.end()
+        parenthesis, sign = m.group(1, 2)
+
+        if frames and frames[-1][0] is not None and frames[-1][1] is None:
+            if not sign:
+                _error('expected operation sign', m.start())
+            frames[-1][1] = OPERATOR_FILTERS[sign]
+            continue
+        elif result is None:
+            if parenthesis == '(':
+                frames.append([None, None])
+                continue
+            if parenthesis or sign:
+                _error('expected filter', m.start())
+            result = _leaf(m, tag_types)
+        elif parenthesis == ')':
+            first, cls = frames.pop()
+            result = _build(cls, {'first_filter': first, 'second_filter': result})
+        else:
+            _error('expected )', m.start())
+
+        # a filter was parsed: it is the first operand of the innermost frame or waits for its closing parenthesis
+        if frames and frames[-1][0] is None:
+            frames[-1][0] = result
+            result = None
+        elif not frames:
+            if filter_string[position:].strip():
+                _error('unexpected %r' % filter_string[position:].lstrip()[:20], position)
+            return result
@@ -0,0 +1,218 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from six import string_types
+
+from .utils import monotonic
+from .exceptions import PushwooshRateLimitException
+
+
+KEY_AUTH = 'auth'
+KEY_APPLICATION = 'application'
+KEY_COMMAND_NAME = 'command_name'
+
+
+class TokenBucket(object):
+    """
+    Token bucket refilled with ``rate`` tokens per second up to ``capacity`` tokens.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = self.capacity
+        self.timestamp = monotonic()
+
+    def consume(self, tokens=1, now=None):
+        """
+        Takes ``tokens`` from the bucket if there are enough of them. Returns 0 on success, otherwise the number
+        of seconds after which the bucket will hold enough tokens (nothing is taken in that case).
+        """
+        if now is None:
+            now = monotonic()
+
+        if now > self.timestamp:
+            self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+        self.timestamp = now
+
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+
+class LocalBucketBackend(object):
+    """
+    Keeps token buckets in the memory of the current process. Thread-safe.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, tokens, rate, capacity):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate, capacity)
+            return bucket.consume(tokens)
+
+
+class SharedMemoryBucketBackend(object):
+    """
+    Keeps token buckets in a memory-mapped file shared by all processes that open the same path, so every worker
+    on a node draws from one budget. Updates are serialized with an exclusive fcntl lock on the file. POSIX only.
+
+    Buckets live in a fixed-size open addressing table of ``slots`` entries keyed by a hash of the bucket key.
+    All processes must use the same ``slots``. Put the file on a memory-backed filesystem such as /dev/shm.
+
+    Attributes:
+        path (str): Required. Path to the shared state file. Created if it does not exist.
+
+        slots (int): Optional. Maximum number of distinct buckets.
+    """
+    magic = b'PWRL'
+    header = struct.Struct('<4sII')
+    slot = struct.Struct('<Qdd')
+
+    def __init__(self, path, slots=1024):
+        if fcntl is None:
+            raise ImportError('SharedMemoryBucketBackend requires fcntl')
+
+        self.path = path
+        self.slots = slots
+        self.size = self.header.size + self.slot.size * slots
+
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                self._initialize()
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+            self._mmap = mmap.mmap(self._fd, self.size)
+        except Exception:
+            os.close(self._fd)
+            raise
+
+    def _initialize(self):
+        if os.fstat(self._fd).st_size == 0:
+            os.ftruncate(self._fd, self.size)
+            os.write(self._fd, self.header.pack(self.magic, 1, self.slots))
+            return
+
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        magic, _, slots = self.header.unpack(os.read(self._fd, self.header.size))
+        if magic != self.magic or slots != self.slots:
+            raise ValueError('%s is not a rate limiter state file with %d slots' % (self.path, self.slots))
+
+    def close(self):
+        self._mmap.close()
+        os.close(self._fd)
+
+    def _hash(self, key):
+        digest = hashlib.md5(repr(key).encode('utf-8')).digest()
+        return struct.unpack('<Q', digest[:8])[0] or 1
+
+    def _find(self, key_hash):
+        start = key_hash % self.slots
+        for i in range(self.slots):
+            offset = self.header.size + self.slot.size * ((start + i) % self.slots)
+            slot_hash, tokens, timestamp = self.slot.unpack_from(self._mmap, offset)
+            if slot_hash == key_hash or slot_hash == 0:
+                return offset, slot_hash == 0, tokens, timestamp
+        raise PushwooshRateLimitException('No free slots in %s' % self.path)
+
+    def consume(self, key, tokens, rate, capacity):
+        key_hash = self._hash(key)
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                offset, new, bucket_tokens, timestamp = self._find(key_hash)
+                now = time.time()
+
+                bucket = TokenBucket(rate, capacity)
+                if not new:
+                    bucket.tokens, bucket.timestamp = bucket_tokens, timestamp
+                wait = bucket.consume(tokens, now=now)
+
+                self.slot.pack_into(self._mmap, offset, key_hash, bucket.tokens, bucket.timestamp)
+                return wait
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+
+class RateLimiter(object):
+    """
+    Client-side rate limiter. Every HTTP request made by a client takes one token from the bucket selected by
+    the command key, so the client paces itself below the API limits instead of being throttled.
+
+    Attributes:
+        rate (float): Required. Tokens added to each bucket per second, i.e. sustained requests per second.
+
+        capacity (float): Optional. Bucket size, i.e. allowed burst. Defaults to rate (but not less than 1).
+
+        key (str | tuple of str | callable): Optional. Command attribute(s) selecting the bucket: KEY_AUTH,
+        KEY_APPLICATION (application or application group), KEY_COMMAND_NAME, a tuple of them, or a callable
+        taking the command. Default KEY_AUTH.
+
+        blocking (bool): Optional. Wait for a token if True (default), otherwise acquire() fails immediately.
+
+        timeout (float): Optional. Maximum time acquire() waits for a token in blocking mode.
+
+        backend (LocalBucketBackend | SharedMemoryBucketBackend): Optional. Bucket storage. Default
+        LocalBucketBackend(); use SharedMemoryBucketBackend to share buckets between processes.
+    """
+
+    def __init__(self, rate, capacity=None, key=KEY_AUTH, blocking=True, timeout=None, backend=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1, rate)
+        self.key = key
+        self.blocking = blocking
+        self.timeout = timeout
+        self.backend = backend if backend is not None else LocalBucketBackend()
+
+    def key_for(self, command):
+        if callable(self.key):
+            return self.key(command)
+        if isinstance(self.key, string_types):
+            return self._key_value(command, self.key)
+        return tuple(self._key_value(command, key) for key in self.key)
+
+    def _key_value(self, command, key):
+        if key == KEY_APPLICATION:
+            return getattr(command, 'application', None) or getattr(command, 'application_group', None)
+        return getattr(command, key, None)
+
+    def delay(self, command, tokens=1):
+        """
+        Non-blocking acquire. Returns 0 if tokens were taken, otherwise seconds to wait before the next try.
+        """
+        return self.backend.consume(self.key_for(command), tokens, self.rate, self.capacity)
+
+    def acquire(self, command, tokens=1, blocking=None, timeout=None):
+        """
+        Takes tokens for the command. Returns True on success and False if a token could not be taken without
+        blocking, or within timeout.
+        """
+        blocking = self.blocking if blocking is None else blocking
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else monotonic() + timeout
+
+        while True:
+            wait = self.delay(command, tokens)
+            if not wait:
+                return True
+            if not blocking or (deadline is not None and monotonic() + wait > deadline):
+                return False
+            time.sleep(wait)
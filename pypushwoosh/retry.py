@@ -0,0 +1,81 @@
+import random
+import time
+from email.utils import parsedate_tz, mktime_tz
+
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class RetryPolicy(object):
+    """
+    Decides whether a failed call is retried and how long the client waits before the next attempt.
+
+    Connection errors, timeouts and responses with one of retry_statuses are retried. Only idempotent commands
+    (see BaseCommand.idempotent) are retried unless retry_non_idempotent is set, because a repeated createMessage
+    may deliver the same push twice.
+
+    Delay before attempt N+1 is a random value in [0, min(backoff_cap, backoff_base * 2 ** (N - 1))] ("full
+    jitter"), or the value of the Retry-After response header if it is present and respect_retry_after is set.
+
+    Attributes:
+        max_attempts (int): Optional. Total number of attempts including the first one. 1 disables retries.
+
+        backoff_base (float): Optional. Base delay in seconds.
+
+        backoff_cap (float): Optional. Maximum delay in seconds. Also caps Retry-After.
+
+        retry_statuses (tuple of int): Optional. HTTP statuses to retry.
+
+        respect_retry_after (bool): Optional. Wait as long as the Retry-After header asks. Default True.
+
+        retry_non_idempotent (bool): Optional. Retry commands that are not idempotent, e.g. createMessage.
+    """
+
+    def __init__(self, max_attempts=3, backoff_base=0.5, backoff_cap=30.0, retry_statuses=RETRY_STATUSES,
+                 respect_retry_after=True, retry_non_idempotent=False):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.retry_statuses = retry_statuses
+        self.respect_retry_after = respect_retry_after
+        self.retry_non_idempotent = retry_non_idempotent
+
+    def is_retryable(self, command):
+        return self.retry_non_idempotent or getattr(command, 'idempotent', False)
+
+    def should_retry(self, command, attempt, status=None):
+        """
+        Returns True if the command should be invoked again after ``attempt`` attempts. ``status`` is the
+        HTTP status of the last response, or None if the last attempt raised a transport error.
+        """
+        if attempt >= self.max_attempts or not self.is_retryable(command):
+            return False
+        return status is None or status in self.retry_statuses
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** (attempt - 1)))
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Returns seconds to wait after ``attempt`` failed attempts. ``retry_after`` is the raw Retry-After header.
+        """
+        if self.respect_retry_after and retry_after is not None:
+            seconds = parse_retry_after(retry_after)
+            if seconds is not None:
+                return min(self.backoff_cap, seconds)
+        return self.backoff(attempt)
+
+
+def parse_retry_after(value):
+    """
+    Parses Retry-After header value (delta-seconds or HTTP-date) to seconds. Returns None if it is malformed.
+    """
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0.0, mktime_tz(parsed) - time.time())
@@ -0,0 +1,463 @@
+import copy
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from .command import CreateMessageForApplicationCommand, CreateMessageForApplicationGroupCommand, \
+    CreateTargetedMessageCommand, DeleteMessageCommand
+from .filter import BaseFilter, IntegerTagFilter, IntegerTagFilterByApplication
+from .constants import TAG_FILTER_OPERATOR_EQ, TAG_FILTER_OPERATOR_BETWEEN
+from .utils import monotonic
+from . import serializer
+from .exceptions import PushwooshCommandException, PushwooshNotificationException
+
+
+HTTP_200_OK = 200
+DEFAULT_MAX_DEVICES = 1000
+DEFAULT_MAX_USERS = 1000
+
+
+def _create_message_command(notifications, auth, application, application_group):
+    if (application is None) == (application_group is None):
+        raise PushwooshCommandException('exactly one of application and application_group is required')
+
+    if application is not None:
+        command = CreateMessageForApplicationCommand(notifications, application=application)
+    else:
+        command = CreateMessageForApplicationGroupCommand(notifications, application_group=application_group)
+    command.auth = auth
+    return command
+
+
+class CoalescingSender(object):
+    """
+    Buffers single notifications and sends them as multi-notification createMessage requests.
+
+    Notifications are grouped by (auth, application, application_group). A group is flushed when it holds
+    max_items notifications or max_delay seconds after its first notification was queued. Each send() returns
+    a concurrent.futures.Future resolved with a createMessage response holding only the message code of that
+    notification, so callers get the same result shape as from PushwooshClient.invoke().
+
+    Attributes:
+        client (PushwooshClient): Required. Client used to invoke commands. Batches are sent with client.submit().
+
+        max_delay (float): Optional. Maximum time in seconds a notification waits in the buffer.
+
+        max_items (int): Optional. Maximum number of notifications per request.
+    """
+
+    def __init__(self, client, max_delay=0.05, max_items=100):
+        self.client = client
+        self.max_delay = max_delay
+        self.max_items = max_items
+
+        self._groups = {}
+        self._deadlines = {}
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='pypushwoosh-coalescer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def send(self, notification, auth, application=None, application_group=None):
+        if (application is None) == (application_group is None):
+            raise PushwooshCommandException('exactly one of application and application_group is required')
+
+        key = (auth, application, application_group)
+        future = Future()
+        batch = None
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('%s is closed' % self.__class__.__name__)
+
+            group = self._groups.setdefault(key, [])
+            group.append((notification, future))
+            if len(group) >= self.max_items:
+                batch = self._pop(key)
+            elif len(group) == 1:
+                self._deadlines[key] = monotonic() + self.max_delay
+                self._condition.notify()
+
+        if batch is not None:
+            self._dispatch(key, batch)
+        return future
+
+    def flush(self):
+        """
+        Sends all buffered notifications now.
+        """
+        with self._condition:
+            batches = [(key, self._pop(key)) for key in list(self._groups)]
+        for key, batch in batches:
+            self._dispatch(key, batch)
+
+    def close(self):
+        """
+        Flushes buffered notifications and stops the background thread. Does not close the client.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _pop(self, key):
+        self._deadlines.pop(key, None)
+        return self._groups.pop(key)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._closed:
+                    return
+
+                now = monotonic()
+                expired = [key for key, deadline in self._deadlines.items() if deadline <= now]
+                batches = [(key, self._pop(key)) for key in expired]
+                if not batches:
+                    timeout = min(self._deadlines.values()) - now if self._deadlines else None
+                    self._condition.wait(timeout)
+                    continue
+
+            for key, batch in batches:
+                self._dispatch(key, batch)
+
+    def _dispatch(self, key, batch):
+        batch = [(notification, future) for notification, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        auth, application, application_group = key
+        notifications = [notification for notification, _ in batch]
+        try:
+            result = self.client.submit(_create_message_command(notifications, auth, application, application_group))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        result.add_done_callback(lambda f: self._resolve(batch, f))
+
+    def _resolve(self, batch, result):
+        exception = result.exception()
+        if exception is not None:
+            for _, future in batch:
+                future.set_exception(exception)
+            return
+
+        response = result.result()
+        messages = None
+        if isinstance(response, dict) and response.get('status_code') == HTTP_200_OK:
+            messages = (response.get('response') or {}).get('Messages')
+
+        if not isinstance(messages, list) or len(messages) != len(batch):
+            for _, future in batch:
+                future.set_result(response)
+            return
+
+        for (_, future), message in zip(batch, messages):
+            single = dict(response)
+            single['response'] = dict(response['response'], Messages=[message])
+            future.set_result(single)
+
+
+class ChunkedResult(object):
+    """
+    Merged result of a chunked send.
+
+    Attributes:
+        messages (list of str): Message codes of all successful chunks in chunk order.
+
+        errors (list): Failed chunks: exceptions raised by the client or responses with status_code other than 200.
+
+        responses (list): Raw response (or exception) of every chunk in chunk order.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.errors = []
+        self.responses = []
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def add(self, response):
+        self.responses.append(response)
+        if isinstance(response, dict) and response.get('status_code') == HTTP_200_OK:
+            self.messages.extend((response.get('response') or {}).get('Messages') or [])
+        else:
+            self.errors.append(response)
+
+
+class ChunkedSender(object):
+    """
+    Splits a notification addressed to a huge list of devices (or users) into several createMessage requests
+    and sends them in parallel.
+
+    Recipients may be any iterable, e.g. a generator or pypushwoosh.tokens.TokenFile; they are read chunk by chunk.
+    Sequences such as lists and token files are split into slices when max_bytes is not set.
+
+    Attributes:
+        client (PushwooshClient): Required. Client used to invoke commands.
+
+        max_devices (int): Optional. Maximum number of devices per request.
+
+        max_users (int): Optional. Maximum number of users per request.
+
+        max_bytes (int): Optional. Approximate maximum size of a rendered notification in bytes. None is no limit.
+
+        max_pending (int): Optional. Maximum number of requests submitted and not completed yet. Chunks are read
+        from the recipients only when a request can be submitted, so memory stays flat for huge audiences.
+        None (default) submits all requests at once with client.invoke_many().
+    """
+
+    def __init__(self, client, max_devices=DEFAULT_MAX_DEVICES, max_users=DEFAULT_MAX_USERS, max_bytes=None,
+                 max_pending=None):
+        self.client = client
+        self.max_devices = max_devices
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.max_pending = max_pending
+
+    def split(self, notification):
+        """
+        Returns a list of notification copies, each addressed to a chunk of the original recipients.
+        """
+        return list(self.iter_split(notification))
+
+    def iter_split(self, notification):
+        """
+        Yields notification copies, each addressed to a chunk of the original recipients.
+        """
+        if notification.devices is not None and notification.users is not None:
+            raise PushwooshNotificationException('can not split notification with both devices and users')
+
+        if notification.devices is not None:
+            attr_name, max_items = 'devices', self.max_devices
+        elif notification.users is not None:
+            attr_name, max_items = 'users', self.max_users
+        else:
+            yield notification
+            return
+
+        budget = None
+        if self.max_bytes is not None:
+            budget = self.max_bytes - self._rendered_size(notification, attr_name)
+
+        for chunk in self._chunks(getattr(notification, attr_name), max_items, budget):
+            part = copy.copy(notification)
+            setattr(part, attr_name, chunk)
+            yield part
+
+    def _rendered_size(self, notification, attr_name):
+        empty = copy.copy(notification)
+        setattr(empty, attr_name, [])
+        return len(serializer.dumps(empty.render()))
+
+    def _chunks(self, items, max_items, budget):
+        if budget is None and hasattr(items, '__len__') and hasattr(items, '__getitem__'):
+            for start in range(0, len(items), max_items):
+                yield items[start:start + max_items]
+            return
+
+        chunk = []
+        size = 0
+        for item in items:
+            # quotes, comma and space around every rendered item
+            item_size = len(item) + 4
+            if chunk and (len(chunk) >= max_items or (budget is not None and size + item_size > budget)):
+                yield chunk
+                chunk = []
+                size = 0
+            chunk.append(item)
+            size += item_size
+        if chunk:
+            yield chunk
+
+    def send(self, notification, auth, application=None, application_group=None):
+        """
+        Sends the notification in chunks. Returns ChunkedResult.
+        """
+        commands = (_create_message_command([part], auth, application, application_group)
+                    for part in self.iter_split(notification))
+
+        result = ChunkedResult()
+        if self.max_pending is None:
+            futures = self.client.invoke_many(list(commands))
+        else:
+            futures = self._submit(commands)
+        for future in futures:
+            try:
+                result.add(future.result())
+            except Exception as e:
+                result.add(e)
+        return result
+
+    def _submit(self, commands):
+        # yields futures in submission order, keeping at most max_pending of them not yielded yet
+        pending = deque()
+        for command in commands:
+            if len(pending) >= self.max_pending:
+                yield pending.popleft()
+            pending.append(self.client.submit(command))
+        while pending:
+            yield pending.popleft()
+
+
+class ShardedResult(object):
+    """
+    Result of a sharded send.
+
+    Attributes:
+        auth (str): API access token the shards were sent with.
+
+        messages (list of str): Message codes of successful shards, None for failed ones, in shard order.
+
+        errors (list): Failed shards: exceptions raised by the client or responses with status_code other than 200.
+
+        responses (list): Raw response (or exception) of every shard in shard order.
+    """
+
+    def __init__(self, auth):
+        self.auth = auth
+        self.messages = []
+        self.errors = []
+        self.responses = []
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def add(self, response):
+        self.responses.append(response)
+        message = None
+        if isinstance(response, dict) and response.get('status_code') == HTTP_200_OK:
+            body = response.get('response') or {}
+            message = body.get('messageCode') or (body.get('Messages') or [None])[0]
+        if message is None:
+            self.errors.append(response)
+        self.messages.append(message)
+
+
+class ShardedSender(object):
+    """
+    Splits a CreateTargetedMessageCommand into disjoint shards and sends them concurrently or staggered, so a huge
+    segment is delivered as several smaller server-side jobs.
+
+    Devices must carry an integer partitioning tag, e.g. a hash bucket of the hwid in range(buckets). Shard i
+    intersects devices_filter with a filter on a contiguous range of buckets, so shards are disjoint and together
+    cover every device having the tag. Devices without the tag are in no shard.
+
+    Attributes:
+        client (PushwooshClient): Required. Client used to invoke commands.
+
+        tag_name (str): Required. Name of the partitioning tag.
+
+        buckets (int): Required. Number of values of the partitioning tag, 0 to buckets - 1.
+
+        shards (int): Required. Number of shards, at most buckets.
+
+        code (str): Optional. Application code if the partitioning tag is application specific (AT filters).
+
+        stagger (float): Optional. Seconds between submitting consecutive shards. None (default) submits all
+        shards at once with client.invoke_many().
+    """
+
+    def __init__(self, client, tag_name, buckets, shards, code=None, stagger=None):
+        if not 0 < shards <= buckets:
+            raise ValueError('shards must be between 1 and buckets')
+        self.client = client
+        self.tag_name = tag_name
+        self.buckets = buckets
+        self.shards = shards
+        self.code = code
+        self.stagger = stagger
+
+    def shard_filters(self):
+        """
+        Returns the partitioning filters, one per shard.
+        """
+        filters = []
+        for i in range(self.shards):
+            low = i * self.buckets // self.shards
+            high = (i + 1) * self.buckets // self.shards - 1
+            if low == high:
+                operator, operand = TAG_FILTER_OPERATOR_EQ, low
+            else:
+                operator, operand = TAG_FILTER_OPERATOR_BETWEEN, [low, high]
+            if self.code is None:
+                filters.append(IntegerTagFilter(self.tag_name, operator, operand))
+            else:
+                filters.append(IntegerTagFilterByApplication(self.tag_name, operator, operand, self.code))
+        return filters
+
+    def split(self, command):
+        """
+        Returns copies of command, one per shard, with devices_filter intersected with the shard filters.
+        """
+        if not isinstance(command, CreateTargetedMessageCommand):
+            raise PushwooshCommandException('only CreateTargetedMessageCommand can be sharded')
+        devices_filter = command.devices_filter
+        if devices_filter is None:
+            raise PushwooshNotificationException('devices_filter is required')
+
+        parts = []
+        for shard_filter in self.shard_filters():
+            part = copy.copy(command)
+            part.invalidate()
+            if isinstance(devices_filter, BaseFilter):
+                part.devices_filter = devices_filter.intersect(shard_filter)
+            else:
+                part.devices_filter = '(%s * %s)' % (devices_filter, shard_filter)
+            parts.append(part)
+        return parts
+
+    def send(self, command):
+        """
+        Sends the shards of command. Returns ShardedResult; pass it to cancel() to delete all sent messages.
+        """
+        parts = self.split(command)
+        if self.stagger is None:
+            futures = self.client.invoke_many(parts)
+        else:
+            futures = []
+            for i, part in enumerate(parts):
+                if i:
+                    time.sleep(self.stagger)
+                futures.append(self.client.submit(part))
+
+        result = ShardedResult(command.auth)
+        for future in futures:
+            try:
+                result.add(future.result())
+            except Exception as e:
+                result.add(e)
+        return result
+
+    def cancel(self, result):
+        """
+        Deletes the messages of all successful shards of result with DeleteMessageCommand. Returns the responses
+        (or exceptions) in shard order.
+        """
+        commands = []
+        for message in result.messages:
+            if message is not None:
+                delete = DeleteMessageCommand(message)
+                delete.auth = result.auth
+                commands.append(delete)
+
+        responses = []
+        for future in self.client.invoke_many(commands):
+            try:
+                responses.append(future.result())
+            except Exception as e:
+                responses.append(e)
+        return responses
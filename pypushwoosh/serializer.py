@@ -0,0 +1,157 @@
+"""
+JSON serializer used to render commands and decode responses.
+
+The fastest installed backend among orjson and python-rapidjson is used, falling back to the standard json
+module. Every backend produces a document equal (after decoding) to ``json.dumps(obj, default=default)``:
+iterables such as generators or token files are rendered as arrays, datetime, date, Decimal, bytes, filters and
+other unsupported objects are rendered with str(). Use set_serializer() to pick a backend explicitly.
+
+The ujson backend is never picked automatically: it renders Decimal values as JSON numbers, which can not be
+routed through default(). Select it with set_serializer('ujson') if payloads never contain Decimal values.
+
+With orjson 3.9 or newer, objects with a to_json() method returning JSON bytes, such as
+pypushwoosh.tokens.TokenStore, are embedded into the document without converting them to Python objects first.
+"""
+import json
+from datetime import date
+
+from six import string_types, binary_type
+
+from .filter import BaseFilter
+
+
+def default(obj):
+    """
+    Converts objects unsupported by JSON: iterables to lists, anything else to str.
+    """
+    if isinstance(obj, (BaseFilter, date, binary_type)) or not hasattr(obj, '__iter__'):
+        return str(obj)
+    return list(obj)
+
+
+class JSONSerializer(object):
+    """
+    Standard library json backend.
+    """
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj, default=default).encode('utf-8')
+
+    def loads(self, data):
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+
+class OrjsonSerializer(JSONSerializer):
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        self._option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        self._default = default
+        fragment = getattr(orjson, 'Fragment', None)
+        if fragment is not None:
+            def fragment_default(obj):
+                if hasattr(obj, 'to_json'):
+                    return fragment(obj.to_json())
+                return default(obj)
+            self._default = fragment_default
+
+    def dumps(self, obj):
+        try:
+            return self._orjson.dumps(obj, default=self._default, option=self._option)
+        except TypeError:
+            # e.g. integers wider than 64 bits
+            return JSONSerializer.dumps(self, obj)
+
+    def loads(self, data):
+        return self._orjson.loads(data)
+
+
+class RapidjsonSerializer(JSONSerializer):
+    name = 'rapidjson'
+
+    def __init__(self):
+        import rapidjson
+        self._rapidjson = rapidjson
+        # bytes are passed to default() rather than decoded as UTF-8
+        self._options = {'default': default, 'ensure_ascii': False, 'bytes_mode': rapidjson.BM_NONE,
+                         'mapping_mode': rapidjson.MM_COERCE_KEYS_TO_STRINGS}
+
+    def dumps(self, obj):
+        return self._rapidjson.dumps(obj, **self._options).encode('utf-8')
+
+    def loads(self, data):
+        return self._rapidjson.loads(data)
+
+
+class UjsonSerializer(JSONSerializer):
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        if int(ujson.__version__.split('.')[0]) < 5:
+            raise ImportError('ujson>=5 is required')
+        self._ujson = ujson
+
+    def dumps(self, obj):
+        return self._ujson.dumps(obj, default=default, ensure_ascii=False,
+                                 escape_forward_slashes=False).encode('utf-8')
+
+    def loads(self, data):
+        return self._ujson.loads(data)
+
+
+BACKENDS = (OrjsonSerializer, RapidjsonSerializer, JSONSerializer)
+
+# backends only used when selected by name
+EXPLICIT_BACKENDS = (UjsonSerializer,)
+
+
+def get_serializer(name=None):
+    """
+    Returns serializer with the given backend name, or the fastest available one if name is None.
+    """
+    for backend in BACKENDS if name is None else BACKENDS + EXPLICIT_BACKENDS:
+        if name is not None and backend.name != name:
+            continue
+        try:
+            return backend()
+        except (ImportError, AttributeError, TypeError):
+            if name is not None:
+                raise
+    raise ValueError('Unknown serializer %s' % name)
+
+
+_serializer = get_serializer()
+
+
+def set_serializer(serializer):
+    """
+    Sets the serializer used by the library: backend name or an object with dumps() and loads() methods.
+    """
+    global _serializer
+    if serializer is None or isinstance(serializer, string_types):
+        serializer = get_serializer(serializer)
+    _serializer = serializer
+
+
+def current_serializer():
+    return _serializer
+
+
+def dumps(obj):
+    """
+    Serializes obj to JSON bytes.
+    """
+    return _serializer.dumps(obj)
+
+
+def loads(data):
+    """
+    Deserializes JSON bytes or str.
+    """
+    return _serializer.loads(data)
@@ -0,0 +1,84 @@
+"""
+Incremental JSON encoding of rendered commands.
+
+Produces the same JSON document as ``json.dumps(obj, default=str)`` but writes it piece by piece, so request
+bodies with huge device lists never exist as one Python string. Lists, tuples and any other iterables (e.g.
+generators) are encoded as JSON arrays item by item. Objects with a to_json(separator) method returning JSON bytes,
+such as pypushwoosh.tokens.TokenStore, are written as is.
+"""
+import json
+from datetime import date
+
+from six import string_types, integer_types, binary_type
+
+from .filter import BaseFilter
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_encode_string = json.encoder.encode_basestring_ascii
+
+
+def _encode_scalar(value):
+    return json.dumps(value).encode('ascii')
+
+
+def _iterencode(value):
+    if isinstance(value, string_types):
+        yield _encode_string(value).encode('ascii')
+    elif value is None or isinstance(value, (bool, float) + integer_types):
+        yield _encode_scalar(value)
+    elif isinstance(value, dict):
+        yield b'{'
+        first = True
+        for key, item in value.items():
+            if not first:
+                yield b', '
+            first = False
+            yield _encode_string(key if isinstance(key, string_types) else str(key)).encode('ascii')
+            yield b': '
+            for piece in _iterencode(item):
+                yield piece
+        yield b'}'
+    elif isinstance(value, (BaseFilter, date, binary_type)) or not hasattr(value, '__iter__'):
+        yield _encode_string(str(value)).encode('ascii')
+    elif hasattr(value, 'to_json'):
+        yield value.to_json(b', ')
+    else:
+        yield b'['
+        first = True
+        for item in value:
+            if not first:
+                yield b', '
+            first = False
+            if isinstance(item, string_types):
+                yield _encode_string(item).encode('ascii')
+            else:
+                for piece in _iterencode(item):
+                    yield piece
+        yield b']'
+
+
+def iterencode(obj, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields JSON encoding of obj as bytes chunks of about chunk_size bytes.
+    """
+    buf = bytearray()
+    for piece in _iterencode(obj):
+        buf += piece
+        if len(buf) >= chunk_size:
+            yield bytes(buf)
+            del buf[:]
+    if buf:
+        yield bytes(buf)
+
+
+def encode_into(obj, buf):
+    """
+    Writes JSON encoding of obj into bytearray buf, replacing its content, and returns buf. Reusing one buffer
+    for many requests avoids reallocating it for every request.
+    """
+    del buf[:]
+    for piece in _iterencode(obj):
+        buf += piece
+    return buf
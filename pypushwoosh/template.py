@@ -0,0 +1,161 @@
+"""
+Notification templates: createMessage request bodies stamped out from preserialized bytes.
+
+A template renders the request once with unique markers in place of the variable fields and splits the serialized
+bytes around them. Each request then costs only serializing the variable values and joining the pieces.
+"""
+import copy
+import uuid
+
+from .command import BaseCommand
+from .notification import rendered_fields
+from .sender import _create_message_command
+from .stream import DEFAULT_CHUNK_SIZE
+from . import serializer
+from .exceptions import PushwooshNotificationException
+
+
+DEFAULT_VARIABLE_FIELDS = ('content', 'data', 'devices')
+
+
+class TemplateMessageCommand(BaseCommand):
+    """
+    createMessage command with a request body rendered by NotificationTemplate.
+    """
+    __slots__ = ('body',)
+    command_name = 'createMessage'
+
+    def __init__(self, body):
+        BaseCommand.__init__(self)
+        self.body = body
+
+    def compile(self):
+        self._command = serializer.loads(self.body)
+        self._command_compiled = True
+
+    def render(self):
+        return self.body.decode('utf-8')
+
+    def render_bytes(self):
+        return self.body
+
+    def iter_render(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+    def render_into(self, buf):
+        buf[:] = self.body
+        return buf
+
+
+class NotificationTemplate(object):
+    """
+    Renders createMessage requests sending notification with different values of a few fields.
+
+    All other fields are serialized once; later changes of notification do not affect the template. Values not
+    given to render_bytes() default to the notification values. The result is the same as rendering the command
+    normally, e.g. optional fields set to None are left out.
+
+    Attributes:
+        notification (Notification): Required. Notification with the static fields.
+
+        auth (str): Required. API access token.
+
+        application (str): Optional. Pushwoosh application ID (cannot be used together with application_group).
+
+        application_group (str): Optional. Pushwoosh application group code (cannot be used together with
+        application).
+
+        variable_fields (tuple of str): Optional. Names of rendered notification fields set per request.
+        Default ('content', 'data', 'devices').
+    """
+
+    def __init__(self, notification, auth, application=None, application_group=None,
+                 variable_fields=DEFAULT_VARIABLE_FIELDS):
+        fields = rendered_fields(notification._mixed)
+        for field in variable_fields:
+            if field not in fields:
+                raise PushwooshNotificationException('%s is not a rendered notification field' % field)
+
+        self.variable_fields = tuple(variable_fields)
+        self.serializer = serializer.current_serializer()
+        self._optional_fields = frozenset(
+            field for mixin in notification._mixed for field in mixin.__dict__.get('_optional_fields', ())
+            if field in self.variable_fields)
+
+        self._defaults = {}
+        for field in self.variable_fields:
+            value = getattr(notification, field)
+            self._defaults[field] = None if value is None else self.serializer.dumps(value)
+
+        prototype = copy.copy(notification)
+        for field in self.variable_fields:
+            setattr(prototype, field, None)
+        self._prototype = copy.deepcopy(prototype)
+        self._auth = auth
+        self._application = application
+        self._application_group = application_group
+
+        self._variants = {}
+        self._variants[frozenset()] = self._split(frozenset(), strict=True)
+
+    def _split(self, omitted, strict=False):
+        # serializes the request with markers in place of the variable fields that are not omitted and splits it
+        prototype = copy.copy(self._prototype)
+        markers = {}
+        for field in self.variable_fields:
+            if field not in omitted:
+                marker = '%s:%s' % (uuid.uuid4().hex, field)
+                markers[marker] = field
+                setattr(prototype, field, marker)
+        command = _create_message_command([prototype], self._auth, self._application, self._application_group)
+        body = self.serializer.dumps(command._compile_cached()[0])
+
+        positions = []
+        for marker, field in markers.items():
+            quoted = self.serializer.dumps(marker)
+            position = body.find(quoted)
+            if position >= 0:
+                positions.append((position, len(quoted), field))
+            elif strict:
+                raise PushwooshNotificationException('%s is not rendered by the notification' % field)
+        positions.sort()
+
+        pieces = []
+        fields = []
+        start = 0
+        for position, length, field in positions:
+            pieces.append(body[start:position])
+            fields.append(field)
+            start = position + length
+        pieces.append(body[start:])
+        return pieces, fields
+
+    def render_bytes(self, **values):
+        """
+        Returns the request body with the given values of the variable fields.
+        """
+        defaults = self._defaults
+        for field in values:
+            if field not in defaults:
+                raise PushwooshNotificationException('%s is not a variable field of the template' % field)
+
+        omitted = frozenset(field for field in self._optional_fields
+                            if (values[field] if field in values else defaults[field]) is None)
+        variant = self._variants.get(omitted)
+        if variant is None:
+            variant = self._variants[omitted] = self._split(omitted)
+        pieces, fields = variant
+
+        dumps = self.serializer.dumps
+        result = [pieces[0]]
+        for i, field in enumerate(fields):
+            result.append(dumps(values[field]) if field in values else defaults[field] or b'null')
+            result.append(pieces[i + 1])
+        return b''.join(result)
+
+    def command(self, **values):
+        """
+        Returns a command invoking the request rendered by render_bytes(**values).
+        """
+        return TemplateMessageCommand(self.render_bytes(**values))
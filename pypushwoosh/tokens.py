@@ -0,0 +1,301 @@
+"""
+Device token and user ID sources for Notification.devices and Notification.users.
+
+Besides lists, notifications accept any iterable: BaseCommand.iter_render() and ChunkedSender consume it lazily.
+One-shot iterables such as generators are not kept, so a command holding them can be rendered only once and is
+not retried with a new body. TokenFile reads a newline-delimited file through mmap, so tokens are kept in the page
+cache instead of Python objects. TokenStore keeps tokens packed in one buffer in memory. Both can be rendered any
+number of times.
+"""
+import binascii
+import json
+import mmap
+import os
+from array import array
+from itertools import islice
+
+from six import integer_types, string_types
+
+from .utils import UINT64_TYPECODE
+
+# 4 bytes offsets limit buffers to 4 GiB on platforms without 8 bytes arrays
+_OFFSET_TYPECODE = UINT64_TYPECODE or 'L'
+
+
+class TokenFile(object):
+    """
+    Memory-mapped newline-delimited file of device tokens or user IDs. Empty lines are skipped.
+
+    Iteration scans the file sequentially. len(), indexing and slicing use an index of line offsets (4 or 8 bytes
+    per line) built on first use. Slices are views sharing the mapping.
+
+    Attributes:
+        path (str): Required. Path to the file.
+
+        encoding (str): Optional. Encoding of the file. Default 'utf-8'.
+    """
+
+    def __init__(self, path, encoding='utf-8'):
+        self.path = path
+        self.encoding = encoding
+        self._offsets = None
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = b''
+        self._offsets = array('I')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _lines(self):
+        # yields (start, end) of every non-empty line
+        data = self._data
+        size = len(data)
+        start = 0
+        while start < size:
+            end = data.find(b'\n', start)
+            if end < 0:
+                end = size
+            stop = end - 1 if end > start and data[end - 1:end] == b'\r' else end
+            if stop > start:
+                yield start, stop
+            start = end + 1
+
+    def _index(self):
+        if self._offsets is None:
+            offsets = array('I' if len(self._data) < 2 ** 32 else _OFFSET_TYPECODE)
+            offsets.extend(start for start, _ in self._lines())
+            self._offsets = offsets
+        return self._offsets
+
+    def _token(self, i):
+        data = self._data
+        start = self._index()[i]
+        end = data.find(b'\n', start)
+        if end < 0:
+            end = len(data)
+        return data[start:end].rstrip(b'\r').decode(self.encoding)
+
+    def __len__(self):
+        return len(self._index())
+
+    def __iter__(self):
+        if self._offsets is not None:
+            return (self._token(i) for i in range(len(self._offsets)))
+        data, encoding = self._data, self.encoding
+        return (data[start:stop].decode(encoding) for start, stop in self._lines())
+
+    def __getitem__(self, item):
+        return TokenFileSlice(self, 0, len(self))[item]
+
+    def __repr__(self):
+        return 'TokenFile(%r)' % self.path
+
+
+class TokenFileSlice(object):
+    """
+    View of a range of tokens of TokenFile.
+    """
+
+    def __init__(self, source, start, stop):
+        self.source = source
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __iter__(self):
+        token = self.source._token
+        return (token(i) for i in range(self.start, self.stop))
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                return list(islice(self, start, stop, step))
+            return TokenFileSlice(self.source, self.start + start, self.start + max(start, stop))
+        if not isinstance(item, integer_types):
+            raise TypeError('indices must be integers or slices')
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError('token index out of range')
+        return self.source._token(self.start + item)
+
+    def __repr__(self):
+        return 'TokenFileSlice(%r, %d, %d)' % (self.source.path, self.start, self.stop)
+
+
+TOKEN_RAW = 0
+TOKEN_RAW_ESCAPED = 1
+TOKEN_HEX_LOWER = 2
+TOKEN_HEX_UPPER = 3
+
+_HEX_LOWER_FLAG = bytes(bytearray([TOKEN_HEX_LOWER]))
+
+_encode_string = json.encoder.encode_basestring_ascii
+
+
+class TokenStore(object):
+    """
+    Compact list of device tokens or user IDs.
+
+    Hex tokens (e.g. 64 characters long APNs tokens) in lower or upper case are packed to binary, two characters
+    per byte; other tokens are stored UTF-8 encoded. All tokens share one buffer indexed by an array of offsets, so
+    a 64 characters long hex token takes 32 bytes plus 9 bytes of index instead of a str object and a list slot.
+
+    len() and slicing are O(1); slices are read-only views sharing the buffer. Tokens are decoded to str when
+    accessed. to_json() renders the tokens as a JSON array without creating str objects for them.
+
+    Attributes:
+        tokens (iterable of str): Optional. Initial tokens.
+    """
+
+    def __init__(self, tokens=None):
+        self._data = bytearray()
+        self._offsets = array(_OFFSET_TYPECODE, [0])
+        self._flags = bytearray()
+        self._hex_sizes = set()
+        self._start = 0
+        self._stop = None
+        if tokens is not None:
+            self.extend(tokens)
+
+    def _view(self, start, stop):
+        view = object.__new__(TokenStore)
+        view._data = self._data
+        view._offsets = self._offsets
+        view._flags = self._flags
+        view._hex_sizes = self._hex_sizes
+        view._start = start
+        view._stop = stop
+        return view
+
+    def _bounds(self):
+        return self._start, len(self._flags) if self._stop is None else self._stop
+
+    def append(self, token):
+        if self._stop is not None:
+            raise TypeError('TokenStore slices are read-only')
+        if not isinstance(token, string_types):
+            raise TypeError('token must be a string')
+
+        flag = None
+        if token and len(token) % 2 == 0:
+            if token == token.lower():
+                flag = TOKEN_HEX_LOWER
+            elif token == token.upper():
+                flag = TOKEN_HEX_UPPER
+            if flag is not None:
+                try:
+                    encoded = binascii.unhexlify(token)
+                    self._hex_sizes.add(len(encoded))
+                except (TypeError, ValueError):
+                    flag = None
+        if flag is None:
+            encoded = token.encode('utf-8')
+            flag = TOKEN_RAW if _encode_string(token) == '"%s"' % token else TOKEN_RAW_ESCAPED
+
+        self._data += encoded
+        self._offsets.append(len(self._data))
+        self._flags.append(flag)
+
+    def extend(self, tokens):
+        for token in tokens:
+            self.append(token)
+
+    def _token(self, i):
+        encoded = bytes(self._data[self._offsets[i]:self._offsets[i + 1]])
+        flag = self._flags[i]
+        if flag == TOKEN_HEX_LOWER:
+            return binascii.hexlify(encoded).decode('ascii')
+        if flag == TOKEN_HEX_UPPER:
+            return binascii.hexlify(encoded).decode('ascii').upper()
+        return encoded.decode('utf-8')
+
+    def __len__(self):
+        start, stop = self._bounds()
+        return stop - start
+
+    def __iter__(self):
+        start, stop = self._bounds()
+        return (self._token(i) for i in range(start, stop))
+
+    def __getitem__(self, item):
+        start, stop = self._bounds()
+        if isinstance(item, slice):
+            first, last, step = item.indices(stop - start)
+            if step != 1:
+                return list(islice(self, first, last, step))
+            return self._view(start + first, start + max(first, last))
+        if not isinstance(item, integer_types):
+            raise TypeError('indices must be integers or slices')
+        if item < 0:
+            item += stop - start
+        if not 0 <= item < stop - start:
+            raise IndexError('token index out of range')
+        return self._token(start + item)
+
+    def __eq__(self, other):
+        if not isinstance(other, TokenStore):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'TokenStore(<%d tokens>)' % len(self)
+
+    @property
+    def nbytes(self):
+        """
+        Size of the buffers holding the tokens in bytes.
+        """
+        return len(self._data) + self._offsets.itemsize * len(self._offsets) + len(self._flags)
+
+    def to_json(self, separator=b','):
+        """
+        Returns the tokens as a JSON array (bytes), the same as json.dumps(list(store)) with the given separator.
+        """
+        start, stop = self._bounds()
+        if start == stop:
+            return b'[]'
+
+        data, offsets, flags = self._data, self._offsets, self._flags
+        first, last = offsets[start], offsets[stop]
+        if len(self._hex_sizes) == 1 and flags.count(_HEX_LOWER_FLAG, start, stop) == stop - start:
+            # all tokens have the same size: hexlify the whole range at once and put quotes between tokens
+            size = next(iter(self._hex_sizes))
+            try:
+                encoded = binascii.hexlify(bytes(data[first:last]), b'\n', size)
+            except TypeError:  # no separator support before Python 3.8
+                pass
+            else:
+                return b'["' + encoded.replace(b'\n', b'"' + separator + b'"') + b'"]'
+
+        pieces = []
+        for i in range(start, stop):
+            flag = flags[i]
+            encoded = bytes(data[offsets[i]:offsets[i + 1]])
+            if flag == TOKEN_RAW:
+                pieces.append(b'"' + encoded + b'"')
+            elif flag == TOKEN_HEX_LOWER:
+                pieces.append(b'"' + binascii.hexlify(encoded) + b'"')
+            elif flag == TOKEN_HEX_UPPER:
+                pieces.append(b'"' + binascii.hexlify(encoded).upper() + b'"')
+            else:
+                pieces.append(_encode_string(encoded.decode('utf-8')).encode('ascii'))
+        return b'[' + separator.join(pieces) + b']'
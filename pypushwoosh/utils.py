@@ -1,12 +1,40 @@
+import re
+from array import array
 from datetime import datetime, date
 
+try:
+    from functools import lru_cache
+except ImportError:  # Python 2
+    lru_cache = None
+
+try:
+    from time import monotonic
+except ImportError:  # Python 2
+    from time import time as monotonic  # noqa: F401
+
 from six import string_types
 
-from .constants import PLATFORMS, PLATFORM_NAMES, LINK_MINIMIZERS,\
+from .constants import PLATFORMS, PLATFORM_NAMES, LINK_MINIMIZERS, \
     TAG_FILTER_OPERATOR_LTE, TAG_FILTER_OPERATOR_GTE, TAG_FILTER_OPERATOR_EQ, TAG_FILTER_OPERATOR_IN, \
     TAG_FILTER_OPERATOR_BETWEEN, TAG_FILTER_OPERATOR_NOTIN, TAG_FILTER_OPERATOR_NOTEQ
 
 
+def _int64_typecode(*typecodes):
+    for typecode in typecodes:
+        try:
+            if array(typecode).itemsize == 8:
+                return typecode
+        except ValueError:
+            pass
+    return None
+
+
+# typecodes of 8 bytes array.array integers, None if there are none: 'q' and 'Q' do not exist on Python 2, where
+# 'l' and 'L' are 8 bytes long on 64-bit Unix
+INT64_TYPECODE = _int64_typecode('q', 'l')
+UINT64_TYPECODE = _int64_typecode('Q', 'L')
+
+
 def valid_platform(platform):
     return platform in PLATFORMS
 
@@ -20,39 +48,39 @@ def valid_link_minimizer(link_minimizer):
 
 
 def valid_operand(operand, types):
-    for t in types:
-        if isinstance(operand, t):
-            return True
-    return False
+    return isinstance(operand, tuple(types))
 
 
 def valid_operand_list(operand_list, types):
-    for operand in operand_list:
-        if not valid_operand(operand, types):
-            return False
-    return True
+    types = tuple(types)
+    # checks every distinct type once instead of every value
+    return all(issubclass(t, types) for t in set(map(type, operand_list)))
 
 
 def valid_operator(operator, operators):
     return operator in operators
 
 
+OPERATOR_OPERAND_TYPES = {
+    TAG_FILTER_OPERATOR_LTE: (int, string_types, date, datetime),
+    TAG_FILTER_OPERATOR_GTE: (int, string_types, date, datetime),
+    TAG_FILTER_OPERATOR_BETWEEN: (list, array),
+    TAG_FILTER_OPERATOR_EQ: (int, string_types, list, array, date, datetime),
+    TAG_FILTER_OPERATOR_NOTEQ: (int, string_types, date, datetime),
+    TAG_FILTER_OPERATOR_IN: (list, array),
+    TAG_FILTER_OPERATOR_NOTIN: (list, array),
+}
+
+
 def valid_operand_for_operator(operand, operator):
-    _map = {
-        TAG_FILTER_OPERATOR_LTE: (int, string_types, date, datetime),
-        TAG_FILTER_OPERATOR_GTE: (int, string_types, date, datetime),
-        TAG_FILTER_OPERATOR_BETWEEN: (list,),
-        TAG_FILTER_OPERATOR_EQ: (int, string_types, list, date, datetime),
-        TAG_FILTER_OPERATOR_NOTEQ: (int, string_types, date, datetime),
-        TAG_FILTER_OPERATOR_IN: (list,),
-        TAG_FILTER_OPERATOR_NOTIN: (list,),
-    }
-    return valid_operand(operand, _map[operator])
+    return isinstance(operand, OPERATOR_OPERAND_TYPES[operator])
 
 
 def valid_days(operand):
     if isinstance(operand, int):
         return operand > 0
+    elif isinstance(operand, array):
+        return not operand or min(operand) > 0
     elif isinstance(operand, list):
         for value in operand:
             if value <= 0:
@@ -70,15 +98,34 @@ def valid_bool(operand):
         return operand in values
 
 
-def set_date_value(operand):
-    datetime_formats_map = [
-        '%Y-%m-%d %H:%M:%S',
-        '%Y-%m-%d %H:%M',
-        '%Y-%m-%d',
-        '%Y-%m-%dT%H:%M:%S',
-        '%Y-%m-%dT%H:%M',
-    ]
-    for f in datetime_formats_map:
+DATETIME_FORMATS = (
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%d',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M',
+)
+
+# zero-padded dates accepted by DATETIME_FORMATS
+_ISO_DATETIME = re.compile(r'([1-9][0-9]{3})-([0-9]{2})-([0-9]{2})(?:[ T]([0-9]{2}):([0-9]{2})(?::([0-9]{2}))?)?\Z')
+
+
+def _set_date_value(operand):
+    match = _ISO_DATETIME.match(operand)
+    if match is not None:
+        year, month, day, hour, minute, second = match.groups()
+        try:
+            datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0))
+        except ValueError:
+            pass
+        else:
+            return '%s-%s-%s %s:%s:%s' % (year, month, day, hour or '00', minute or '00', second or '00')
+    return _strptime_date_value(operand)
+
+
+def _strptime_date_value(operand):
+    # also accepts what strptime accepts besides zero-padded dates, e.g. '2017-1-5'
+    for f in DATETIME_FORMATS:
         try:
             operand = datetime.strptime(str(operand), f).strftime('%Y-%m-%d %H:%M:%S')
             return operand
@@ -87,6 +134,16 @@ def set_date_value(operand):
     return False
 
 
+if lru_cache is not None:
+    _set_date_value = lru_cache(maxsize=4096)(_set_date_value)
+
+
+def set_date_value(operand):
+    if isinstance(operand, string_types):
+        return _set_date_value(operand)
+    return _strptime_date_value(operand)
+
+
 def set_dates_in_list(operand):
     operand = [set_date_value(v) for v in operand]
 
@@ -37,5 +37,9 @@ setup(
         'Programming Language :: Python :: 3.5',
         'Programming Language :: Python :: 3.6',
     ],
-    install_requires=['six', 'requests'],
+    install_requires=['six', 'requests', 'futures; python_version < "3"'],
+    extras_require={
+        'async': ['aiohttp>=3.3'],
+        'evaluator': ['numpy'],
+    },
 )
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import unittest
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+from pypushwoosh import constants
+from pypushwoosh.command import RegisterDeviceCommand
+
+HTTP_200_OK = 200
+STATUS_OK = 'OK'
+
+
+@unittest.skipIf(web is None, 'aiohttp is not installed')
+class TestAsyncPushwooshClient(unittest.TestCase):
+
+    def setUp(self):
+        from pypushwoosh.aio import AsyncPushwooshClient
+
+        self.loop = asyncio.new_event_loop()
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        async def handler(request):
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            body = await request.json()
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            self.requests.append((request.path, body))
+            return web.json_response({'status_code': HTTP_200_OK, 'status_message': STATUS_OK,
+                                      'response': {'hwid': body['request']['hwid']}})
+
+        app = web.Application()
+        app.router.add_post('/json/1.3/{command}', handler)
+        self.runner = web.AppRunner(app)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        self.loop.run_until_complete(site.start())
+        port = self.runner.addresses[0][1]
+
+        self.client = AsyncPushwooshClient(timeout=5)
+        self.client.scheme = 'http'
+        self.client.hostname = '127.0.0.1:%d' % port
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(self.runner.cleanup())
+        self.loop.close()
+
+    def command(self, hwid):
+        return RegisterDeviceCommand('0000-0000', hwid, constants.PLATFORM_ANDROID, 'push_token')
+
+    def test_invoke(self):
+        result = self.loop.run_until_complete(self.client.invoke(self.command('hwid')))
+
+        self.assertEqual(result['status_code'], HTTP_200_OK)
+        path, body = self.requests[0]
+        self.assertEqual(path, '/json/1.3/registerDevice')
+        self.assertEqual(body['request']['hwid'], 'hwid')
+
+    def test_invoke_many_keeps_order_and_bounds_concurrency(self):
+        commands = [self.command('hwid_%d' % i) for i in range(20)]
+        results = self.loop.run_until_complete(self.client.invoke_many(commands, concurrency=3))
+
+        self.assertEqual([r['response']['hwid'] for r in results], ['hwid_%d' % i for i in range(20)])
+        self.assertLessEqual(self.max_in_flight, 3)
+
+    def test_cancelled_probe_is_released(self):
+        from pypushwoosh.breaker import CircuitBreaker, STATE_HALF_OPEN, STATE_CLOSED
+
+        breaker = self.client.circuit_breaker = CircuitBreaker(minimum_calls=1, reset_timeout=0)
+        breaker.record(False, 0)
+        self.assertEqual(breaker.state, STATE_HALF_OPEN)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            self.loop.run_until_complete(asyncio.wait_for(self.client.invoke(self.command('hwid')), 0.001))
+        self.assertEqual(breaker.state, STATE_HALF_OPEN)
+
+        result = self.loop.run_until_complete(self.client.invoke(self.command('hwid')))
+        self.assertEqual(result['status_code'], HTTP_200_OK)
+        self.assertEqual(breaker.state, STATE_CLOSED)
+
+    def test_sync_context_manager_is_rejected(self):
+        with self.assertRaises(TypeError):
+            with self.client:
+                pass
+
+    def test_streamed_body(self):
+        self.client.stream = True
+        result = self.loop.run_until_complete(self.client.invoke(self.command('hwid')))
+
+        self.assertEqual(result['response']['hwid'], 'hwid')
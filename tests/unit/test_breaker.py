@@ -0,0 +1,141 @@
+import time
+import unittest
+
+from pypushwoosh import constants
+from pypushwoosh.breaker import CircuitBreaker, STATE_CLOSED, STATE_OPEN, STATE_HALF_OPEN
+from pypushwoosh.command import RegisterDeviceCommand
+from pypushwoosh.exceptions import PushwooshCircuitOpenException, PushwooshRateLimitException
+from pypushwoosh.ratelimit import RateLimiter
+from pypushwoosh.retry import RetryPolicy
+
+from .test_client import FakeTransportClientMixin
+
+HTTP_200_OK = 200
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_rate_threshold=0.5, minimum_calls=4, reset_timeout=0.05)
+
+    def call(self, success, duration=0.0):
+        probe = self.breaker.allow()
+        self.breaker.record(success, duration, probe)
+
+    def test_opens_on_failure_rate(self):
+        self.call(True)
+        self.call(False)
+        self.call(True)
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+        self.call(False)
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+        self.assertRaises(PushwooshCircuitOpenException, self.breaker.allow)
+
+    def test_opens_on_slow_calls(self):
+        self.breaker = CircuitBreaker(slow_call_duration=1, slow_call_rate_threshold=0.5, minimum_calls=2)
+        self.call(True, 2)
+        self.call(True, 2)
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+
+    def test_half_open_recovery(self):
+        for _ in range(4):
+            self.call(False)
+        time.sleep(0.06)
+        self.assertEqual(self.breaker.state, STATE_HALF_OPEN)
+
+        probe = self.breaker.allow()
+        self.assertRaises(PushwooshCircuitOpenException, self.breaker.allow)
+        self.breaker.record(True, 0, probe)
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+        self.assertEqual(self.breaker.snapshot()['calls'], 0)
+
+    def test_half_open_failure_reopens(self):
+        for _ in range(4):
+            self.call(False)
+        time.sleep(0.06)
+        self.call(False)
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+
+    def test_stale_call_is_not_a_probe(self):
+        stale = self.breaker.allow()
+        for _ in range(4):
+            self.call(False)
+        time.sleep(0.06)
+        self.assertEqual(self.breaker.state, STATE_HALF_OPEN)
+
+        self.breaker.record(True, 5.0, stale)
+        self.assertEqual(self.breaker.state, STATE_HALF_OPEN)
+        self.breaker.record(False, 5.0)
+        self.assertEqual(self.breaker.state, STATE_HALF_OPEN)
+        self.call(True)
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+
+    def test_release_probe(self):
+        for _ in range(4):
+            self.call(False)
+        time.sleep(0.06)
+
+        probe = self.breaker.allow()
+        self.assertIsNotNone(probe)
+        self.assertRaises(PushwooshCircuitOpenException, self.breaker.allow)
+        self.breaker.release(probe)
+        self.breaker.release(probe)
+        self.assertEqual(self.breaker.state, STATE_HALF_OPEN)
+
+        probe = self.breaker.allow()
+        self.breaker.record(True, 0, probe)
+        self.breaker.release(probe)
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+        self.assertIsNone(self.breaker.allow())
+
+    def test_window(self):
+        self.breaker = CircuitBreaker(minimum_calls=2, window=0.05)
+        self.call(False)
+        time.sleep(0.06)
+        self.call(False)
+        snapshot = self.breaker.snapshot()
+        self.assertEqual(snapshot['state'], STATE_CLOSED)
+        self.assertEqual(snapshot['calls'], 1)
+        self.assertEqual(snapshot['failure_rate'], 1.0)
+
+
+class TestPushwooshClientCircuitBreaker(FakeTransportClientMixin, unittest.TestCase):
+
+    def test_client_fails_fast(self):
+        command = RegisterDeviceCommand('0000-0000', 'hwid', constants.PLATFORM_ANDROID, 'token')
+        breaker = CircuitBreaker(minimum_calls=2, reset_timeout=60)
+        pw_client = self.make_client([503, 503], circuit_breaker=breaker,
+                                     retry_policy=RetryPolicy(max_attempts=3, backoff_base=0))
+
+        self.assertRaises(PushwooshCircuitOpenException, pw_client.invoke, command)
+        self.assertEqual(len(self.adapter.requests), 2)
+        self.assertEqual(breaker.snapshot()['failures'], 2)
+
+    def test_rate_limited_probe_is_released(self):
+        command = RegisterDeviceCommand('0000-0000', 'hwid', constants.PLATFORM_ANDROID, 'token')
+        breaker = CircuitBreaker(minimum_calls=1, reset_timeout=0.05)
+        limiter = RateLimiter(rate=0.001, capacity=1, blocking=False)
+        pw_client = self.make_client([503], circuit_breaker=breaker, rate_limiter=limiter,
+                                     retry_policy=RetryPolicy(max_attempts=1))
+
+        pw_client.invoke(command)
+        self.assertEqual(breaker.state, STATE_OPEN)
+        time.sleep(0.06)
+
+        self.assertRaises(PushwooshRateLimitException, pw_client.invoke, command)
+        self.assertEqual(breaker.state, STATE_HALF_OPEN)
+        pw_client.rate_limiter = None
+        self.assertEqual(pw_client.invoke(command)['status_code'], HTTP_200_OK)
+        self.assertEqual(breaker.state, STATE_CLOSED)
+
+    def test_interrupted_probe_is_released(self):
+        command = RegisterDeviceCommand('0000-0000', 'hwid', constants.PLATFORM_ANDROID, 'token')
+        breaker = CircuitBreaker(minimum_calls=1, reset_timeout=0.05)
+        pw_client = self.make_client([503], circuit_breaker=breaker, retry_policy=RetryPolicy(max_attempts=1))
+
+        pw_client.invoke(command)
+        time.sleep(0.06)
+        self.adapter.responses.append(KeyboardInterrupt())
+        self.assertRaises(KeyboardInterrupt, pw_client.invoke, command)
+        self.assertEqual(pw_client.invoke(command)['status_code'], HTTP_200_OK)
+        self.assertEqual(breaker.state, STATE_CLOSED)
@@ -0,0 +1,164 @@
+import threading
+import time
+import unittest
+
+from pypushwoosh import constants
+from pypushwoosh.cache import CompileFilterCache
+from pypushwoosh.command import CompileFilterCommand, RegisterDeviceCommand
+from pypushwoosh.filter import ApplicationFilter, IntegerTagFilter
+from pypushwoosh.exceptions import PushwooshCommandException
+
+HTTP_200_OK = 200
+HTTP_400_BAD_REQUEST = 400
+
+
+class FakeClient(object):
+
+    def __init__(self, status_code=HTTP_200_OK, delay=0, exception=None):
+        self.status_code = status_code
+        self.delay = delay
+        self.exception = exception
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def invoke(self, command):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.exception is not None:
+            raise self.exception
+        return {'status_code': self.status_code, 'response': {'devices_count': 42}}
+
+
+def command(devices_filter, auth='auth'):
+    result = CompileFilterCommand()
+    result.auth = auth
+    result.devices_filter = devices_filter
+    return result
+
+
+class TestCompileFilterCache(unittest.TestCase):
+
+    def setUp(self):
+        self.app = ApplicationFilter('0000-0000')
+        self.adult = IntegerTagFilter('age', constants.TAG_FILTER_OPERATOR_GTE, 18)
+
+    def test_equal_filters_share_entry(self):
+        client = FakeClient()
+        cache = CompileFilterCache(client)
+
+        first = cache.invoke(command(self.app.intersect(self.adult)))
+        second = cache.invoke(command(self.adult.intersect(self.app)))
+
+        self.assertEqual(first['response']['devices_count'], 42)
+        self.assertIs(first, second)
+        self.assertEqual(client.calls, 1)
+
+    def test_key_includes_auth(self):
+        client = FakeClient()
+        cache = CompileFilterCache(client)
+        cache.invoke(command(self.app, auth='first'))
+        cache.invoke(command(self.app, auth='second'))
+        self.assertEqual(client.calls, 2)
+
+    def test_ttl(self):
+        client = FakeClient()
+        cache = CompileFilterCache(client, ttl=0.01)
+        cache.invoke(command(self.app))
+        time.sleep(0.02)
+        cache.invoke(command(self.app))
+        self.assertEqual(client.calls, 2)
+
+    def test_lru(self):
+        client = FakeClient()
+        cache = CompileFilterCache(client, max_size=2)
+        filters = [ApplicationFilter('%04d-0000' % i) for i in range(3)]
+        cache.invoke(command(filters[0]))
+        cache.invoke(command(filters[1]))
+        cache.invoke(command(filters[0]))
+        cache.invoke(command(filters[2]))
+        self.assertEqual(len(cache), 2)
+
+        cache.invoke(command(filters[0]))
+        self.assertEqual(client.calls, 3)
+        cache.invoke(command(filters[1]))
+        self.assertEqual(client.calls, 4)
+
+    def test_errors_are_not_cached(self):
+        client = FakeClient(status_code=HTTP_400_BAD_REQUEST)
+        cache = CompileFilterCache(client)
+        cache.invoke(command(self.app))
+        cache.invoke(command(self.app))
+        self.assertEqual(client.calls, 2)
+        self.assertEqual(len(cache), 0)
+
+    def test_single_flight(self):
+        client = FakeClient(delay=0.05)
+        cache = CompileFilterCache(client)
+        results = []
+
+        def dry_run():
+            results.append(cache.invoke(command(self.app.union(self.adult))))
+
+        threads = [threading.Thread(target=dry_run) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(client.calls, 1)
+        self.assertEqual(len(results), 5)
+
+    def test_single_flight_exception(self):
+        client = FakeClient(delay=0.05, exception=ValueError('boom'))
+        cache = CompileFilterCache(client)
+        errors = []
+
+        def dry_run():
+            try:
+                cache.invoke(command(self.app))
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=dry_run) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(client.calls, 1)
+        self.assertEqual(len(errors), 3)
+
+    def test_single_flight_interrupted(self):
+        class Interrupt(BaseException):
+            pass
+
+        client = FakeClient(delay=0.05, exception=Interrupt())
+        cache = CompileFilterCache(client)
+        results = []
+
+        def owner():
+            try:
+                cache.invoke(command(self.app))
+            except Interrupt:
+                client.exception = None
+
+        def waiter():
+            time.sleep(0.01)
+            results.append(cache.invoke(command(self.app)))
+
+        threads = [threading.Thread(target=owner), threading.Thread(target=waiter)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(1)
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['status_code'], HTTP_200_OK)
+        self.assertEqual(client.calls, 2)
+        self.assertEqual(cache.invoke(command(self.app)), results[0])
+
+    def test_only_compile_filter_commands(self):
+        cache = CompileFilterCache(FakeClient())
+        device_command = RegisterDeviceCommand('0000-0000', 'hwid', constants.PLATFORM_IOS, 'token')
+        self.assertRaises(PushwooshCommandException, cache.invoke, device_command)
@@ -0,0 +1,219 @@
+import json
+import threading
+import unittest
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+from pypushwoosh import client
+from pypushwoosh.command import RegisterDeviceCommand, CreateMessageForApplicationCommand
+from pypushwoosh.notification import Notification
+from pypushwoosh.retry import RetryPolicy, parse_retry_after
+from pypushwoosh import constants
+from pypushwoosh.exceptions import PushwooshCommandException
+
+HTTP_200_OK = 200
+STATUS_OK = 'OK'
+
+
+class FakeAdapter(BaseAdapter):
+    """
+    Transport adapter answering every request with the queued responses (or a default OK response).
+    """
+
+    def __init__(self, responses=None):
+        super(FakeAdapter, self).__init__()
+        self.responses = list(responses or [])
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        if request.body is not None and not isinstance(request.body, bytes):
+            # streamed bodies are read like a real transport does
+            request.body = b''.join(request.body)
+        with self.lock:
+            self.requests.append(request)
+            spec = self.responses.pop(0) if self.responses else HTTP_200_OK
+
+        if isinstance(spec, BaseException):
+            raise spec
+
+        headers = {}
+        if isinstance(spec, tuple):
+            spec, headers = spec
+
+        response = requests.Response()
+        response.status_code = spec
+        response.headers.update(headers)
+        response._content = json.dumps({'status_code': spec, 'status_message': STATUS_OK,
+                                        'response': None}).encode('utf-8')
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+class FakeTransportClientMixin(object):
+
+    def make_client(self, responses=None, **kwargs):
+        pw_client = client.PushwooshClient(**kwargs)
+        self.adapter = FakeAdapter(responses)
+        pw_client.session.mount('https://', self.adapter)
+        return pw_client
+
+
+class TestPushwooshClientSession(FakeTransportClientMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.command = RegisterDeviceCommand('0000-0000', 'hwid', constants.PLATFORM_ANDROID, 'push_token')
+
+    def test_session_is_reused(self):
+        pw_client = client.PushwooshClient()
+        self.assertIs(pw_client.session, pw_client.session)
+
+    def test_pool_configuration(self):
+        pw_client = client.PushwooshClient(pool_connections=2, pool_maxsize=20, pool_block=True)
+        adapter = pw_client.session.get_adapter('https://cp.pushwoosh.com/')
+        self.assertIsInstance(adapter, HTTPAdapter)
+        self.assertEqual(adapter._pool_connections, 2)
+        self.assertEqual(adapter._pool_maxsize, 20)
+        self.assertTrue(adapter._pool_block)
+
+    def test_keep_alive_disabled(self):
+        pw_client = client.PushwooshClient(keep_alive=False)
+        self.assertEqual(pw_client.session.headers['Connection'], 'close')
+
+    def test_invoke(self):
+        pw_client = self.make_client()
+        result = pw_client.invoke(self.command)
+
+        self.assertEqual(result['status_code'], HTTP_200_OK)
+        self.assertEqual(len(self.adapter.requests), 1)
+        request = self.adapter.requests[0]
+        self.assertEqual(request.url, 'https://cp.pushwoosh.com/json/1.3/registerDevice')
+        self.assertEqual(request.headers['Content-Type'], 'application/json')
+
+    def test_close(self):
+        with self.make_client() as pw_client:
+            session = pw_client.session
+            pw_client.invoke(self.command)
+        self.assertIsNot(pw_client.session, session)
+
+
+class TestPushwooshClientBatch(FakeTransportClientMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.commands = [RegisterDeviceCommand('0000-0000', 'hwid_%d' % i, constants.PLATFORM_ANDROID, 'token')
+                         for i in range(10)]
+
+    def sent_hwids(self):
+        return sorted(json.loads(r.body)['request']['hwid'] for r in self.adapter.requests)
+
+    def test_submit(self):
+        with self.make_client(max_workers=2) as pw_client:
+            future = pw_client.submit(self.commands[0])
+            self.assertEqual(future.result()['status_code'], HTTP_200_OK)
+
+    def test_invoke_many_ordered(self):
+        with self.make_client(max_workers=4) as pw_client:
+            futures = pw_client.invoke_many(self.commands)
+            self.assertEqual(len(futures), len(self.commands))
+            for future in futures:
+                self.assertEqual(future.result()['status_code'], HTTP_200_OK)
+        self.assertEqual(self.sent_hwids(), sorted(c.hwid for c in self.commands))
+
+    def test_invoke_many_as_completed(self):
+        with self.make_client() as pw_client:
+            results = [f.result() for f in pw_client.invoke_many(self.commands, max_workers=3, ordered=False)]
+        self.assertEqual(len(results), len(self.commands))
+        self.assertEqual(self.sent_hwids(), sorted(c.hwid for c in self.commands))
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = RetryPolicy(max_attempts=3, backoff_base=1, backoff_cap=5)
+        self.device_command = RegisterDeviceCommand('0000-0000', 'hwid', constants.PLATFORM_ANDROID, 'token')
+        self.message_command = CreateMessageForApplicationCommand(Notification(), '0000-0000')
+
+    def test_idempotency(self):
+        self.assertTrue(self.policy.should_retry(self.device_command, 1, 503))
+        self.assertFalse(self.policy.should_retry(self.message_command, 1, 503))
+        self.assertTrue(RetryPolicy(retry_non_idempotent=True).should_retry(self.message_command, 1, 503))
+
+    def test_statuses_and_attempts(self):
+        self.assertTrue(self.policy.should_retry(self.device_command, 1))
+        self.assertTrue(self.policy.should_retry(self.device_command, 2, 429))
+        self.assertFalse(self.policy.should_retry(self.device_command, 1, HTTP_200_OK))
+        self.assertFalse(self.policy.should_retry(self.device_command, 1, 400))
+        self.assertFalse(self.policy.should_retry(self.device_command, 3, 503))
+
+    def test_backoff_is_capped(self):
+        for attempt in range(1, 10):
+            delay = self.policy.delay(attempt)
+            self.assertTrue(0 <= delay <= min(5, 2 ** (attempt - 1)))
+
+    def test_retry_after(self):
+        self.assertEqual(self.policy.delay(1, '2'), 2)
+        self.assertEqual(self.policy.delay(1, '120'), 5)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0)
+        self.assertIsNone(parse_retry_after('soon'))
+
+
+class TestPushwooshClientRetry(FakeTransportClientMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.command = RegisterDeviceCommand('0000-0000', 'hwid', constants.PLATFORM_ANDROID, 'token')
+        self.policy = RetryPolicy(max_attempts=3, backoff_base=0)
+
+    def test_retry_server_errors(self):
+        pw_client = self.make_client([503, (429, {'Retry-After': '0'}), HTTP_200_OK], retry_policy=self.policy)
+        self.assertEqual(pw_client.invoke(self.command)['status_code'], HTTP_200_OK)
+        self.assertEqual(len(self.adapter.requests), 3)
+
+    def test_retry_connection_errors(self):
+        pw_client = self.make_client([requests.ConnectionError(), HTTP_200_OK], retry_policy=self.policy)
+        self.assertEqual(pw_client.invoke(self.command)['status_code'], HTTP_200_OK)
+        self.assertEqual(len(self.adapter.requests), 2)
+
+    def test_give_up(self):
+        pw_client = self.make_client([requests.Timeout()] * 3, retry_policy=self.policy)
+        self.assertRaises(requests.Timeout, pw_client.invoke, self.command)
+        self.assertEqual(len(self.adapter.requests), 3)
+
+        pw_client = self.make_client([503] * 3, retry_policy=self.policy)
+        self.assertEqual(pw_client.invoke(self.command)['status_code'], 503)
+
+    def test_non_idempotent_command_is_not_retried(self):
+        command = CreateMessageForApplicationCommand(Notification(), '0000-0000')
+        command.auth = 'test_auth'
+        pw_client = self.make_client([503, HTTP_200_OK], retry_policy=self.policy)
+        self.assertEqual(pw_client.invoke(command)['status_code'], 503)
+        self.assertEqual(len(self.adapter.requests), 1)
+
+
+class TestPushwooshClientStream(FakeTransportClientMixin, unittest.TestCase):
+
+    def test_streamed_body(self):
+        command = RegisterDeviceCommand('0000-0000', 'hwid', constants.PLATFORM_ANDROID, 'token')
+        pw_client = self.make_client(stream=True)
+        pw_client.invoke(command)
+
+        request = self.adapter.requests[0]
+        self.assertEqual(request.headers['Transfer-Encoding'], 'chunked')
+        self.assertEqual(request.body, command.render().encode('utf-8'))
+
+    def test_retried_generator_devices(self):
+        notification = Notification()
+        notification.content = 'Hello world!'
+        notification.devices = (token for token in ['token_1', 'token_2'])
+        command = CreateMessageForApplicationCommand(notification, '0000-0000')
+        command.auth = 'test_auth'
+        pw_client = self.make_client([503, HTTP_200_OK], stream=True,
+                                     retry_policy=RetryPolicy(backoff_base=0, retry_non_idempotent=True))
+
+        # the first body is read while it is sent, the retry can not render it again
+        self.assertRaises(PushwooshCommandException, pw_client.invoke, command)
+        self.assertEqual(len(self.adapter.requests), 1)
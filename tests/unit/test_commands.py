@@ -1,5 +1,7 @@
 import unittest
 import json
+import sys
+import threading
 import uuid
 
 from pypushwoosh import client
@@ -9,6 +11,7 @@ from pypushwoosh.command import CreateTargetedMessageCommand, CreateMessageForAp
     UnregisterDeviceCommand, SetBadgeCommand, SetTagsCommand, GetNearestZoneCommand, PushStatCommand
 from pypushwoosh.filter import ApplicationFilter
 from pypushwoosh.notification import Notification
+from pypushwoosh.tokens import TokenStore
 from pypushwoosh.exceptions import PushwooshCommandException, PushwooshNotificationException
 
 HTTP_200_OK = 200
@@ -269,3 +272,161 @@ class TestDeviceCommands(unittest.TestCase):
 
         command_dict = json.loads(command.render())
         self.assertDictEqual(command_dict, expected_result)
+
+
+class TestStreamingRender(unittest.TestCase):
+
+    def setUp(self):
+        self.notification = Notification()
+        self.notification.content = {'en': 'Hello world!', 'ru': u'Привет'}
+        self.notification.devices = ['token_%d' % i for i in range(100)]
+        self.notification.data = {'nested': [1, 2.5, None, True]}
+
+    def command(self):
+        command = CreateMessageForApplicationCommand(self.notification, application='0000-0000')
+        command.auth = 'test_auth'
+        return command
+
+    def test_same_as_render(self):
+        expected = self.command().render().encode('utf-8')
+        self.assertEqual(b''.join(self.command().iter_render()), expected)
+        self.assertEqual(b''.join(self.command().iter_render(chunk_size=16)), expected)
+        self.assertEqual(bytes(self.command().render_into(bytearray(b'garbage'))), expected)
+
+    def test_chunk_size(self):
+        chunks = list(self.command().iter_render(chunk_size=64))
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks[:-1]:
+            self.assertGreaterEqual(len(chunk), 64)
+
+    def test_generator_devices(self):
+        devices = list(self.notification.devices)
+        self.notification.devices = (token for token in devices)
+
+        command_dict = json.loads(b''.join(self.command().iter_render()).decode('utf-8'))
+        self.assertEqual(command_dict['request']['notifications'][0]['devices'], devices)
+
+    def test_generator_devices_rendered_once(self):
+        devices = list(self.notification.devices)
+        self.notification.devices = (token for token in devices)
+        command = self.command()
+
+        chunks = command.iter_render()
+        self.assertEqual(json.loads(b''.join(chunks).decode('utf-8'))['request']['notifications'][0]['devices'],
+                         devices)
+        self.assertRaises(PushwooshCommandException, command.iter_render)
+        self.assertRaises(PushwooshCommandException, command.render_bytes)
+
+        self.notification.devices = iter(devices)
+        rendered = command.render_bytes()
+        self.assertEqual(json.loads(rendered.decode('utf-8'))['request']['notifications'][0]['devices'], devices)
+        self.assertIs(command.render_bytes(), rendered)
+        self.assertRaises(PushwooshCommandException, command.render)
+
+    def test_unread_generator_devices(self):
+        self.notification.devices = (token for token in ['token_1'])
+        command = self.command()
+        command.iter_render()
+        self.assertEqual(json.loads(command.render())['request']['notifications'][0]['devices'], ['token_1'])
+
+    def test_filter(self):
+        command = CompileFilterCommand()
+        command.auth = 'test_auth'
+        command.devices_filter = ApplicationFilter('0000-0000')
+        self.assertEqual(b''.join(command.iter_render()), command.render().encode('utf-8'))
+
+
+class TestRenderCache(unittest.TestCase):
+
+    def setUp(self):
+        self.notification = Notification()
+        self.notification.content = 'Hello world!'
+        self.notification.devices = ['token_%d' % i for i in range(10)]
+        self.command = CreateMessageForApplicationCommand(self.notification, application='0000-0000')
+        self.command.auth = 'test_auth'
+
+    def test_repeated_render_is_cached(self):
+        self.assertIs(self.command.render(), self.command.render())
+        self.assertIs(self.command.render_bytes(), self.command.render_bytes())
+
+    def test_render_is_not_nested_again(self):
+        first = json.loads(self.command.render())
+        self.command.auth = 'other_auth'
+        second = json.loads(self.command.render())
+
+        self.assertEqual(second['request']['auth'], 'other_auth')
+        self.assertEqual(set(second['request']), set(first['request']))
+
+    def test_notification_change(self):
+        rendered = self.command.render_bytes()
+        self.notification.content = 'Changed'
+
+        self.assertNotEqual(self.command.render_bytes(), rendered)
+        self.assertEqual(json.loads(self.command.render())['request']['notifications'][0]['content'], 'Changed')
+
+    def test_device_command_change(self):
+        command = SetBadgeCommand('0000-0000', 'hwid', 1)
+        self.assertEqual(json.loads(command.render())['request']['badges'], 1)
+        command.badges = 2
+        self.assertEqual(json.loads(command.render())['request']['badges'], 2)
+
+    def test_in_place_change(self):
+        self.notification.data = {'id': 1}
+        rendered = self.command.render_bytes()
+        self.notification.devices.append('token_new')
+        self.assertIn('token_new', json.loads(self.command.render())['request']['notifications'][0]['devices'])
+        self.assertNotEqual(self.command.render_bytes(), rendered)
+
+        self.notification.data['id'] = 2
+        self.assertEqual(json.loads(self.command.render())['request']['notifications'][0]['data'], {'id': 2})
+        self.notification.devices[0] = 1
+        self.assertEqual(json.loads(self.command.render())['request']['notifications'][0]['devices'][0], 1)
+
+    def test_token_store_append(self):
+        store = TokenStore(['token_1'])
+        self.notification.devices = store
+        self.command.render_bytes()
+        store.append('token_2')
+
+        expected = ['token_1', 'token_2']
+        self.assertEqual(json.loads(self.command.render_bytes().decode('utf-8'))['request']['notifications'][0]['devices'],
+                         expected)
+        self.assertEqual(json.loads(self.command.render())['request']['notifications'][0]['devices'], expected)
+
+    def test_concurrent_renders(self):
+        expected = json.loads(self.command.render())
+        bodies = []
+
+        def render():
+            for i in range(300):
+                if i % 10 == 0:
+                    self.command.invalidate()
+                bodies.append(self.command.render_bytes())
+
+        threads = [threading.Thread(target=render) for _ in range(8)]
+        # switch threads as often as possible, so renders interleave
+        interval = sys.getswitchinterval() if hasattr(sys, 'setswitchinterval') else None
+        if interval is not None:
+            sys.setswitchinterval(1e-6)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            if interval is not None:
+                sys.setswitchinterval(interval)
+        for body in set(bodies):
+            self.assertEqual(json.loads(body.decode('utf-8')), expected)
+
+    def test_invalidate(self):
+        rendered = self.command.render()
+        self.command.invalidate()
+        self.assertIsNot(self.command.render(), rendered)
+        self.assertEqual(self.command.render(), rendered)
+
+    def test_failed_compile(self):
+        self.command.auth = None
+        self.assertRaises(PushwooshCommandException, self.command.render)
+        self.command.auth = 'test_auth'
+        self.assertEqual(json.loads(self.command.render())['request']['auth'], 'test_auth')
@@ -0,0 +1,108 @@
+import unittest
+from datetime import date
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pypushwoosh import constants
+from pypushwoosh.filter import ApplicationFilter, ApplicationGroupFilter, IntegerTagFilter, StringTagFilter, \
+    ListTagFilter, DateTagFilter, DaysTagFilter, BooleanTagFilter, IntegerTagFilterByApplication, \
+    StringTagFilterByApplication, ListTagFilterByApplication, DateTagFilterByApplication, \
+    DaysTagFilterByApplication, BooleanTagFilterByApplication
+
+if numpy is not None:
+    from pypushwoosh.evaluator import DeviceSnapshot
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestDeviceSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshot = DeviceSnapshot(
+            hwids=['h0', 'h1', 'h2', 'h3', 'h4'],
+            applications=['AAAAA-AAAAA', 'AAAAA-AAAAA', 'BBBBB-BBBBB', 'BBBBB-BBBBB', 'CCCCC-CCCCC'],
+            platforms=[constants.PLATFORM_IOS, constants.PLATFORM_ANDROID, constants.PLATFORM_IOS,
+                       constants.PLATFORM_ANDROID, constants.PLATFORM_IOS],
+            tags={
+                'age': numpy.array([18, 25, numpy.nan, 40, 33]),
+                'city': numpy.array(['Paris', 'London', None, 'Paris', 'Berlin'], dtype=object),
+                'interests': numpy.array([['music'], ['sport', 'music'], None, [], ['cars']], dtype=object),
+                'registered': numpy.array(['2017-01-01', '2017-01-10', 'NaT', '2017-02-01', '2017-01-05'],
+                                          dtype='datetime64[D]'),
+                'premium': numpy.ma.masked_array([1, 0, 1, 1, 0], mask=[False, False, True, False, False]),
+            },
+            application_tags={
+                'level': numpy.ma.masked_array([3, 7, 5, 1, 2], mask=[False, False, False, False, True]),
+                'nick': numpy.array(['a', 'b', 'c', 'd', None], dtype=object),
+                'badges': numpy.array([['x'], ['y'], ['x', 'y'], None, ['x']], dtype=object),
+                'seen': numpy.array(['2017-02-01', '2017-02-03', '2017-02-01', '2017-01-30', 'NaT'],
+                                    dtype='datetime64[D]'),
+                'vip': numpy.array([True, False, True, False, True]),
+            },
+            groups={'GGGGG-GGGGG': ['AAAAA-AAAAA', 'CCCCC-CCCCC']},
+            today=date(2017, 2, 3),
+        )
+
+    def select(self, devices_filter):
+        return list(self.snapshot.select(devices_filter))
+
+    def test_application_filters(self):
+        self.assertEqual(self.select(ApplicationFilter('AAAAA-AAAAA')), ['h0', 'h1'])
+        self.assertEqual(self.select(ApplicationFilter('BBBBB-BBBBB', constants.PLATFORM_IOS)), ['h2'])
+        self.assertEqual(self.select(ApplicationGroupFilter('GGGGG-GGGGG')), ['h0', 'h1', 'h4'])
+        self.assertEqual(self.select(ApplicationGroupFilter('ZZZZZ-ZZZZZ')), [])
+
+    def test_tag_filters(self):
+        self.assertEqual(self.select(IntegerTagFilter('age', constants.TAG_FILTER_OPERATOR_GTE, 30)), ['h3', 'h4'])
+        self.assertEqual(self.select(IntegerTagFilter('age', constants.TAG_FILTER_OPERATOR_BETWEEN, [20, 35])),
+                         ['h1', 'h4'])
+        self.assertEqual(self.select(IntegerTagFilter('age', constants.TAG_FILTER_OPERATOR_NOTIN, [18])),
+                         ['h1', 'h3', 'h4'])
+        self.assertEqual(self.select(IntegerTagFilter('age', constants.TAG_FILTER_OPERATOR_IN, numpy.arange(30))),
+                         ['h0', 'h1'])
+        self.assertEqual(self.select(StringTagFilter('city', constants.TAG_FILTER_OPERATOR_NOTEQ, 'Paris')),
+                         ['h1', 'h4'])
+        self.assertEqual(self.select(ListTagFilter('interests', constants.TAG_FILTER_OPERATOR_IN, ['music', 'cars'])),
+                         ['h0', 'h1', 'h4'])
+        self.assertEqual(self.select(ListTagFilter('interests', constants.TAG_FILTER_OPERATOR_EQ, 'sport')), ['h1'])
+        self.assertEqual(self.select(DateTagFilter('registered', constants.TAG_FILTER_OPERATOR_LTE,
+                                                   date(2017, 1, 5))), ['h0', 'h4'])
+        self.assertEqual(self.select(DaysTagFilter('registered', constants.TAG_FILTER_OPERATOR_LTE, 29)),
+                         ['h1', 'h3', 'h4'])
+        self.assertEqual(self.select(BooleanTagFilter('premium', constants.TAG_FILTER_OPERATOR_EQ, 'true')), ['h0', 'h3'])
+        self.assertEqual(self.select(StringTagFilter('unknown', constants.TAG_FILTER_OPERATOR_NOTEQ, 'x')), [])
+
+    def test_application_tag_filters(self):
+        self.assertEqual(self.select(IntegerTagFilterByApplication('level', constants.TAG_FILTER_OPERATOR_GTE, 3,
+                                                                   'AAAAA-AAAAA')), ['h0', 'h1'])
+        self.assertEqual(self.select(IntegerTagFilterByApplication('level', constants.TAG_FILTER_OPERATOR_LTE, 10,
+                                                                   'CCCCC-CCCCC')), [])
+        self.assertEqual(self.select(StringTagFilterByApplication('nick', constants.TAG_FILTER_OPERATOR_IN, ['c', 'd'],
+                                                                  'BBBBB-BBBBB')), ['h2', 'h3'])
+        self.assertEqual(self.select(ListTagFilterByApplication('badges', constants.TAG_FILTER_OPERATOR_EQ, 'x',
+                                                                'BBBBB-BBBBB')), ['h2'])
+        self.assertEqual(self.select(DateTagFilterByApplication('seen', constants.TAG_FILTER_OPERATOR_EQ,
+                                                                '2017-02-01', 'BBBBB-BBBBB')), ['h2'])
+        self.assertEqual(self.select(DaysTagFilterByApplication('seen', constants.TAG_FILTER_OPERATOR_GTE, 1,
+                                                                'BBBBB-BBBBB')), ['h2', 'h3'])
+        self.assertEqual(self.select(BooleanTagFilterByApplication('vip', constants.TAG_FILTER_OPERATOR_EQ, 1,
+                                                                   'CCCCC-CCCCC')), ['h4'])
+
+    def test_operator_filters(self):
+        paris = StringTagFilter('city', constants.TAG_FILTER_OPERATOR_EQ, 'Paris')
+        ios = ApplicationFilter('AAAAA-AAAAA', constants.PLATFORM_IOS)
+        self.assertEqual(self.select(paris.union(ios)), ['h0', 'h3'])
+        self.assertEqual(self.select(paris.intersect(ApplicationFilter('BBBBB-BBBBB'))), ['h3'])
+        self.assertEqual(self.select(ApplicationGroupFilter('GGGGG-GGGGG').subtract(paris)), ['h1', 'h4'])
+        self.assertEqual(self.snapshot.count(paris.union(paris)), 2)
+
+    def test_deep_tree(self):
+        devices_filter = ApplicationFilter('ZZZZZ-ZZZZZ')
+        for i in range(5000):
+            devices_filter = devices_filter.union(IntegerTagFilter('age', constants.TAG_FILTER_OPERATOR_EQ, i))
+        self.assertEqual(self.select(devices_filter), ['h0', 'h1', 'h3', 'h4'])
+
+    def test_columns_length(self):
+        self.assertRaises(ValueError, DeviceSnapshot, ['h0', 'h1'], ['AAAAA-AAAAA'], [1, 1])
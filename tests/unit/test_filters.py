@@ -1,10 +1,21 @@
-from datetime import datetime
+from array import array
+from datetime import datetime, date
 import unittest
+
+import six
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from pypushwoosh import constants
+from pypushwoosh.utils import parse_date, INT64_TYPECODE, UINT64_TYPECODE
 from pypushwoosh.exceptions import PushwooshFilterInvalidOperatorException, PushwooshFilterInvalidOperandException
 from pypushwoosh.filter import ApplicationFilter, ApplicationGroupFilter, IntegerTagFilter, StringTagFilter, \
     ListTagFilter, DateTagFilter, DaysTagFilter, IntegerTagFilterByApplication, StringTagFilterByApplication, \
-    DateTagFilterByApplication, DaysTagFilterByApplication, BooleanTagFilter, BooleanTagFilterByApplication
+    DateTagFilterByApplication, DaysTagFilterByApplication, BooleanTagFilter, BooleanTagFilterByApplication, \
+    optimize
 
 HTTP_200_OK = 200
 STATUS_OK = 'OK'
@@ -125,6 +136,7 @@ class TestInvalidOperator(unittest.TestCase):
 
         self.pwfilter = IntegerTagFilter
         self.filter_with_invalid_operator(value, 'Invalid Operator', tag_name)
+        self.filter_with_invalid_operator(value, [constants.TAG_FILTER_OPERATOR_IN], tag_name)
 
     def test_invalid_operator_type_str(self):
         tag_name = 'testString'
@@ -270,6 +282,24 @@ class TestDateTagFilter(unittest.TestCase):
     def test_invalid_date_format(self):
         self.invalid_date_format(constants.TAG_FILTER_OPERATOR_GTE, '2')
         self.invalid_date_format(constants.TAG_FILTER_OPERATOR_BETWEEN, ['2013-06-25', '1'])
+        self.invalid_date_format(constants.TAG_FILTER_OPERATOR_EQ, '2013-02-30')
+        self.invalid_date_format(constants.TAG_FILTER_OPERATOR_EQ, '2013-06-25 24:00')
+        self.invalid_date_format(constants.TAG_FILTER_OPERATOR_EQ, '2013-06-25\n')
+
+    def test_parse_date(self):
+        values = [
+            ('2014-12-05 22:22:22', '2014-12-05 22:22:22'),
+            ('2014-12-05T22:22', '2014-12-05 22:22:00'),
+            ('2014-12-05', '2014-12-05 00:00:00'),
+            ('2014-2-5 2:2', '2014-02-05 02:02:00'),
+            ('2014-12-05t22:22', '2014-12-05 22:22:00'),
+            ('2014-12-05  22:22:22', '2014-12-05 22:22:22'),
+            ('2014-12-05 22:22:60', False),
+        ]
+        for value, expected_result in values:
+            self.assertEqual(parse_date(value), expected_result)
+            self.assertEqual(parse_date(value), expected_result)
+        self.assertEqual(parse_date(['2014-12-05', '2014-2-5']), ['2014-12-05 00:00:00', '2014-02-05 00:00:00'])
 
 
 class TestDaysTagFilter(unittest.TestCase):
@@ -334,6 +364,220 @@ class TestOperatorsFilter(unittest.TestCase):
         self.assertEqual(subtract_filter.__str__(), expected_result)
 
 
+class TestFilterRendering(unittest.TestCase):
+
+    def test_deep_union(self):
+        result = ApplicationFilter('0000-0000')
+        for i in range(1, 5000):
+            result = result.union(ApplicationFilter('%04d-0000' % i))
+
+        rendered = str(result)
+        self.assertTrue(rendered.startswith('(' * 4999 + 'A("0000-0000") + A("0001-0000"))'))
+        self.assertTrue(rendered.endswith(' + A("4999-0000"))'))
+        self.assertIs(str(result), rendered)
+
+    def test_rendered_operands_are_reused(self):
+        app_filter = ApplicationFilter('0000-0000')
+        tag_filter = IntegerTagFilter('age', constants.TAG_FILTER_OPERATOR_GTE, 18)
+        inner = app_filter.intersect(tag_filter)
+        str(inner)
+
+        self.assertEqual(str(inner.union(inner)), '((%s) + (%s))' % (str(inner)[1:-1], str(inner)[1:-1]))
+
+    def test_immutable(self):
+        tag_filter = IntegerTagFilter('age', constants.TAG_FILTER_OPERATOR_IN, [1, 2])
+        self.assertRaises(AttributeError, setattr, tag_filter, 'operand', [3])
+        self.assertRaises(AttributeError, setattr, tag_filter.union(tag_filter), 'first_filter', tag_filter)
+
+    def test_operand_list_is_copied(self):
+        operand = [1, 2]
+        tag_filter = IntegerTagFilter('age', constants.TAG_FILTER_OPERATOR_IN, operand)
+        rendered = str(tag_filter)
+        operand.append(3)
+        self.assertEqual(str(tag_filter), rendered)
+        self.assertEqual(tag_filter.operand, [1, 2])
+
+
+class TestOptimize(unittest.TestCase):
+
+    def setUp(self):
+        self.app = ApplicationFilter('0000-0000')
+        self.adult = IntegerTagFilter('age', constants.TAG_FILTER_OPERATOR_GTE, 18)
+
+    def city(self, operator, operand):
+        return StringTagFilter('city', operator, operand)
+
+    def test_flatten_and_dedupe(self):
+        tree = self.app.intersect(self.adult.intersect(self.app)).intersect(self.adult)
+        self.assertEqual(str(tree.optimize()), '(%s * %s)' % (self.app, self.adult))
+
+    def test_merge_eq_into_in(self):
+        tree = self.city(constants.TAG_FILTER_OPERATOR_EQ, 'Paris').union(
+            self.app).union(self.city(constants.TAG_FILTER_OPERATOR_IN, ['Rome', 'Paris'])).union(
+            self.city(constants.TAG_FILTER_OPERATOR_EQ, 'Oslo'))
+        self.assertEqual(str(optimize(tree)), '(T("city", IN, ["Paris", "Rome", "Oslo"]) + %s)' % self.app)
+
+    def test_list_eq_is_not_merged(self):
+        interests = ListTagFilter('interests', constants.TAG_FILTER_OPERATOR_EQ, ['music', 'sport'])
+        tree = interests.union(ListTagFilter('interests', constants.TAG_FILTER_OPERATOR_EQ, 'cars')).union(
+            ListTagFilter('interests', constants.TAG_FILTER_OPERATOR_IN, ['books']))
+        self.assertEqual(str(optimize(tree)), '(%s + T("interests", IN, ["cars", "books"]))' % interests)
+
+        tree = IntegerTagFilter('age', constants.TAG_FILTER_OPERATOR_EQ, [1, 2]).union(
+            IntegerTagFilter('age', constants.TAG_FILTER_OPERATOR_EQ, [1, 2]))
+        self.assertEqual(str(tree.optimize()), 'T("age", EQ, [1, 2])')
+
+    def test_other_tags_are_not_merged(self):
+        tree = self.city(constants.TAG_FILTER_OPERATOR_EQ, 'Paris').union(
+            StringTagFilter('country', constants.TAG_FILTER_OPERATOR_EQ, 'France')).union(
+            StringTagFilterByApplication('city', constants.TAG_FILTER_OPERATOR_EQ, 'Rome', '0000-0000'))
+        self.assertEqual(str(optimize(tree)), str(tree))
+
+    def test_merge_noteq_into_notin(self):
+        tree = self.city(constants.TAG_FILTER_OPERATOR_NOTEQ, 'Paris').intersect(
+            self.city(constants.TAG_FILTER_OPERATOR_NOTEQ, 'Rome'))
+        self.assertEqual(str(optimize(tree)), 'T("city", NOTIN, ["Paris", "Rome"])')
+
+    def test_merge_ranges(self):
+        def age(low, high):
+            return IntegerTagFilter('age', constants.TAG_FILTER_OPERATOR_BETWEEN, [low, high])
+        tree = age(30, 40).union(age(10, 20)).union(age(18, 29)).union(age(50, 60))
+        self.assertEqual(str(optimize(tree)), '(T("age", BETWEEN, [10, 40]) + T("age", BETWEEN, [50, 60]))')
+
+    def test_empty_subtraction(self):
+        empty = self.adult.subtract(self.adult)
+        self.assertEqual(str(optimize(self.app.union(empty))), str(self.app))
+        self.assertEqual(str(optimize(self.app.subtract(empty))), str(self.app))
+        self.assertEqual(str(optimize(self.app.intersect(empty))), str(empty))
+        self.assertEqual(str(optimize(empty)), str(empty))
+
+    def test_deep_tree(self):
+        tree = self.city(constants.TAG_FILTER_OPERATOR_EQ, 'city_0')
+        for i in range(1, 3000):
+            tree = tree.union(self.city(constants.TAG_FILTER_OPERATOR_EQ, 'city_%d' % i))
+
+        result = optimize(tree)
+        self.assertEqual(result.operator, constants.TAG_FILTER_OPERATOR_IN)
+        self.assertEqual(result.operand, ['city_%d' % i for i in range(3000)])
+
+    def test_leaf(self):
+        self.assertIs(optimize(self.app), self.app)
+
+
+class TestArrayOperands(unittest.TestCase):
+
+    def setUp(self):
+        self.tag_name = 'testInt'
+        self.expected_result = 'T("%s", %s, [3, 1, 2, 1])' % (self.tag_name, constants.TAG_FILTER_OPERATOR_IN)
+
+    def test_array(self):
+        for typecode in 'bhilHIL':
+            result = IntegerTagFilter(self.tag_name, constants.TAG_FILTER_OPERATOR_IN, array(typecode, [3, 1, 2, 1]))
+            self.assertEqual(result.operand, array(INT64_TYPECODE, [3, 1, 2, 1]))
+            self.assertEqual(str(result), self.expected_result)
+
+        self.assertRaises(PushwooshFilterInvalidOperandException, IntegerTagFilter, self.tag_name,
+                          constants.TAG_FILTER_OPERATOR_IN, array('d', [1.5]))
+        self.assertRaises(PushwooshFilterInvalidOperandException, IntegerTagFilter, self.tag_name,
+                          constants.TAG_FILTER_OPERATOR_IN, array(INT64_TYPECODE))
+        self.assertRaises(PushwooshFilterInvalidOperandException, DateTagFilter, self.tag_name,
+                          constants.TAG_FILTER_OPERATOR_IN, array(INT64_TYPECODE, [1]))
+
+    @unittest.skipIf(six.PY2, 'integers above sys.maxint are long on Python 2')
+    def test_unsigned_array(self):
+        result = IntegerTagFilter(self.tag_name, constants.TAG_FILTER_OPERATOR_NOTIN, array(UINT64_TYPECODE, [2 ** 64 - 1]))
+        self.assertEqual(str(result), 'T("%s", %s, [%d])' % (self.tag_name, constants.TAG_FILTER_OPERATOR_NOTIN,
+                                                             2 ** 64 - 1))
+
+    def test_range(self):
+        result = IntegerTagFilter(self.tag_name, constants.TAG_FILTER_OPERATOR_BETWEEN, range(18, 20, 1))
+        self.assertEqual(str(result), 'T("%s", %s, [18, 19])' % (self.tag_name, constants.TAG_FILTER_OPERATOR_BETWEEN))
+        result = IntegerTagFilter(self.tag_name, constants.TAG_FILTER_OPERATOR_IN, range(1000))
+        self.assertEqual(result, IntegerTagFilter(self.tag_name, constants.TAG_FILTER_OPERATOR_IN, list(range(1000))))
+
+    def test_days(self):
+        DaysTagFilter(self.tag_name, constants.TAG_FILTER_OPERATOR_IN, range(1, 100))
+        self.assertRaises(PushwooshFilterInvalidOperandException, DaysTagFilter, self.tag_name,
+                          constants.TAG_FILTER_OPERATOR_IN, range(100))
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_numpy(self):
+        result = IntegerTagFilter(self.tag_name, constants.TAG_FILTER_OPERATOR_IN, numpy.array([3, 1, 2, 1]))
+        self.assertEqual(str(result), self.expected_result)
+        result = StringTagFilter(self.tag_name, constants.TAG_FILTER_OPERATOR_IN, numpy.array(['a', 'b']))
+        self.assertEqual(result.operand, ['a', 'b'])
+        result = IntegerTagFilter(self.tag_name, constants.TAG_FILTER_OPERATOR_EQ, numpy.int64(5))
+        self.assertEqual(str(result), 'T("%s", %s, 5)' % (self.tag_name, constants.TAG_FILTER_OPERATOR_EQ))
+        self.assertRaises(PushwooshFilterInvalidOperandException, IntegerTagFilter, self.tag_name,
+                          constants.TAG_FILTER_OPERATOR_IN, numpy.array([1.5]))
+        self.assertRaises(PushwooshFilterInvalidOperandException, DaysTagFilterByApplication, self.tag_name,
+                          constants.TAG_FILTER_OPERATOR_IN, numpy.arange(5), '0000-0000')
+
+    def test_unique(self):
+        result = IntegerTagFilter(self.tag_name, constants.TAG_FILTER_OPERATOR_IN, array('i', [3, 1, 2, 1]),
+                                  unique=True)
+        self.assertEqual(str(result), 'T("%s", %s, [1, 2, 3])' % (self.tag_name, constants.TAG_FILTER_OPERATOR_IN))
+        result = StringTagFilterByApplication(self.tag_name, constants.TAG_FILTER_OPERATOR_NOTIN, ['b', 2, 'a', 2],
+                                              '0000-0000', unique=True)
+        self.assertEqual(result.operand, [2, 'a', 'b'])
+        result = IntegerTagFilter(self.tag_name, constants.TAG_FILTER_OPERATOR_BETWEEN, [3, 1], unique=True)
+        self.assertEqual(result.operand, [3, 1])
+        result = DateTagFilter(self.tag_name, constants.TAG_FILTER_OPERATOR_IN,
+                               ['2020-01-02', date(2020, 1, 1), '2020-01-02'], unique=True)
+        self.assertEqual(result.operand, [date(2020, 1, 1), '2020-01-02'])
+
+    def test_list_rendering(self):
+        result = IntegerTagFilter(self.tag_name, constants.TAG_FILTER_OPERATOR_IN, [True, 2])
+        self.assertEqual(str(result), 'T("%s", %s, [1, 2])' % (self.tag_name, constants.TAG_FILTER_OPERATOR_IN))
+        result = StringTagFilter(self.tag_name, constants.TAG_FILTER_OPERATOR_IN, [1, 'a'])
+        self.assertEqual(str(result), 'T("%s", %s, [1, "a"])' % (self.tag_name, constants.TAG_FILTER_OPERATOR_IN))
+
+
+class TestStructuralEquality(unittest.TestCase):
+
+    def setUp(self):
+        self.app = ApplicationFilter('0000-0000', [constants.PLATFORM_IOS, constants.PLATFORM_ANDROID])
+        self.adult = IntegerTagFilter('age', constants.TAG_FILTER_OPERATOR_GTE, 18)
+        self.city = StringTagFilter('city', constants.TAG_FILTER_OPERATOR_IN, ['Rome', 'Paris'])
+
+    def test_equal_leaves(self):
+        self.assertEqual(IntegerTagFilter('age', constants.TAG_FILTER_OPERATOR_GTE, 18), self.adult)
+        self.assertEqual(StringTagFilter('city', constants.TAG_FILTER_OPERATOR_IN, ['Paris', 'Rome', 'Paris']),
+                         self.city)
+        self.assertEqual(ApplicationFilter('0000-0000', [constants.PLATFORM_ANDROID, constants.PLATFORM_IOS]),
+                         self.app)
+        self.assertNotEqual(IntegerTagFilter('age', constants.TAG_FILTER_OPERATOR_GTE, 21), self.adult)
+        self.assertNotEqual(self.app, str(self.app))
+
+    def test_mixed_operand_values(self):
+        first = DateTagFilter('seen', constants.TAG_FILTER_OPERATOR_IN, ['2020-01-02', date(2020, 1, 1)])
+        second = DateTagFilter('seen', constants.TAG_FILTER_OPERATOR_IN, [date(2020, 1, 1), '2020-01-02'])
+        self.assertEqual(first, second)
+        self.assertEqual(hash(first), hash(second))
+        self.assertEqual(StringTagFilter('city', constants.TAG_FILTER_OPERATOR_IN, ['b', 10, 'a', 2]),
+                         StringTagFilter('city', constants.TAG_FILTER_OPERATOR_IN, [2, 'a', 10, 'b', 'a']))
+        self.assertNotEqual(StringTagFilter('city', constants.TAG_FILTER_OPERATOR_IN, [1]),
+                            StringTagFilter('city', constants.TAG_FILTER_OPERATOR_IN, ['1']))
+
+    def test_commutative_and_associative(self):
+        first = self.app.intersect(self.adult.intersect(self.city))
+        second = self.city.intersect(self.app).intersect(self.adult).intersect(self.city)
+        self.assertEqual(first, second)
+        self.assertEqual(hash(first), hash(second))
+        self.assertEqual(len(set([first, second])), 1)
+
+    def test_subtraction_is_ordered(self):
+        self.assertNotEqual(self.app.subtract(self.adult), self.adult.subtract(self.app))
+        self.assertNotEqual(self.app.union(self.adult), self.app.intersect(self.adult))
+
+    def test_deep_tree(self):
+        first = second = self.adult
+        for i in range(3000):
+            first = first.union(ApplicationFilter('%04d-0000' % i))
+            second = second.union(ApplicationFilter('%04d-0000' % (2999 - i)))
+        self.assertEqual(first, second)
+
+
 class TestApplicationTagFilter(unittest.TestCase):
 
     def setUp(self):
@@ -0,0 +1,91 @@
+import gc
+import unittest
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from pypushwoosh import constants
+from pypushwoosh.command import CreateTargetedMessageCommand, CompactCreateTargetedMessageCommand, \
+    RegisterDeviceCommand, UnregisterDeviceCommand, GetTagsCommand, SetTagsCommand, SetBadgeCommand, \
+    PushStatCommand, GetNearestZoneCommand
+from pypushwoosh.filter import ApplicationFilter
+from pypushwoosh.notification import Notification, CompactNotification
+
+INSTANCES = 2000
+
+
+def bytes_per_instance(factory, count=INSTANCES):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        instances = [factory() for _ in range(count)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del instances
+    return float(after - before) / count
+
+
+@unittest.skipIf(tracemalloc is None, 'tracemalloc is not available')
+class TestMemoryFootprint(unittest.TestCase):
+
+    def assertCompact(self, regular, compact):
+        regular_size = bytes_per_instance(regular)
+        compact_size = bytes_per_instance(compact)
+        report = '%s: %.0f bytes per instance, %s: %.0f bytes per instance' % (
+            regular.__name__, regular_size, compact.__name__, compact_size)
+        self.assertLess(compact_size, regular_size / 2, report)
+
+    def test_notification(self):
+        self.assertCompact(Notification, CompactNotification)
+
+    def test_targeted_message_command(self):
+        self.assertCompact(CreateTargetedMessageCommand, CompactCreateTargetedMessageCommand)
+
+
+class TestCompactAttributes(unittest.TestCase):
+
+    def test_notification(self):
+        regular, compact = Notification(), CompactNotification()
+        for n in (regular, compact):
+            n.content = 'Hello world!'
+            n.link = 'https://example.com'
+            n.ios_category_id = 1
+            n.devices = ['token']
+        self.assertEqual(compact.render(), regular.render())
+        self.assertEqual(compact.ios_category_id, 1)
+        self.assertIsInstance(compact, Notification)
+        self.assertFalse(compact.__dict__)
+
+    def test_undeclared_attribute(self):
+        notification = CompactNotification()
+        notification.custom = 'value'
+        self.assertEqual(notification.custom, 'value')
+
+    def test_targeted_message_command(self):
+        regular, compact = CreateTargetedMessageCommand(), CompactCreateTargetedMessageCommand()
+        for command in (regular, compact):
+            command.auth = 'auth'
+            command.content = 'Hello world!'
+            command.devices_filter = ApplicationFilter('0000-0000')
+        self.assertEqual(compact.render(), regular.render())
+        self.assertFalse(compact.__dict__)
+
+    def test_device_commands(self):
+        commands = [
+            RegisterDeviceCommand('0000-0000', 'hwid', constants.PLATFORM_IOS, 'token'),
+            UnregisterDeviceCommand('0000-0000', 'hwid'),
+            GetTagsCommand('0000-0000', 'hwid', 'auth'),
+            SetTagsCommand('0000-0000', 'hwid', {'tag': 1}),
+            SetBadgeCommand('0000-0000', 'hwid', 1),
+            PushStatCommand('0000-0000', 'hwid', 'hash'),
+            GetNearestZoneCommand('0000-0000', 'hwid', 1.0, 2.0),
+        ]
+        for command in commands:
+            self.assertFalse(command.__dict__, command.command_name)
+            self.assertTrue(command.render())
+            command.request_id = 5
+            self.assertEqual(command.request_id, 5)
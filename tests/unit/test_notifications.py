@@ -1,7 +1,11 @@
 import unittest
 
+from six import add_metaclass
+
 from pypushwoosh import constants, filter
-from pypushwoosh.notification import Notification, DevicesFilterNotificationMixin
+from pypushwoosh.notification import Notification, DevicesFilterNotificationMixin, BaseNotification, \
+    BaseNotificationMeta, BaseNotificationMixin, CommonNotificationMixin, IOSNotificationMixin, \
+    FilteredNotificationMixin
 from pypushwoosh.filter import ApplicationFilter
 from pypushwoosh.exceptions import PushwooshNotificationException
 
@@ -310,6 +314,75 @@ class TestNotifications(unittest.TestCase):
         self.assertDictEqual(self.notification.render(), expected_result)
 
 
+class CustomNotificationMixin(BaseNotificationMixin):
+
+    def __init__(self):
+        self.custom = None
+
+    def render(self):
+        return {'custom': self.custom} if self.custom is not None else {}
+
+
+@add_metaclass(BaseNotificationMeta)
+class CustomNotification(BaseNotification, CommonNotificationMixin, CustomNotificationMixin):
+    pass
+
+
+class SubclassedIOSNotificationMixin(IOSNotificationMixin):
+    pass
+
+
+class ExtendedCommonNotificationMixin(CommonNotificationMixin):
+    _optional_fields = CommonNotificationMixin._optional_fields + ('campaign',)
+
+    def __init__(self):
+        CommonNotificationMixin.__init__(self)
+        self.campaign = None
+
+
+@add_metaclass(BaseNotificationMeta)
+class SubclassedMixinsNotification(BaseNotification, SubclassedIOSNotificationMixin, ExtendedCommonNotificationMixin):
+    pass
+
+
+class TestRenderPlan(unittest.TestCase):
+
+    def test_mixed_order(self):
+        self.assertEqual(Notification._mixed[0], IOSNotificationMixin)
+        self.assertEqual(Notification._mixed[-1], CommonNotificationMixin)
+        self.assertEqual(len(set(Notification._mixed)), len(Notification._mixed))
+
+    def test_mixin_render(self):
+        notification = Notification()
+        notification.ios_badges = 1
+        notification.link = 'http://test_link'
+        self.assertDictEqual(IOSNotificationMixin.render(notification), {'ios_badges': 1})
+        self.assertDictEqual(CommonNotificationMixin.render(notification),
+                             {'content': None, 'send_date': 'now', 'link': 'http://test_link',
+                              'minimize_link': constants.LINK_MINIMIZER_GOOGLE})
+
+    def test_mixin_check(self):
+        notification = Notification()
+        notification.filter = 'filter'
+        notification.conditions = []
+        self.assertRaises(PushwooshNotificationException, FilteredNotificationMixin.render, notification)
+        self.assertRaises(PushwooshNotificationException, notification.render)
+
+    def test_custom_render_method(self):
+        notification = CustomNotification()
+        notification.custom = 'value'
+        self.assertDictEqual(notification.render(), {'content': None, 'send_date': 'now', 'custom': 'value'})
+
+    def test_subclassed_mixins(self):
+        notification = SubclassedMixinsNotification()
+        notification.ios_sound = 'default'
+        notification.content = 'Hello'
+        notification.campaign = 'C1'
+        self.assertDictEqual(notification.render(), {'ios_sound': 'default', 'content': 'Hello', 'send_date': 'now',
+                                                     'campaign': 'C1'})
+        self.assertDictEqual(SubclassedIOSNotificationMixin.render(notification), {'ios_sound': 'default'})
+
+
 class TestNotificationsDevicesFilter(unittest.TestCase):
 
     def setUp(self):
@@ -0,0 +1,85 @@
+import unittest
+from datetime import date
+
+from pypushwoosh import constants
+from pypushwoosh.filter import ApplicationFilter, ApplicationGroupFilter, IntegerTagFilter, StringTagFilter, \
+    ListTagFilter, DateTagFilter, DaysTagFilter, BooleanTagFilter, IntegerTagFilterByApplication, \
+    StringTagFilterByApplication, ListTagFilterByApplication, DateTagFilterByApplication, \
+    DaysTagFilterByApplication, BooleanTagFilterByApplication, UnionFilter, SubtractFilter
+from pypushwoosh.parser import parse
+from pypushwoosh.exceptions import PushwooshFilterException
+
+
+class TestParse(unittest.TestCase):
+
+    def setUp(self):
+        self.code = '0000-0000'
+        self.filters = [
+            ApplicationFilter(self.code),
+            ApplicationFilter(self.code, [constants.PLATFORM_IOS, constants.PLATFORM_ANDROID]),
+            ApplicationGroupFilter(self.code, constants.PLATFORM_CHROME),
+            IntegerTagFilter('age', constants.TAG_FILTER_OPERATOR_BETWEEN, [18, 25]),
+            IntegerTagFilter('balance', constants.TAG_FILTER_OPERATOR_LTE, -10),
+            StringTagFilter('city', constants.TAG_FILTER_OPERATOR_NOTIN, ['Paris', 'New York', 42]),
+            StringTagFilter('name', constants.TAG_FILTER_OPERATOR_EQ, '[x], (y) + z'),
+            ListTagFilter('interests', constants.TAG_FILTER_OPERATOR_IN, ['music']),
+            DateTagFilter('registered', constants.TAG_FILTER_OPERATOR_GTE, date(2017, 1, 1)),
+            DateTagFilter('seen', constants.TAG_FILTER_OPERATOR_BETWEEN, ['2017-01-01', '2017-01-31 12:00']),
+            DaysTagFilter('seen', constants.TAG_FILTER_OPERATOR_GTE, 7),
+            BooleanTagFilter('premium', constants.TAG_FILTER_OPERATOR_EQ, 'true'),
+            IntegerTagFilterByApplication('level', constants.TAG_FILTER_OPERATOR_IN, [1, 2], self.code),
+            StringTagFilterByApplication('nick', constants.TAG_FILTER_OPERATOR_NOTEQ, 'bob', self.code),
+            ListTagFilterByApplication('badges', constants.TAG_FILTER_OPERATOR_EQ, 3, self.code),
+            DateTagFilterByApplication('seen', constants.TAG_FILTER_OPERATOR_LTE, '2017-01-01', self.code),
+            DaysTagFilterByApplication('seen', constants.TAG_FILTER_OPERATOR_NOTIN, [1, 2], self.code),
+            BooleanTagFilterByApplication('vip', constants.TAG_FILTER_OPERATOR_EQ, 0, self.code),
+        ]
+
+    def test_round_trip(self):
+        for devices_filter in self.filters:
+            parsed = parse(str(devices_filter))
+            self.assertEqual(parsed, devices_filter)
+            self.assertEqual(str(parsed), str(devices_filter))
+
+        devices_filter = self.filters[0]
+        for i, other in enumerate(self.filters[1:]):
+            devices_filter = [devices_filter.union, devices_filter.intersect, devices_filter.subtract][i % 3](other)
+        devices_filter = self.filters[1].intersect(devices_filter)
+        parsed = parse(str(devices_filter))
+        self.assertEqual(parsed, devices_filter)
+        self.assertEqual(str(parsed), str(devices_filter))
+
+    def test_filter_classes(self):
+        parsed = parse(str(self.filters[2].subtract(self.filters[4].union(self.filters[13]))))
+        self.assertIsInstance(parsed, SubtractFilter)
+        self.assertIsInstance(parsed.first_filter, ApplicationGroupFilter)
+        self.assertEqual(parsed.first_filter.platforms, [constants.PLATFORM_CHROME])
+        self.assertIsInstance(parsed.second_filter, UnionFilter)
+        self.assertIsInstance(parsed.second_filter.first_filter, IntegerTagFilter)
+        self.assertEqual(parsed.second_filter.first_filter.operand, -10)
+        self.assertIsInstance(parsed.second_filter.second_filter, StringTagFilterByApplication)
+        self.assertEqual(parsed.second_filter.second_filter.code, self.code)
+
+        self.assertIsInstance(parse(str(self.filters[9])), DateTagFilter)
+        self.assertRaises(AttributeError, setattr, parsed, 'first_filter', None)
+
+    def test_tag_types(self):
+        tag_types = {'interests': ListTagFilter, 'seen': DaysTagFilter}
+        self.assertIsInstance(parse(str(self.filters[7]), tag_types), ListTagFilter)
+        self.assertIsInstance(parse(str(self.filters[16]), tag_types), DaysTagFilterByApplication)
+        self.assertIsInstance(parse(str(self.filters[7])), StringTagFilter)
+
+    def test_whitespace(self):
+        parsed = parse(' ( A ( "%s" ,[ "IOS" ] )+T( "age",GTE,18 ) ) \n' % self.code)
+        self.assertEqual(str(parsed), '(A("%s", ["IOS"]) + T("age", GTE, 18))' % self.code)
+
+    def test_deep_filter(self):
+        devices_filter = ApplicationFilter(self.code)
+        for i in range(20000):
+            devices_filter = devices_filter.union(IntegerTagFilter('age', constants.TAG_FILTER_OPERATOR_EQ, i))
+        self.assertEqual(parse(str(devices_filter)), devices_filter)
+
+    def test_invalid(self):
+        for filter_string in ['', 'A("x"', '(A("x")', 'A("x"))', '(A("x") A("y"))', '(A("x") + )',
+                              'T("age", FOO, 1)', 'A("x", ["NOPE"])', 'X("x")', 'T("age", IN, [1 2])']:
+            self.assertRaises(PushwooshFilterException, parse, filter_string)
@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pypushwoosh import constants
+from pypushwoosh.command import RegisterDeviceCommand, CreateMessageForApplicationCommand
+from pypushwoosh.notification import Notification
+from pypushwoosh.ratelimit import TokenBucket, RateLimiter, SharedMemoryBucketBackend, KEY_AUTH, KEY_APPLICATION, \
+    KEY_COMMAND_NAME
+from pypushwoosh.exceptions import PushwooshRateLimitException
+
+from .test_client import FakeTransportClientMixin
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_consume(self):
+        bucket = TokenBucket(rate=2, capacity=2)
+        now = bucket.timestamp
+
+        self.assertEqual(bucket.consume(now=now), 0)
+        self.assertEqual(bucket.consume(now=now), 0)
+        self.assertAlmostEqual(bucket.consume(now=now), 0.5)
+        self.assertEqual(bucket.consume(now=now + 0.5), 0)
+
+    def test_capacity(self):
+        bucket = TokenBucket(rate=10, capacity=3)
+        self.assertEqual(bucket.consume(3, now=bucket.timestamp + 100), 0)
+        self.assertGreater(bucket.consume(now=bucket.timestamp), 0)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.command = CreateMessageForApplicationCommand(Notification(), '0000-0000')
+        self.command.auth = 'test_auth'
+
+    def test_keys(self):
+        self.assertEqual(RateLimiter(1, key=KEY_AUTH).key_for(self.command), 'test_auth')
+        self.assertEqual(RateLimiter(1, key=KEY_APPLICATION).key_for(self.command), '0000-0000')
+        self.assertEqual(RateLimiter(1, key=KEY_COMMAND_NAME).key_for(self.command), 'createMessage')
+        self.assertEqual(RateLimiter(1, key=(KEY_AUTH, KEY_COMMAND_NAME)).key_for(self.command),
+                         ('test_auth', 'createMessage'))
+        self.assertEqual(RateLimiter(1, key=lambda c: 'custom').key_for(self.command), 'custom')
+
+    def test_non_blocking(self):
+        limiter = RateLimiter(0.01, capacity=1, blocking=False)
+        self.assertTrue(limiter.acquire(self.command))
+        self.assertFalse(limiter.acquire(self.command))
+
+    def test_blocking_timeout(self):
+        limiter = RateLimiter(0.01, capacity=1)
+        self.assertTrue(limiter.acquire(self.command))
+        self.assertFalse(limiter.acquire(self.command, timeout=0.1))
+
+    def test_buckets_are_separate(self):
+        limiter = RateLimiter(0.01, capacity=1, key=KEY_APPLICATION, blocking=False)
+        other = CreateMessageForApplicationCommand(Notification(), '0000-0001')
+        self.assertTrue(limiter.acquire(self.command))
+        self.assertTrue(limiter.acquire(other))
+        self.assertFalse(limiter.acquire(self.command))
+
+
+@unittest.skipIf(os.name != 'posix', 'SharedMemoryBucketBackend requires POSIX')
+class TestSharedMemoryBucketBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'buckets')
+        self.backends = []
+
+    def tearDown(self):
+        for backend in self.backends:
+            backend.close()
+        shutil.rmtree(self.directory)
+
+    def backend(self, slots=16):
+        backend = SharedMemoryBucketBackend(self.path, slots=slots)
+        self.backends.append(backend)
+        return backend
+
+    def test_backends_share_budget(self):
+        first, second = self.backend(), self.backend()
+
+        self.assertEqual(first.consume('key', 1, 0.01, 2), 0)
+        self.assertEqual(second.consume('key', 1, 0.01, 2), 0)
+        self.assertGreater(first.consume('key', 1, 0.01, 2), 0)
+        self.assertGreater(second.consume('key', 1, 0.01, 2), 0)
+        self.assertEqual(second.consume('other key', 1, 0.01, 2), 0)
+
+    def test_limiter_with_shared_backend(self):
+        command = CreateMessageForApplicationCommand(Notification(), '0000-0000')
+        first = RateLimiter(0.01, capacity=1, blocking=False, backend=self.backend())
+        second = RateLimiter(0.01, capacity=1, blocking=False, backend=self.backend())
+
+        self.assertTrue(first.acquire(command))
+        self.assertFalse(second.acquire(command))
+
+    def test_slots_mismatch(self):
+        self.backend(slots=16)
+        self.assertRaises(ValueError, SharedMemoryBucketBackend, self.path, 32)
+
+    def test_table_is_full(self):
+        backend = self.backend(slots=2)
+        backend.consume('a', 1, 1, 1)
+        backend.consume('b', 1, 1, 1)
+        self.assertRaises(PushwooshRateLimitException, backend.consume, 'c', 1, 1, 1)
+
+
+class TestPushwooshClientRateLimit(FakeTransportClientMixin, unittest.TestCase):
+
+    def test_client_raises_when_limited(self):
+        command = RegisterDeviceCommand('0000-0000', 'hwid', constants.PLATFORM_ANDROID, 'token')
+        limiter = RateLimiter(0.01, capacity=1, key=KEY_COMMAND_NAME, blocking=False)
+        pw_client = self.make_client(rate_limiter=limiter)
+
+        pw_client.invoke(command)
+        self.assertRaises(PushwooshRateLimitException, pw_client.invoke, command)
+        self.assertEqual(len(self.adapter.requests), 1)
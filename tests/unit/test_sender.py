@@ -0,0 +1,288 @@
+import json
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+
+from pypushwoosh import serializer
+from pypushwoosh.command import CreateTargetedMessageCommand
+from pypushwoosh.filter import ApplicationFilter
+from pypushwoosh.notification import Notification
+from pypushwoosh.sender import CoalescingSender, ChunkedSender, ShardedSender
+from pypushwoosh.exceptions import PushwooshCommandException, PushwooshNotificationException
+
+HTTP_200_OK = 200
+STATUS_OK = 'OK'
+
+
+class FakeClient(object):
+    """
+    Client answering createMessage with one message code per notification.
+    """
+
+    def __init__(self, exception=None):
+        self.exception = exception
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def invoke(self, command):
+        request = json.loads(command.render())['request']
+        with self.lock:
+            self.requests.append(request)
+            first = sum(len(r.get('notifications', [])) for r in self.requests[:-1])
+
+        if self.exception is not None:
+            raise self.exception
+
+        count = len(request.get('notifications', [None]))
+        return {'status_code': HTTP_200_OK, 'status_message': STATUS_OK,
+                'response': {'Messages': ['MSG-%d' % i for i in range(first, first + count)]}}
+
+    def submit(self, command):
+        future = Future()
+        try:
+            future.set_result(self.invoke(command))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def invoke_many(self, commands):
+        return [self.submit(command) for command in commands]
+
+
+def notification(content):
+    n = Notification()
+    n.content = content
+    return n
+
+
+class TestCoalescingSender(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeClient()
+
+    def test_flush_by_size(self):
+        with CoalescingSender(self.client, max_delay=60, max_items=3) as sender:
+            futures = [sender.send(notification('n%d' % i), 'auth', application='0000-0000') for i in range(3)]
+            results = [f.result(timeout=1) for f in futures]
+
+        self.assertEqual(len(self.client.requests), 1)
+        request = self.client.requests[0]
+        self.assertEqual(request['application'], '0000-0000')
+        self.assertEqual([n['content'] for n in request['notifications']], ['n0', 'n1', 'n2'])
+        self.assertEqual([r['response']['Messages'] for r in results], [['MSG-0'], ['MSG-1'], ['MSG-2']])
+
+    def test_flush_by_delay(self):
+        sender = CoalescingSender(self.client, max_delay=0.01, max_items=100)
+        try:
+            futures = [sender.send(notification('n'), 'auth', application_group='GROUP') for _ in range(2)]
+            for f in futures:
+                self.assertEqual(f.result(timeout=1)['status_code'], HTTP_200_OK)
+        finally:
+            sender.close()
+
+        self.assertEqual(len(self.client.requests), 1)
+        self.assertEqual(self.client.requests[0]['applications_group'], 'GROUP')
+
+    def test_groups(self):
+        with CoalescingSender(self.client, max_delay=60) as sender:
+            sender.send(notification('a'), 'auth', application='0000-0000')
+            sender.send(notification('b'), 'auth', application='0000-0001')
+            sender.send(notification('c'), 'other auth', application='0000-0000')
+
+        self.assertEqual(len(self.client.requests), 3)
+
+    def test_exception_is_fanned_out(self):
+        self.client = FakeClient(exception=ValueError('boom'))
+        with CoalescingSender(self.client, max_delay=60) as sender:
+            futures = [sender.send(notification('n'), 'auth', application='0000-0000') for _ in range(2)]
+
+        for f in futures:
+            self.assertIsInstance(f.exception(timeout=1), ValueError)
+
+    def test_recipient_is_required(self):
+        with CoalescingSender(self.client) as sender:
+            self.assertRaises(PushwooshCommandException, sender.send, notification('n'), 'auth')
+            self.assertRaises(PushwooshCommandException, sender.send, notification('n'), 'auth', 'APP', 'GROUP')
+
+
+class TestChunkedSender(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeClient()
+        self.notification = notification('Hello world!')
+        self.devices = ['token_%03d' % i for i in range(25)]
+
+    def test_split_by_count(self):
+        self.notification.devices = self.devices
+        chunks = ChunkedSender(self.client, max_devices=10).split(self.notification)
+
+        self.assertEqual([len(c.devices) for c in chunks], [10, 10, 5])
+        self.assertEqual(sum((c.devices for c in chunks), []), self.devices)
+        self.assertEqual(chunks[0].content, 'Hello world!')
+        self.assertIs(self.notification.devices, self.devices)
+
+    def test_split_by_bytes(self):
+        self.notification.devices = self.devices
+        sender = ChunkedSender(self.client, max_devices=100, max_bytes=200)
+        for chunk in sender.split(self.notification):
+            self.assertLessEqual(len(serializer.dumps(chunk.render())), 200)
+
+    def test_split_users(self):
+        self.notification.users = self.devices
+        chunks = ChunkedSender(self.client, max_users=20).split(self.notification)
+        self.assertEqual([len(c.users) for c in chunks], [20, 5])
+
+    def test_split_devices_and_users(self):
+        self.notification.devices = self.devices
+        self.notification.users = self.devices
+        self.assertRaises(PushwooshNotificationException, ChunkedSender(self.client).split, self.notification)
+
+    def test_send(self):
+        self.notification.devices = self.devices
+        result = ChunkedSender(self.client, max_devices=10).send(self.notification, 'auth', application='0000-0000')
+
+        self.assertTrue(result.ok)
+        self.assertEqual(result.messages, ['MSG-0', 'MSG-1', 'MSG-2'])
+        self.assertEqual(len(self.client.requests), 3)
+        self.assertEqual(self.client.requests[2]['notifications'][0]['devices'], self.devices[20:])
+
+    def test_split_generator(self):
+        self.notification.devices = (token for token in self.devices)
+        chunks = ChunkedSender(self.client, max_devices=10).split(self.notification)
+        self.assertEqual([c.devices for c in chunks], [self.devices[:10], self.devices[10:20], self.devices[20:]])
+
+    def test_send_max_pending(self):
+        client = self.client
+        waiting = []
+        submit = client.submit
+
+        def tracking_submit(command):
+            future = submit(command)
+            waiting.append(future)
+            client.max_waiting = max(getattr(client, 'max_waiting', 0), len(waiting))
+            result = future.result
+
+            def tracking_result(timeout=None):
+                waiting.remove(future)
+                return result(timeout)
+            future.result = tracking_result
+            return future
+
+        client.submit = tracking_submit
+        self.notification.devices = (token for token in self.devices)
+        result = ChunkedSender(client, max_devices=5, max_pending=2).send(self.notification, 'auth',
+                                                                         application='0000-0000')
+        self.assertTrue(result.ok)
+        self.assertEqual(result.messages, ['MSG-%d' % i for i in range(5)])
+        self.assertEqual(client.requests[4]['notifications'][0]['devices'], self.devices[20:])
+        self.assertEqual(client.max_waiting, 2)
+
+    def test_send_errors(self):
+        self.client = FakeClient(exception=ValueError('boom'))
+        self.notification.devices = self.devices
+        result = ChunkedSender(self.client, max_devices=10).send(self.notification, 'auth', application='0000-0000')
+
+        self.assertFalse(result.ok)
+        self.assertEqual(len(result.errors), 3)
+        self.assertEqual(result.messages, [])
+
+
+class FakeTargetedClient(FakeClient):
+    """
+    Client answering createTargetedMessage with a message code and deleteMessage with OK.
+    """
+
+    def __init__(self, failing_filter=None):
+        FakeClient.__init__(self)
+        self.failing_filter = failing_filter
+        self.submitted_at = []
+
+    def invoke(self, command):
+        request = json.loads(command.render())['request']
+        with self.lock:
+            self.requests.append((command.command_name, request))
+            count = len(self.requests)
+
+        if command.command_name == 'deleteMessage':
+            return {'status_code': HTTP_200_OK, 'status_message': STATUS_OK, 'response': None}
+        if self.failing_filter is not None and self.failing_filter in request['devices_filter']:
+            return {'status_code': 210, 'status_message': 'Error', 'response': None}
+        return {'status_code': HTTP_200_OK, 'status_message': STATUS_OK,
+                'response': {'messageCode': 'MSG-%d' % count}}
+
+    def submit(self, command):
+        self.submitted_at.append(time.time())
+        return FakeClient.submit(self, command)
+
+
+class TestShardedSender(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeTargetedClient()
+        self.command = CreateTargetedMessageCommand()
+        self.command.auth = 'auth'
+        self.command.content = 'Hello'
+        self.command.devices_filter = ApplicationFilter('0000-0000')
+
+    def test_shard_filters(self):
+        filters = ShardedSender(self.client, 'bucket', 10, 4).shard_filters()
+        self.assertEqual([str(f) for f in filters], [
+            'T("bucket", BETWEEN, [0, 1])',
+            'T("bucket", BETWEEN, [2, 4])',
+            'T("bucket", BETWEEN, [5, 6])',
+            'T("bucket", BETWEEN, [7, 9])',
+        ])
+        filters = ShardedSender(self.client, 'bucket', 2, 2, code='0000-0000').shard_filters()
+        self.assertEqual([str(f) for f in filters], ['AT("0000-0000", "bucket", EQ, 0)',
+                                                     'AT("0000-0000", "bucket", EQ, 1)'])
+        self.assertRaises(ValueError, ShardedSender, self.client, 'bucket', 2, 3)
+
+    def test_split(self):
+        parts = ShardedSender(self.client, 'bucket', 4, 2).split(self.command)
+        self.assertEqual([str(part.devices_filter) for part in parts], [
+            '(A("0000-0000") * T("bucket", BETWEEN, [0, 1]))',
+            '(A("0000-0000") * T("bucket", BETWEEN, [2, 3]))',
+        ])
+        self.assertEqual(parts[0].content, 'Hello')
+        self.assertIs(self.command.devices_filter, parts[0].devices_filter.first_filter)
+
+        self.command.devices_filter = 'A("0000-0000")'
+        parts = ShardedSender(self.client, 'bucket', 2, 2).split(self.command)
+        self.assertEqual(json.loads(parts[1].render())['request']['devices_filter'],
+                         '(A("0000-0000") * T("bucket", EQ, 1))')
+
+    def test_send_and_cancel(self):
+        sender = ShardedSender(self.client, 'bucket', 100, 4)
+        result = sender.send(self.command)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.messages, ['MSG-1', 'MSG-2', 'MSG-3', 'MSG-4'])
+
+        responses = sender.cancel(result)
+        self.assertEqual(len(responses), 4)
+        deleted = [request for name, request in self.client.requests if name == 'deleteMessage']
+        self.assertEqual([request['message'] for request in deleted], result.messages)
+        self.assertEqual(set(request['auth'] for request in deleted), set(['auth']))
+
+    def test_send_errors(self):
+        self.client = FakeTargetedClient(failing_filter='[25, 49]')
+        sender = ShardedSender(self.client, 'bucket', 100, 4)
+        result = sender.send(self.command)
+        self.assertFalse(result.ok)
+        self.assertEqual(result.messages, ['MSG-1', None, 'MSG-3', 'MSG-4'])
+        self.assertEqual(len(result.errors), 1)
+
+        sender.cancel(result)
+        self.assertEqual(len([name for name, _ in self.client.requests if name == 'deleteMessage']), 3)
+
+    def test_stagger(self):
+        sender = ShardedSender(self.client, 'bucket', 3, 3, stagger=0.05)
+        result = sender.send(self.command)
+        self.assertTrue(result.ok)
+        self.assertEqual(len(self.client.submitted_at), 3)
+        self.assertGreaterEqual(self.client.submitted_at[2] - self.client.submitted_at[0], 0.09)
+
+    def test_invalid_command(self):
+        sender = ShardedSender(self.client, 'bucket', 2, 2)
+        self.assertRaises(PushwooshCommandException, sender.split, notification('Hello'))
+        self.assertRaises(PushwooshNotificationException, sender.split, CreateTargetedMessageCommand())
@@ -0,0 +1,84 @@
+# coding=utf-8
+import json
+import unittest
+from datetime import datetime, date
+from decimal import Decimal
+
+from pypushwoosh import serializer
+from pypushwoosh.command import CreateTargetedMessageCommand
+from pypushwoosh.filter import ApplicationFilter, IntegerTagFilter
+from pypushwoosh import constants
+
+
+def available_serializers(backends=serializer.BACKENDS + serializer.EXPLICIT_BACKENDS):
+    result = []
+    for backend in backends:
+        try:
+            result.append(backend())
+        except ImportError:
+            pass
+    return result
+
+
+class TestSerializers(unittest.TestCase):
+
+    def setUp(self):
+        self.document = {
+            'request': {
+                'auth': 'test_auth',
+                'content': {'en': 'Hello/world', 'ru': u'Привет'},
+                'send_date': datetime(2014, 5, 13, 10, 15),
+                'day': date(2014, 5, 13),
+                'devices_filter': ApplicationFilter('0000-0000').intersect(
+                    IntegerTagFilter('age', constants.TAG_FILTER_OPERATOR_GTE, 18)),
+                'data': {'nested': [1, 2.5, None, True, (1, 2)], 1: 'int key'},
+                'big': 2 ** 70,
+            }
+        }
+        self.expected = json.loads(json.dumps(self.document, default=str))
+
+    def test_same_semantics_as_json(self):
+        for s in available_serializers():
+            data = s.dumps(self.document)
+            self.assertIsInstance(data, bytes, s.name)
+            self.assertEqual(json.loads(data.decode('utf-8')), self.expected, s.name)
+            self.assertEqual(s.loads(data), self.expected, s.name)
+            self.assertEqual(s.loads(data.decode('utf-8')), self.expected, s.name)
+
+    def test_unsupported_types(self):
+        document = {'price': Decimal('1.5'), 'raw': b'x', 'buffer': bytearray(b'y'), 'tags': set([1]),
+                    'number': 1.0, 'complex': 1 + 2j}
+        expected = json.loads(json.dumps(document, default=serializer.default))
+        for s in available_serializers(serializer.BACKENDS):
+            self.assertEqual(json.loads(s.dumps(document).decode('utf-8')), expected, s.name)
+
+        # ujson renders Decimal values as numbers, it is only used when selected explicitly
+        del document['price'], expected['price']
+        for s in available_serializers(serializer.EXPLICIT_BACKENDS):
+            self.assertEqual(json.loads(s.dumps(document).decode('utf-8')), expected, s.name)
+        self.assertNotIn('ujson', [s.name for s in available_serializers(serializer.BACKENDS)])
+
+    def test_iterables(self):
+        for s in available_serializers():
+            data = s.dumps({'devices': (token for token in ('a', 'b')), 'platforms': range(3)})
+            self.assertEqual(s.loads(data), {'devices': ['a', 'b'], 'platforms': [0, 1, 2]}, s.name)
+
+    def test_get_serializer(self):
+        self.assertEqual(serializer.get_serializer('json').name, 'json')
+        self.assertIn(serializer.get_serializer().name, [backend.name for backend in serializer.BACKENDS])
+        self.assertRaises(ValueError, serializer.get_serializer, 'unknown')
+
+    def test_set_serializer(self):
+        previous = serializer.current_serializer()
+        try:
+            serializer.set_serializer('json')
+            self.assertEqual(serializer.dumps({'a': 1}), b'{"a": 1}')
+        finally:
+            serializer.set_serializer(previous)
+
+    def test_render_bytes(self):
+        command = CreateTargetedMessageCommand()
+        command.auth = 'test_auth'
+        command.content = 'Hello world!'
+        command.devices_filter = ApplicationFilter('0000-0000')
+        self.assertEqual(json.loads(command.render_bytes().decode('utf-8')), json.loads(command.render()))
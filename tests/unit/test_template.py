@@ -0,0 +1,110 @@
+# coding=utf-8
+import copy
+import json
+import unittest
+
+from pypushwoosh import constants, serializer
+from pypushwoosh.command import CreateMessageForApplicationCommand, CreateMessageForApplicationGroupCommand
+from pypushwoosh.notification import Notification, CompactNotification
+from pypushwoosh.template import NotificationTemplate
+from pypushwoosh.exceptions import PushwooshNotificationException, PushwooshCommandException
+
+
+class TestNotificationTemplate(unittest.TestCase):
+
+    def setUp(self):
+        self.notification = Notification()
+        self.notification.content = 'Default'
+        self.notification.link = 'https://example.com'
+        self.notification.ios_badges = 5
+        self.notification.android_header = 'Header'
+        self.notification.platforms = [constants.PLATFORM_IOS, constants.PLATFORM_ANDROID]
+
+    def expected(self, application=None, application_group=None, **values):
+        notification = copy.copy(self.notification)
+        for field, value in values.items():
+            setattr(notification, field, value)
+        if application is not None:
+            command = CreateMessageForApplicationCommand(notification, application=application)
+        else:
+            command = CreateMessageForApplicationGroupCommand(notification, application_group=application_group)
+        command.auth = 'auth'
+        return json.loads(command.render())
+
+    def test_same_as_command(self):
+        template = NotificationTemplate(self.notification, 'auth', application='0000-0000')
+        values = {'content': {'en': 'Hello "world"', 'ru': u'Привет'}, 'data': {'id': 1}, 'devices': ['a', 'b']}
+
+        body = template.render_bytes(**values)
+        self.assertEqual(json.loads(body.decode('utf-8')), self.expected(application='0000-0000', **values))
+
+    def test_all_serializers(self):
+        previous = serializer.current_serializer()
+        try:
+            for name in ('json', 'orjson', 'rapidjson', 'ujson'):
+                try:
+                    serializer.set_serializer(name)
+                except ImportError:
+                    continue
+                template = NotificationTemplate(self.notification, 'auth', application_group='GROUP')
+                body = template.render_bytes(content=u'Привет', devices=['token'], data=None)
+                self.assertEqual(serializer.loads(body), self.expected(application_group='GROUP', content=u'Привет',
+                                                                       devices=['token'], data=None), name)
+        finally:
+            serializer.set_serializer(previous)
+
+    def test_defaults(self):
+        template = NotificationTemplate(self.notification, 'auth', application='0000-0000')
+        self.notification.content = 'Changed'
+
+        request = json.loads(template.render_bytes().decode('utf-8'))['request']
+        self.assertEqual(request['notifications'][0]['content'], 'Default')
+        self.assertNotIn('devices', request['notifications'][0])
+
+    def test_omitted_optional_fields(self):
+        self.notification.data = {'id': 1}
+        template = NotificationTemplate(self.notification, 'auth', application='0000-0000',
+                                        variable_fields=('ios_badges', 'data', 'link', 'minimize_link'))
+        for values in ({'ios_badges': None}, {'data': None, 'link': None}, {'ios_badges': None, 'data': None},
+                       {'link': 'https://example.org', 'minimize_link': constants.LINK_MINIMIZER_NONE}):
+            body = template.render_bytes(**values)
+            self.assertEqual(json.loads(body.decode('utf-8')), self.expected(application='0000-0000', **values))
+
+    def test_platform_fields(self):
+        template = NotificationTemplate(self.notification, 'auth', application='0000-0000',
+                                        variable_fields=('content', 'ios_badges', 'android_header'))
+        body = template.render_bytes(content='Hi', ios_badges=1, android_header='Other')
+        self.assertEqual(json.loads(body.decode('utf-8')),
+                         self.expected(application='0000-0000', content='Hi', ios_badges=1, android_header='Other'))
+
+    def test_compact_notification(self):
+        notification = CompactNotification()
+        notification.content = 'Default'
+        template = NotificationTemplate(notification, 'auth', application='0000-0000')
+        request = json.loads(template.render_bytes(devices=['a']).decode('utf-8'))['request']
+        self.assertEqual(request['notifications'][0]['devices'], ['a'])
+
+    def test_command(self):
+        template = NotificationTemplate(self.notification, 'auth', application='0000-0000')
+        command = template.command(content='Hi')
+
+        self.assertEqual(command.command_name, 'createMessage')
+        self.assertEqual(command.render_bytes(), template.render_bytes(content='Hi'))
+        self.assertEqual(b''.join(command.iter_render(chunk_size=16)), command.render_bytes())
+        self.assertEqual(json.loads(command.render())['request']['notifications'][0]['content'], 'Hi')
+
+    def test_invalid_fields(self):
+        self.assertRaises(PushwooshNotificationException, NotificationTemplate, self.notification, 'auth',
+                          application='0000-0000', variable_fields=('unknown',))
+        self.assertRaises(PushwooshNotificationException, NotificationTemplate, self.notification, 'auth',
+                          application='0000-0000', variable_fields=('ios_category_id',))
+        template = NotificationTemplate(self.notification, 'auth', application='0000-0000')
+        self.assertRaises(PushwooshNotificationException, template.render_bytes, link='https://example.org')
+
+    def test_dependent_field_not_rendered(self):
+        self.notification.link = None
+        self.assertRaises(PushwooshNotificationException, NotificationTemplate, self.notification, 'auth',
+                          application='0000-0000', variable_fields=('minimize_link',))
+
+    def test_recipient_is_required(self):
+        self.assertRaises(PushwooshCommandException, NotificationTemplate, self.notification, 'auth')
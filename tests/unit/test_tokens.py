@@ -0,0 +1,129 @@
+# coding=utf-8
+import binascii
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from pypushwoosh import serializer
+from pypushwoosh.command import CreateMessageForApplicationCommand
+from pypushwoosh.notification import Notification
+from pypushwoosh.sender import ChunkedSender
+from pypushwoosh.tokens import TokenFile, TokenStore
+
+
+class TestTokenFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.tokens = ['token_%03d' % i for i in range(25)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def token_file(self, content):
+        path = os.path.join(self.directory, 'tokens.txt')
+        with open(path, 'wb') as f:
+            f.write(content)
+        return TokenFile(path)
+
+    def test_iteration(self):
+        with self.token_file(('\n'.join(self.tokens) + '\n').encode('ascii')) as tokens:
+            self.assertEqual(list(tokens), self.tokens)
+            self.assertEqual(len(tokens), 25)
+            self.assertEqual(list(tokens), self.tokens)
+
+    def test_empty_lines_and_crlf(self):
+        with self.token_file(b'\r\na\r\n\nb\n\nc') as tokens:
+            self.assertEqual(list(tokens), ['a', 'b', 'c'])
+            self.assertEqual([tokens[i] for i in range(len(tokens))], ['a', 'b', 'c'])
+
+    def test_empty_file(self):
+        with self.token_file(b'') as tokens:
+            self.assertEqual(len(tokens), 0)
+            self.assertEqual(list(tokens), [])
+
+    def test_indexing_and_slicing(self):
+        with self.token_file('\n'.join(self.tokens).encode('ascii')) as tokens:
+            self.assertEqual(tokens[0], 'token_000')
+            self.assertEqual(tokens[-1], 'token_024')
+            self.assertRaises(IndexError, tokens.__getitem__, 25)
+
+            view = tokens[5:15]
+            self.assertEqual(len(view), 10)
+            self.assertEqual(list(view), self.tokens[5:15])
+            self.assertEqual(list(view[2:4]), self.tokens[7:9])
+            self.assertEqual(view[-1], 'token_014')
+            self.assertEqual(tokens[::10], self.tokens[::10])
+            self.assertEqual(len(tokens[30:40]), 0)
+
+    def test_render(self):
+        with self.token_file('\n'.join(self.tokens).encode('ascii')) as tokens:
+            notification = Notification()
+            notification.content = 'Hello world!'
+            notification.devices = tokens[:10]
+            command = CreateMessageForApplicationCommand(notification, application='0000-0000')
+            command.auth = 'auth'
+
+            request = serializer.loads(command.render_bytes())['request']
+            self.assertEqual(request['notifications'][0]['devices'], self.tokens[:10])
+            self.assertEqual(json.loads(command.render()), json.loads(b''.join(command.iter_render()).decode('utf-8')))
+
+
+class TestTokenStore(unittest.TestCase):
+
+    def setUp(self):
+        self.hex_tokens = [binascii.hexlify(os.urandom(32)).decode('ascii') for _ in range(20)]
+        self.tokens = self.hex_tokens + ['ABCDEF0123', 'fcm:APA91b-x_y', 'with "quotes"', u'Привет', '1234', '']
+
+    def test_round_trip(self):
+        store = TokenStore(self.tokens)
+        self.assertEqual(len(store), len(self.tokens))
+        self.assertEqual(list(store), self.tokens)
+        self.assertEqual(store[0], self.tokens[0])
+        self.assertEqual(store[-3], u'Привет')
+        self.assertRaises(IndexError, store.__getitem__, len(self.tokens))
+
+    def test_hex_tokens_are_packed(self):
+        store = TokenStore(self.hex_tokens)
+        self.assertLess(store.nbytes, 32 * len(self.hex_tokens) + 10 * (len(self.hex_tokens) + 1))
+
+    def test_slices(self):
+        store = TokenStore(self.tokens)
+        view = store[5:25]
+        self.assertEqual(len(view), 20)
+        self.assertEqual(list(view), self.tokens[5:25])
+        self.assertEqual(list(view[10:]), self.tokens[15:25])
+        self.assertEqual(store[::5], self.tokens[::5])
+        self.assertRaises(TypeError, view.append, 'token')
+
+        store.append('appended')
+        self.assertEqual(len(view), 20)
+        self.assertEqual(store[-1], 'appended')
+
+    def test_to_json(self):
+        for tokens in (self.tokens, self.hex_tokens, []):
+            store = TokenStore(tokens)
+            self.assertEqual(store.to_json(b', ').decode('ascii'), json.dumps(tokens))
+            self.assertEqual(json.loads(store[1:4].to_json().decode('ascii')), tokens[1:4])
+
+    def test_render(self):
+        notification = Notification()
+        notification.content = 'Hello world!'
+        notification.devices = TokenStore(self.tokens)
+        command = CreateMessageForApplicationCommand(notification, application='0000-0000')
+        command.auth = 'auth'
+
+        request = serializer.loads(command.render_bytes())['request']
+        self.assertEqual(request['notifications'][0]['devices'], self.tokens)
+        self.assertEqual(b''.join(command.iter_render()), command.render().encode('utf-8'))
+
+    def test_chunked_sender_slices(self):
+        notification = Notification()
+        notification.devices = TokenStore(self.tokens)
+        chunks = ChunkedSender(None, max_devices=10).split(notification)
+
+        self.assertEqual([len(chunk.devices) for chunk in chunks], [10, 10, 6])
+        self.assertIsInstance(chunks[0].devices, TokenStore)
+        self.assertEqual(sum((list(chunk.devices) for chunk in chunks), []), self.tokens)